@@ -0,0 +1,63 @@
+"""Coste por chunk del limitador de audio frente a la normalización anterior.
+
+Uso: python -m benchmarks.audio_dsp [--rate 48000] [--channels 2] [--chunks 2000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from recorder.dsp import AudioProcessor
+
+CHUNK_SIZES = [256, 512, 1024, 2048]
+
+
+def legacy_process(data, volume, max_value=32767):
+    # Normalización por chunk tal y como la hacía capture_audio()
+    threshold = 0.8 * max_value
+    audio_data = np.frombuffer(data, dtype=np.int16)
+    max_amplitude = np.max(np.abs(audio_data))
+    if max_amplitude > threshold:
+        audio_data = audio_data * (threshold / max_amplitude)
+    audio_data = np.clip(audio_data * volume, -max_value, max_value)
+    return audio_data.astype(np.int16).tobytes()
+
+
+def time_chunks(process, chunks):
+    for chunk in chunks[:20]:
+        process(chunk)
+    started = time.perf_counter()
+    for chunk in chunks:
+        process(chunk)
+    return (time.perf_counter() - started) / len(chunks)
+
+
+def make_chunks(rate, channels, frames, count, loud):
+    t = np.arange(frames * count) / rate
+    level = 1.4 if loud else 0.3
+    signal = np.sin(2 * np.pi * 440 * t) * level * (0.6 + 0.4 * np.sin(2 * np.pi * 0.5 * t))
+    pcm = np.clip(np.repeat(signal[:, None], channels, axis=1) * 32767, -32768, 32767).astype(np.int16)
+    return [pcm[i * frames:(i + 1) * frames].tobytes() for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=48000)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--chunks", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'frames':>6} {'signal':>6} {'legacy us':>10} {'limiter us':>11} {'% of realtime':>14}")
+    for frames in CHUNK_SIZES:
+        for loud in (False, True):
+            chunks = make_chunks(args.rate, args.channels, frames, args.chunks, loud)
+            processor = AudioProcessor(args.rate, args.channels, volume=1.0)
+            legacy = time_chunks(lambda data: legacy_process(data, 1.0), chunks)
+            limiter = time_chunks(processor.process, chunks)
+            realtime = limiter / (frames / args.rate) * 100
+            print(f"{frames:>6} {'loud' if loud else 'quiet':>6} {legacy * 1e6:>10.1f} "
+                  f"{limiter * 1e6:>11.1f} {realtime:>13.3f}%")
+
+
+if __name__ == "__main__":
+    main()
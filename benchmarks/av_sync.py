@@ -0,0 +1,95 @@
+"""Comprobación de sincronía audio/vídeo con fuentes sintéticas de reloj desviado.
+
+Graba durante unos segundos un vídeo sintético junto a dos fuentes de audio
+cuyos relojes van más rápido y más lento que el maestro, y comprueba que la
+deriva estimada se acerca a la real y que el desfase se mantiene acotado.
+Sale con código 1 si no se cumplen las tolerancias.
+
+Uso: python -m benchmarks.av_sync [--seconds 20] [--ppm 2000] [--no-correction]
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from recorder.audio_engine import AudioMixer, BufferSource
+from recorder.pipeline import CapturePipeline
+from recorder.sync import sync_report
+
+
+class PatternGrabber:
+    def __init__(self):
+        self.count = 0
+
+    def grab(self, buffer):
+        buffer[:] = self.count & 0xFF
+        self.count += 1
+
+
+class CopyComposer:
+    channels = 4
+
+    def compose(self, src, dst, info):
+        np.copyto(dst, src)
+
+
+class NullEncoder:
+    def __init__(self):
+        self.frames = 0
+
+    def write(self, frame):
+        self.frames += 1
+
+
+def run(seconds, ppm, jitter, correction):
+    rate = 48000
+    sources = [
+        BufferSource.tone(440, 44100, name="fast", skew=1 + ppm * 1e-6, jitter=jitter, blocksize=441),
+        BufferSource.tone(660, 48000, channels=2, name="slow", skew=1 - ppm * 1e-6, jitter=jitter, blocksize=512),
+    ]
+    audio = []
+    mixer = AudioMixer(sources, audio.append, rate=rate, drift_correction=correction)
+    pipeline = CapturePipeline(PatternGrabber(), CopyComposer(), NullEncoder(), 30, (90, 160, 4), (90, 160, 4))
+    start_time = pipeline.start()
+    mixer.start(start_time)
+    stop_time = start_time + seconds
+    while mixer.clock() < stop_time:
+        pipeline.scheduler.sleep(min(0.1, max(stop_time - mixer.clock(), 0.0)))
+    pipeline.stop(stop_time)
+    mixer.stop(pipeline.end_time)
+    pipeline.close()
+    return sync_report(pipeline.timing(), mixer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--ppm", type=float, default=2000.0, help="desviación de los relojes de audio")
+    parser.add_argument("--jitter", type=float, default=0.004, help="retraso aleatorio de los callbacks (s)")
+    parser.add_argument("--max-offset-ms", type=float, default=10.0)
+    parser.add_argument("--ppm-tolerance", type=float, default=200.0)
+    parser.add_argument("--no-correction", action="store_true")
+    args = parser.parse_args()
+
+    report = run(args.seconds, args.ppm, args.jitter, not args.no_correction)
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if abs(report["av_offset_ms"]) > 1000.0 / 30:
+        failures.append(f"audio and video lengths differ by {report['av_offset_ms']} ms")
+    for name, expected in (("fast", args.ppm), ("slow", -args.ppm)):
+        source = report["sources"][name]
+        if abs(source["drift_ppm"] - expected) > args.ppm_tolerance:
+            failures.append(f"{name}: estimated {source['drift_ppm']} ppm, expected {expected:.0f}")
+        if source["max_offset_ms"] > args.max_offset_ms or source["resyncs"]:
+            failures.append(f"{name}: max offset {source['max_offset_ms']} ms, {source['resyncs']} resyncs")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Memoria asignada por frame en el camino captura -> composición.
+
+  legacy      camino anterior: copia del ScreenShot y cvtColor por frame
+  bgr24/bgra  solo la composición, sobre un buffer del anillo ya capturado
+  mss+bgra    ScreenGrabber.grab (mss crea un bytearray nuevo por captura y se copia al anillo) y composición
+  gdi+bgra    captura escrita directamente en el buffer del anillo, como GdiGrabber (solo Windows), y composición
+
+Sin pantalla no se llama a mss: un sustituto devuelve, como mss, un
+bytearray nuevo en cada captura, y se ejecuta el ``grab`` real de
+``ScreenGrabber`` sobre él.
+
+Uso: python -m benchmarks.frame_alloc [--frames N] [--resolution 1920x1080 ...]
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from recorder.capture import FrameComposer, ScreenGrabber
+from recorder.cursor import CursorCompositor
+
+RESOLUTIONS = ["1280x720", "1920x1080", "3840x2160"]
+
+
+def legacy_frame(raw, shape):
+    # Camino anterior: np.array() copia el ScreenShot y cvtColor asigna otro frame
+    frame = np.array(np.frombuffer(raw, dtype=np.uint8).reshape(shape))
+    return cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+
+
+class FakeScreenShot:
+    __slots__ = ("raw",)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+
+class FakeMss:
+    # Como mss: cada captura devuelve un bytearray recién asignado con los píxeles
+    def __init__(self, pixels):
+        self.pixels = pixels
+
+    def grab(self, bbox):
+        return FakeScreenShot(bytearray(self.pixels))
+
+
+def measure(step, frames, warmup=10):
+    for i in range(warmup):
+        step(i)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    for i in range(frames):
+        step(i)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size for stat in snapshot.statistics("filename"))
+    return {
+        "ms_per_frame": round(elapsed / frames * 1000, 3),
+        "peak_growth_bytes": peak - baseline,
+        "retained_bytes": allocated,
+    }
+
+
+def run(resolution, frames):
+    width, height = (int(v) for v in resolution.split("x"))
+    shape = (height, width, 4)
+    capture = np.random.randint(0, 255, shape, dtype=np.uint8)
+    raw = bytearray(capture.tobytes())
+    cursor = CursorCompositor("Red Circle")
+    results = {}
+
+    def legacy(i):
+        frame = legacy_frame(raw, shape)
+        cursor.draw(frame, (i % width, i % height, 0))
+
+    results["legacy"] = measure(legacy, frames)
+
+    for pix_fmt in ("bgr24", "bgra"):
+        composer = FrameComposer(cursor, pix_fmt=pix_fmt)
+        dst = np.empty((height, width, composer.channels), dtype=np.uint8)
+
+        def zero_copy(i, composer=composer, dst=dst):
+            capture[0, 0, 0] = i & 0xFF  # el capturador escribe en el buffer del anillo
+            composer.compose(capture, dst, (i % width, i % height, 0))
+
+        results[pix_fmt] = measure(zero_copy, frames)
+
+    composer = FrameComposer(cursor, pix_fmt="bgra")
+    slot = np.empty(shape, dtype=np.uint8)
+    dst = np.empty((height, width, composer.channels), dtype=np.uint8)
+    grabber = ScreenGrabber({'left': 0, 'top': 0, 'width': width, 'height': height})
+    grabber.sct = FakeMss(raw)
+
+    def mss_path(i):
+        grabber.grab(slot)
+        composer.compose(slot, dst, (i % width, i % height, 0))
+
+    results["mss+bgra"] = measure(mss_path, frames)
+
+    def gdi_path(i):
+        capture[0, 0, 0] = i & 0xFF  # BitBlt escribe en la sección DIB, que es el buffer del anillo
+        composer.compose(capture, dst, (i % width, i % height, 0))
+
+    results["gdi+bgra"] = measure(gdi_path, frames)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--resolution", nargs="*", default=RESOLUTIONS)
+    args = parser.parse_args()
+
+    print(f"{'resolution':>10} {'path':>8} {'ms/frame':>9} {'peak growth':>12} {'retained':>9}")
+    for resolution in args.resolution:
+        for path, result in run(resolution, args.frames).items():
+            print(f"{resolution:>10} {path:>8} {result['ms_per_frame']:>9} "
+                  f"{result['peak_growth_bytes']:>12} {result['retained_bytes']:>9}")
+
+
+if __name__ == "__main__":
+    main()
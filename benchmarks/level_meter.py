@@ -0,0 +1,56 @@
+"""Coste por bloque del medidor de niveles frente a la norma que usaba la prueba de micrófono.
+
+Uso: python -m benchmarks.level_meter [--rate 48000] [--channels 2] [--blocks 2000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from recorder.meter import LevelMeter
+
+BLOCK_SIZES = [128, 256, 512, 1024, 2048]
+
+
+def legacy_level(indata):
+    # Nivel tal y como lo calculaba el callback de start_mic_test()
+    return min(100, int(np.linalg.norm(indata) * 10))
+
+
+def time_blocks(process, blocks):
+    for block in blocks[:20]:
+        process(block)
+    started = time.perf_counter()
+    for block in blocks:
+        process(block)
+    return (time.perf_counter() - started) / len(blocks)
+
+
+def make_blocks(rate, channels, frames, count):
+    t = np.arange(frames * count) / rate
+    signal = np.sin(2 * np.pi * 440 * t) * 0.3 * (0.6 + 0.4 * np.sin(2 * np.pi * 0.5 * t))
+    samples = np.repeat(signal[:, None], channels, axis=1).astype(np.float32)
+    return [samples[i * frames:(i + 1) * frames] for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=48000)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--blocks", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'frames':>6} {'legacy us':>10} {'meter us':>9} {'% of realtime':>14} {'published':>10}")
+    for frames in BLOCK_SIZES:
+        blocks = make_blocks(args.rate, args.channels, frames, args.blocks)
+        meter = LevelMeter(args.channels, args.rate)
+        legacy = time_blocks(legacy_level, blocks)
+        metered = time_blocks(meter.process, blocks)
+        realtime = metered / (frames / args.rate) * 100
+        # Publicaciones por segundo de audio: lo que llega a la interfaz, en lugar de una señal por bloque
+        published = meter.published / ((args.blocks + 20) * frames / args.rate)
+        print(f"{frames:>6} {legacy * 1e6:>10.1f} {metered * 1e6:>9.1f} {realtime:>13.3f}% {published:>8.1f}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Benchmark de extremo a extremo de captura -> composición -> codificación -> mux.
+
+Graba con el motor sin interfaz usando la fuente sintética, cursor simulado y
+tono de audio, para cada resolución y fps. Cada combinación se ejecuta en un
+proceso aparte para que la memoria máxima y la CPU no se mezclen entre casos.
+
+Uso:
+  python -m benchmarks.pipeline_e2e [--resolution 1280x720 ...] [--fps 30 ...] [--seconds 5]
+  python -m benchmarks.pipeline_e2e --save baseline.json
+  python -m benchmarks.pipeline_e2e --compare baseline.json [--tolerance 0.15]
+
+Con --compare sale con código 1 si algún caso empeora más allá de la tolerancia.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from recorder.encoders import ENCODER_BACKENDS
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RESOLUTIONS = ["1280x720", "1920x1080", "3840x2160"]
+FPS_VALUES = [15, 30, 60, 120]
+
+# (métrica, True si más alto es mejor, holgura absoluta además de la relativa)
+CHECKS = [
+    ("achieved_fps", True, 0.5),
+    ("latency_p99_ms", False, 2.0),
+    ("dropped", False, 2),
+    ("peak_rss_mb", False, 10.0),
+    ("cpu_percent", False, 5.0),
+]
+
+
+def peak_rss_mb(who):
+    if resource is None:
+        return None
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(who).ru_maxrss / scale, 1)
+
+
+def run_case(resolution, fps, seconds, encoder, motion):
+    from recorder.engine import Recorder, RecorderConfig
+
+    width, height = (int(value) for value in resolution.split("x"))
+    with tempfile.TemporaryDirectory() as folder:
+        config = RecorderConfig(
+            os.path.join(folder, "bench.mkv"),
+            {'left': 0, 'top': 0, 'width': width, 'height': height},
+            fps=fps,
+            cursor_style="Default",
+            encoder=encoder,
+            source="synthetic",
+            motion=motion,
+            cursor_provider="scripted",
+            synthetic_audio=True,
+            tmp_dir=os.path.join(folder, "tmp"),
+        )
+        recorder = Recorder(config, logger=lambda message: None)
+        cpu_started = os.times()
+        wall_started = time.perf_counter()
+        recorder.record(seconds)
+        wall = time.perf_counter() - wall_started
+        cpu = os.times()
+        output_bytes = os.path.getsize(config.output) if os.path.exists(config.output) else 0
+
+    pipeline = recorder.pipeline
+    timing = pipeline.timing()
+    stats = pipeline.stats()
+    elapsed = seconds
+    stages = {}
+    ring_drops = 0
+    for name, stage in stats.items():
+        ring_drops += stage.get("dropped", 0)
+        stages[name] = {
+            "throughput_fps": round(stage["frames"] / elapsed, 2),
+            "p50_ms": stage["p50_ms"],
+            "p99_ms": stage["p99_ms"],
+            "dropped": stage.get("dropped", 0),
+            "cpu_percent": round(stage["cpu_seconds"] / elapsed * 100, 1),
+        }
+    process_cpu = (cpu.user - cpu_started.user) + (cpu.system - cpu_started.system)
+    encoder_cpu = (cpu.children_user - cpu_started.children_user) + (cpu.children_system - cpu_started.children_system)
+    cores = os.cpu_count() or 1
+    audio = recorder.mixer.stats()["sources"]["synthetic"] if recorder.mixer else {}
+    return {
+        "resolution": resolution,
+        "target_fps": fps,
+        "achieved_fps": timing["achieved_fps"],
+        "latency_p50_ms": timing["latency_p50_ms"],
+        "latency_p99_ms": timing["latency_p99_ms"],
+        # Frames que no llegaron al vídeo: ticks perdidos, descartes en las colas y en el escritor CFR
+        "dropped": timing["missed_ticks"] + ring_drops + timing["dropped"],
+        "duplicated": timing["duplicated"],
+        "audio_underrun_frames": audio.get("underrun_frames", 0),
+        "stages": stages,
+        "wall_seconds": round(wall, 3),
+        "cpu_percent": round(process_cpu / elapsed * 100, 1),
+        "cpu_per_core_percent": round(process_cpu / elapsed * 100 / cores, 1),
+        "encoder_cpu_percent": round(encoder_cpu / elapsed * 100, 1),
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "encoder_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        "output_mb": round(output_bytes / 1024 / 1024, 2),
+        "failed": pipeline.failed,
+    }
+
+
+def run_isolated(resolution, fps, args):
+    command = [sys.executable, "-m", "benchmarks.pipeline_e2e", "--case", resolution, str(fps),
+               "--seconds", str(args.seconds), "--encoder", args.encoder, "--motion", str(args.motion)]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"resolution": resolution, "target_fps": fps, "error": result.stderr.strip().splitlines()[-1:]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None or "error" in previous:
+            continue
+        if "error" in current:
+            regressions.append(f"{key}: failed ({current['error']})")
+            continue
+        for metric, higher_is_better, slack in CHECKS:
+            old, new = previous.get(metric), current.get(metric)
+            if old is None or new is None:
+                continue
+            if higher_is_better and new < old * (1 - tolerance) - slack:
+                regressions.append(f"{key}: {metric} {old} -> {new}")
+            elif not higher_is_better and new > old * (1 + tolerance) + slack:
+                regressions.append(f"{key}: {metric} {old} -> {new}")
+    return regressions
+
+
+def print_table(results):
+    print(f"{'case':>16} {'fps':>7} {'p50 ms':>7} {'p99 ms':>7} {'drop':>5} {'dup':>5} {'cpu %':>6} "
+          f"{'ffmpeg %':>8} {'rss MB':>7}  stages (fps / p99 ms / cpu %)")
+    for key, r in results.items():
+        if "error" in r:
+            print(f"{key:>16} error: {r['error']}")
+            continue
+        stages = "  ".join(f"{name} {s['throughput_fps']:.0f}/{s['p99_ms']:.1f}/{s['cpu_percent']:.0f}"
+                           for name, s in r["stages"].items())
+        print(f"{key:>16} {r['achieved_fps']:>7.2f} {r['latency_p50_ms']:>7.1f} {r['latency_p99_ms']:>7.1f} "
+              f"{r['dropped']:>5} {r['duplicated']:>5} {r['cpu_percent']:>6.0f} {r['encoder_cpu_percent']:>8.0f} "
+              f"{r['peak_rss_mb']!s:>7}  {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolution", nargs="+", default=RESOLUTIONS)
+    parser.add_argument("--fps", nargs="+", type=int, default=FPS_VALUES)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--encoder", choices=list(ENCODER_BACKENDS), default="x264")
+    parser.add_argument("--motion", type=float, default=0.1)
+    parser.add_argument("--save", metavar="PATH", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="fail if results regress against this baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--case", nargs=2, metavar=("RESOLUTION", "FPS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case[0], int(args.case[1]), args.seconds, args.encoder, args.motion)))
+        return
+
+    results = {}
+    for resolution in args.resolution:
+        for fps in args.fps:
+            results[f"{resolution}@{fps}"] = run_isolated(resolution, fps, args)
+    print_table(results)
+
+    if args.save:
+        document = {
+            "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                        "cpu_count": os.cpu_count(), "processor": platform.processor()},
+            "settings": {"seconds": args.seconds, "encoder": args.encoder, "motion": args.motion},
+            "results": results,
+        }
+        with open(args.save, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Coste de la repetición instantánea frente a grabar a fichero.
+
+Graba lo mismo (fuente sintética, tono de audio) dos veces: escribiendo el
+fichero como siempre y guardando solo los últimos segundos en el anillo en
+memoria. Para cada modo se mide la CPU de toda la grabación (proceso y ffmpeg),
+la memoria máxima y, en modo repetición, lo que tarda en volcarse el anillo.
+Cada modo se ejecuta en un proceso aparte para que la memoria no se mezcle.
+
+Uso:
+  python -m benchmarks.replay_overhead [--resolution 1920x1080] [--fps 30] [--seconds 20] [--replay 10]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MODES = ["file", "replay"]
+
+
+def peak_rss_mb(who):
+    if resource is None:
+        return None
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(who).ru_maxrss / scale, 1)
+
+
+def run_case(mode, resolution, fps, seconds, replay_seconds, extension):
+    from recorder.engine import Recorder, RecorderConfig
+
+    width, height = (int(value) for value in resolution.split("x"))
+    with tempfile.TemporaryDirectory() as folder:
+        config = RecorderConfig(
+            os.path.join(folder, "bench" + extension),
+            {'left': 0, 'top': 0, 'width': width, 'height': height},
+            fps=fps,
+            source="synthetic",
+            synthetic_audio=True,
+            replay_seconds=replay_seconds if mode == "replay" else 0,
+            tmp_dir=os.path.join(folder, "tmp"),
+        )
+        recorder = Recorder(config, logger=lambda message: None)
+        # os.times() solo cuenta a ffmpeg cuando termina: se mide de start() a stop()
+        cpu_started = os.times()
+        wall_started = time.perf_counter()
+        recorder.start()
+        time.sleep(seconds)
+
+        result = {"mode": mode}
+        if mode == "replay":
+            flush_started = time.perf_counter()
+            path = recorder.save_replay(os.path.join(folder, "replay" + extension))
+            result["flush_ms"] = round((time.perf_counter() - flush_started) * 1000, 1)
+            result["replay_mb"] = round(os.path.getsize(path) / 1024 / 1024, 2) if path else 0
+            result["ring"] = recorder.replay.stats()
+        recorder.stop()
+        wall = time.perf_counter() - wall_started
+        cpu = os.times()
+
+    process_cpu = (cpu.user - cpu_started.user) + (cpu.system - cpu_started.system)
+    encoder_cpu = (cpu.children_user - cpu_started.children_user) + (cpu.children_system - cpu_started.children_system)
+    result.update({
+        "achieved_fps": recorder.pipeline.timing()["achieved_fps"],
+        "cpu_percent": round(process_cpu / wall * 100, 1),
+        "encoder_cpu_percent": round(encoder_cpu / wall * 100, 1),
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "failed": recorder.pipeline.failed,
+    })
+    return result
+
+
+def run_isolated(mode, args):
+    command = [sys.executable, "-m", "benchmarks.replay_overhead", "--case", mode,
+               "--resolution", args.resolution, "--fps", str(args.fps), "--seconds", str(args.seconds),
+               "--replay", str(args.replay), "--extension", args.extension]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"mode": mode, "error": result.stderr.strip().splitlines()[-1:]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resolution", default="1920x1080")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--seconds", type=float, default=20.0, help="seconds recorded per mode")
+    parser.add_argument("--replay", type=float, default=10.0, help="seconds kept by the replay ring")
+    parser.add_argument("--extension", default=".mp4", help=".ts writes the ring as is, others remux it")
+    parser.add_argument("--case", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.resolution, args.fps, args.seconds, args.replay,
+                                  args.extension)))
+        return
+
+    print(f"{'mode':>8} {'fps':>7} {'cpu %':>6} {'ffmpeg %':>8} {'rss MB':>7} {'flush ms':>9} {'replay MB':>10}")
+    for mode in MODES:
+        r = run_isolated(mode, args)
+        if "error" in r:
+            print(f"{mode:>8} error: {r['error']}")
+            continue
+        print(f"{mode:>8} {r['achieved_fps']:>7.2f} {r['cpu_percent']:>6.0f} {r['encoder_cpu_percent']:>8.0f} "
+              f"{r['peak_rss_mb']!s:>7} {r.get('flush_ms', '-')!s:>9} {r.get('replay_mb', '-')!s:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Tiempo de arranque: hasta que aparece la ventana y hasta el primer frame grabado.
+
+Cada medida se ejecuta en un proceso nuevo (sin módulos ya cargados) y se
+cuenta desde que se lanza el proceso, así que incluye el arranque del
+intérprete y todas las importaciones:
+
+  imports      módulos que carga la ventana antes de mostrarse
+  window       ventana principal construida y pintada (Qt con QT_QPA_PLATFORM=offscreen)
+  first_frame  ``Recorder`` con fuente sintética hasta que el primer frame llega al codificador
+
+Con ``--importtime`` se listan además las importaciones más lentas de cada caso
+(``python -X importtime``).
+
+Uso:
+  python -m benchmarks.startup [--runs 3] [--importtime]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+CASES = ["imports", "window", "first_frame"]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Lo que ``main.py`` importa de ``recorder`` antes de mostrar la ventana
+WINDOW_MODULES = ["recorder.devices", "recorder.encoders", "recorder.jobs", "recorder.options", "recorder.thumbnails"]
+HEAVY_MODULES = ["numpy", "cv2", "mss", "sounddevice", "recorder.engine"]
+
+
+def run_imports(spawned):
+    import importlib
+
+    for name in WINDOW_MODULES:
+        importlib.import_module(name)
+    return {"ms": round((time.time() - spawned) * 1000, 1),
+            "heavy_loaded": [name for name in HEAVY_MODULES if name in sys.modules]}
+
+
+def run_window(spawned):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5 import QtWidgets
+
+    app = QtWidgets.QApplication(sys.argv)
+    import main
+
+    window = main.ScreenRecorderApp()
+    app.processEvents()
+    result = {"ms": round((time.time() - spawned) * 1000, 1),
+              "heavy_loaded": [name for name in HEAVY_MODULES if name in sys.modules]}
+    window.close()
+    return result
+
+
+def run_first_frame(spawned):
+    from recorder.engine import Recorder, RecorderConfig
+
+    with tempfile.TemporaryDirectory() as folder:
+        config = RecorderConfig(
+            os.path.join(folder, "bench.mp4"),
+            {'left': 0, 'top': 0, 'width': 1280, 'height': 720},
+            fps=30,
+            source="synthetic",
+            tmp_dir=os.path.join(folder, "tmp"),
+        )
+        recorder = Recorder(config, logger=lambda message: None)
+        started = time.time()
+        recorder.start()
+        while recorder.pipeline.writer.written == 0 and not recorder.pipeline.failed:
+            time.sleep(0.001)
+        first_frame = time.time()
+        recorder.stop()
+    return {"ms": round((first_frame - spawned) * 1000, 1),
+            "from_start_ms": round((first_frame - started) * 1000, 1),
+            "failed": recorder.pipeline.failed}
+
+
+def run_isolated(case, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-m", "benchmarks.startup", "--case", case, "--spawned", repr(time.time())]
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    # La ventana crea sus carpetas en el directorio actual
+    with tempfile.TemporaryDirectory() as folder:
+        result = subprocess.run(command, capture_output=True, text=True, cwd=folder, env=environment)
+    if result.returncode != 0:
+        return {"case": case, "error": result.stderr.strip().splitlines()[-1:]}, []
+    return json.loads(result.stdout.strip().splitlines()[-1]), slowest_imports(result.stderr)
+
+
+def slowest_imports(stderr, count=8):
+    # Líneas de -X importtime: "import time: self [us] | cumulative | imported package"
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="runs per case; the median is reported")
+    parser.add_argument("--importtime", action="store_true", help="list the slowest top-level imports of each case")
+    parser.add_argument("--case", choices=CASES, help=argparse.SUPPRESS)
+    parser.add_argument("--spawned", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run = {"imports": run_imports, "window": run_window, "first_frame": run_first_frame}[args.case]
+        print(json.dumps(run(args.spawned)))
+        return
+
+    print(f"{'case':>12} {'ms':>8} {'start ms':>9}  heavy modules loaded")
+    for case in CASES:
+        results = [run_isolated(case) for _ in range(args.runs)]
+        errors = [r for r, _ in results if "error" in r]
+        if errors:
+            print(f"{case:>12} error: {errors[0]['error']}")
+            continue
+        r = sorted((r for r, _ in results), key=lambda r: r["ms"])[len(results) // 2]
+        print(f"{case:>12} {r['ms']:>8.1f} {r.get('from_start_ms', '-')!s:>9}  {', '.join(r.get('heavy_loaded', [])) or '-'}")
+        if args.importtime:
+            _, imports = run_isolated(case, importtime=True)
+            for cumulative, name in imports:
+                print(f"{'':>12} {cumulative / 1000:>8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,23 @@
 import sys
 import time
-import numpy as np
-import sounddevice as sd
-import pyaudio
-import wave
-import mss
-import cv2
+import multiprocessing
+import importlib
 import os
 import subprocess
+# Se cargan al arrancar a propósito: los iconos de qtawesome y los monitores de screeninfo
+# forman parte de la primera ventana; lo pesado (NumPy, OpenCV, mss, sounddevice) se carga después
 import qtawesome as qta
 from screeninfo import get_monitors
-from moviepy.editor import VideoFileClip, AudioFileClip
 from PyQt5 import QtWidgets, QtGui, QtCore
-from PyQt5.QtWidgets import QFileDialog, QLabel, QVBoxLayout, QComboBox, QPushButton, QLineEdit, QTextEdit, QWidget, QGridLayout, QHBoxLayout, QCheckBox, QSlider, QProgressBar, QTabWidget, QShortcut
+from PyQt5.QtWidgets import QFileDialog, QLabel, QVBoxLayout, QComboBox, QPushButton, QLineEdit, QTextEdit, QWidget, QGridLayout, QHBoxLayout, QCheckBox, QSlider, QSpinBox, QProgressBar, QTabWidget, QShortcut, QListWidget, QListWidgetItem
 from PyQt5.QtGui import QPixmap, QImage, QFont, QKeySequence
 from PyQt5.QtCore import Qt, pyqtSignal, QObject
-from threading import Thread
-import win32api
-import win32gui
-import win32con
-import win32ui
+from threading import Event, Thread
+from recorder.devices import AudioDeviceRegistry
+from recorder.encoders import ENCODER_BACKENDS, PRESETS
+from recorder.jobs import CANCELLED, FAILED, RUNNING, JobQueue
+from recorder.options import BLOCK, CURSOR_STYLES, DROP_NEWEST, DROP_OLDEST, SEPARATE, STITCH
+from recorder.thumbnails import ThumbnailWorker, geometry_key
 
 # Configurar logging
 import logging
@@ -28,8 +26,46 @@ logging.basicConfig(filename='app.log', filemode='w', level=logging.DEBUG)
 class Communicate(QObject):
     log_signal = pyqtSignal(str)
     update_timer_signal = pyqtSignal(str)
-    update_progress_signal = pyqtSignal(int)
-    update_mic_progress_signal = pyqtSignal(int)
+    job_signal = pyqtSignal(str, str, str, int)
+    thumbnail_signal = pyqtSignal(object, object)
+    devices_signal = pyqtSignal(object)
+    recording_failed_signal = pyqtSignal(str, object)
+    replay_failed_signal = pyqtSignal(str)
+
+class RegionSelector(QLabel):
+    # Miniatura del monitor sobre la que se arrastra el rectángulo a grabar
+    def __init__(self, pixmap, monitor):
+        super().__init__()
+        self.setPixmap(pixmap)
+        self.setFixedSize(pixmap.size())
+        self.monitor = monitor
+        self.origin = None
+        self.selection = None
+        self.rubber_band = QtWidgets.QRubberBand(QtWidgets.QRubberBand.Rectangle, self)
+
+    def mousePressEvent(self, event):
+        self.origin = event.pos()
+        self.rubber_band.setGeometry(QtCore.QRect(self.origin, QtCore.QSize()))
+        self.rubber_band.show()
+
+    def mouseMoveEvent(self, event):
+        if self.origin is not None:
+            self.rubber_band.setGeometry(QtCore.QRect(self.origin, event.pos()).normalized())
+
+    def mouseReleaseEvent(self, event):
+        if self.origin is None:
+            return
+        rect = QtCore.QRect(self.origin, event.pos()).normalized().intersected(self.rect())
+        self.origin = None
+        if rect.width() < 4 or rect.height() < 4:
+            self.rubber_band.hide()
+            self.selection = None
+            return
+        # De píxeles de la miniatura a píxeles del monitor
+        scale_x = self.monitor.width / self.width()
+        scale_y = self.monitor.height / self.height()
+        self.selection = {'left': int(rect.x() * scale_x), 'top': int(rect.y() * scale_y),
+                          'width': int(rect.width() * scale_x), 'height': int(rect.height() * scale_y)}
 
 class ScreenRecorderApp(QtWidgets.QWidget):
     def __init__(self):
@@ -37,23 +73,31 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         self.comm = Communicate()
         self.comm.log_signal.connect(self.log)
         self.comm.update_timer_signal.connect(self.update_timer)
-        self.comm.update_progress_signal.connect(self.update_progress)
-        self.comm.update_mic_progress_signal.connect(self.update_mic_progress)
+        self.comm.job_signal.connect(self.update_job)
+        self.comm.thumbnail_signal.connect(self.update_thumbnail)
+        self.comm.devices_signal.connect(self.update_mic_devices)
+        self.comm.recording_failed_signal.connect(self.recording_failed)
+        self.comm.replay_failed_signal.connect(self.replay_failed)
 
         # Variables de grabación
         self.recording = False
-        self.processing = False
         self.mic_testing = False
         self.selected_screen = None
+        self.selected_screens = []
+        self.selected_region = None
         self.selected_mic = None
         self.selected_button = None
+        self.active_recorder = None
+        # Cada grabación tiene su propio aviso de parada: un hilo anterior que aún esté cerrando no ve la siguiente
+        self.stop_event = None
+        self.preview_sequence = 0
         self.filepath = "grabaciones"
         self.fps = 15
-        self.device_info = sd.query_devices(kind='input')
         self.monitors = get_monitors()
 
-        # Configuración del atajo de teclado
+        # Configuración de los atajos de teclado
         self.shortcut = None
+        self.replay_shortcut = None
 
         # Crear la carpeta de grabaciones si no existe
         if not os.path.exists(self.filepath):
@@ -62,11 +106,32 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         if not os.path.exists(self.tmp_filepath):
             os.makedirs(self.tmp_filepath)
 
+        # Los micrófonos de la última sesión salen de la caché; PortAudio se inicializa después, en otro hilo
+        self.audio_devices = AudioDeviceRegistry(os.path.join(self.tmp_filepath, "audio_devices.json"),
+                                                 on_change=self.comm.devices_signal.emit,
+                                                 logger=self.comm.log_signal.emit)
+
         # Configuración de la interfaz
         self.init_ui()
 
-    def update_mic_progress(self, value):
-        self.mic_progress_bar.setValue(value)
+        # Las miniaturas se capturan en segundo plano; la ventana aparece con marcadores
+        self.thumbnails = ThumbnailWorker(self.comm.thumbnail_signal.emit, logger=self.comm.log_signal.emit)
+        self.thumbnails.set_monitors([self.monitor_bbox(monitor) for monitor in self.monitors])
+        QtCore.QTimer.singleShot(0, self.start_background_work)
+
+        # Las grabaciones que hay que unir con el audio se procesan en otros procesos, sin bloquear la siguiente
+        self.job_items = {}
+        self.jobs = JobQueue(os.path.join(self.tmp_filepath, "jobs"),
+                             on_update=lambda job: self.comm.job_signal.emit(job.id, job.output, job.state, job.progress),
+                             logger=self.comm.log_signal.emit)
+        for job in self.jobs.pending():
+            self.update_job(job.id, job.output, job.state, job.progress)
+
+    def start_background_work(self):
+        # Con la ventana ya pintada: miniaturas, dispositivos de audio y el motor de grabación se cargan en otros hilos
+        self.thumbnails.start()
+        self.audio_devices.start()
+        Thread(target=importlib.import_module, args=("recorder.engine",), name="preload-engine", daemon=True).start()
 
     def init_ui(self):
         self.setWindowTitle("Screen Recorder Pro")
@@ -167,7 +232,7 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         # Ventana reducida para grabación
         self.mini_window = QWidget()
         self.mini_window.setWindowTitle("Recording")
-        self.mini_window.setFixedSize(400, 150)
+        self.mini_window.setFixedSize(400, 170)
         self.mini_window.setStyleSheet("""
             QWidget {
                 background-color: #2c3e50;
@@ -202,6 +267,19 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         self.mini_timer_label.setFont(QFont("Arial", 18))
         mini_layout.addWidget(self.mini_timer_label)
 
+        self.mini_level_bar = QProgressBar()
+        self.mini_level_bar.setMaximum(100)
+        self.mini_level_bar.setTextVisible(False)
+        self.mini_level_bar.setFixedHeight(10)
+        self.mini_level_bar.setVisible(False)
+        mini_layout.addWidget(self.mini_level_bar)
+
+        self.mini_preview_label = QLabel()
+        self.mini_preview_label.setAlignment(Qt.AlignCenter)
+        self.mini_preview_label.setFixedSize(320, 180)
+        self.mini_preview_label.setVisible(False)
+        mini_layout.addWidget(self.mini_preview_label, alignment=Qt.AlignCenter)
+
         button_layout = QHBoxLayout()
         self.mini_stop_button = QPushButton("Stop Recording")
         self.mini_stop_button.setFixedSize(150, 40)
@@ -220,6 +298,16 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         mini_layout.addLayout(button_layout)
         self.mini_window.setLayout(mini_layout)
 
+        # La vista previa se consulta a ritmo fijo: solo se pinta el último frame publicado
+        self.preview_timer = QtCore.QTimer(self)
+        self.preview_timer.setInterval(100)
+        self.preview_timer.timeout.connect(self.update_preview)
+
+        # Igual con los niveles de audio: el hilo de audio publica y la interfaz lee ~30 veces por segundo
+        self.level_timer = QtCore.QTimer(self)
+        self.level_timer.setInterval(33)
+        self.level_timer.timeout.connect(self.update_levels)
+
         self.show()
 
     def show_main_window(self):
@@ -231,25 +319,40 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         layout = QVBoxLayout()
 
         screen_selection_layout = QVBoxLayout()
-        screen_selection_label = QLabel("Select Screen to Record:")
+        screen_selection_label = QLabel("Select Screen to Record (Ctrl+Click to Add More):")
         screen_selection_layout.addWidget(screen_selection_label)
 
         self.screen_grid = QGridLayout()
-        self.screen_buttons = []
+        self.screen_buttons = {}
         screen_width = self.size().width() - 40  # Allow some padding
         screen_height = int(screen_width * 9 / 16)  # Assuming a 16:9 aspect ratio
 
         for i, monitor in enumerate(self.monitors):
-            screenshot = self.capture_screen(monitor)
             btn = QPushButton()
-            btn.setIcon(QtGui.QIcon(screenshot))
+            btn.setIcon(QtGui.QIcon(self.placeholder_pixmap(monitor)))
             btn.setIconSize(QtCore.QSize(screen_width // 2 - 20, screen_height // 2 - 20))
             btn.setStyleSheet("background: transparent; border: none;")
             btn.clicked.connect(lambda _, m=monitor, b=btn: self.select_screen(m, b))
             btn.setToolTip(f"Select {monitor.name}")
-            self.screen_buttons.append(btn)
+            self.screen_buttons[geometry_key(self.monitor_bbox(monitor))] = btn
             self.screen_grid.addWidget(btn, i // 2, i % 2)
         screen_selection_layout.addLayout(self.screen_grid)
+
+        # Grabar solo una parte del monitor: se captura únicamente ese rectángulo
+        region_layout = QHBoxLayout()
+        self.select_region_button = QPushButton("Select Region")
+        self.select_region_button.setIcon(qta.icon('fa.crop'))
+        self.select_region_button.setEnabled(False)
+        self.select_region_button.clicked.connect(self.select_region)
+        region_layout.addWidget(self.select_region_button)
+        self.full_screen_button = QPushButton("Full Screen")
+        self.full_screen_button.setIcon(qta.icon('fa.desktop'))
+        self.full_screen_button.setEnabled(False)
+        self.full_screen_button.clicked.connect(self.clear_region)
+        region_layout.addWidget(self.full_screen_button)
+        self.region_label = QLabel("")
+        region_layout.addWidget(self.region_label)
+        screen_selection_layout.addLayout(region_layout)
         layout.addLayout(screen_selection_layout)
 
         recording_controls = QHBoxLayout()
@@ -267,6 +370,15 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         self.open_mini_button.clicked.connect(self.show_mini_window)
         recording_controls.addWidget(self.open_mini_button, alignment=Qt.AlignCenter)
 
+        # Solo en modo repetición instantánea: guarda los últimos segundos sin parar
+        self.save_replay_button = QPushButton("Save Replay")
+        self.save_replay_button.setFixedSize(150, 40)
+        self.save_replay_button.setIcon(qta.icon('fa.history'))
+        self.save_replay_button.setIconSize(QtCore.QSize(24, 24))
+        self.save_replay_button.clicked.connect(self.save_replay)
+        self.save_replay_button.setVisible(False)
+        recording_controls.addWidget(self.save_replay_button, alignment=Qt.AlignCenter)
+
         layout.addLayout(recording_controls)
 
         self.timer_label = QLabel("00:00:00")
@@ -275,10 +387,39 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         self.timer_label.setVisible(False)
         layout.addWidget(self.timer_label, alignment=Qt.AlignCenter)
 
-        self.loading_label = QLabel("Processing...")
-        self.loading_label.setAlignment(Qt.AlignCenter)
-        self.loading_label.setVisible(False)
-        layout.addWidget(self.loading_label, alignment=Qt.AlignCenter)
+        self.level_bar = QProgressBar()
+        self.level_bar.setMaximum(100)
+        self.level_bar.setFixedWidth(480)
+        self.level_bar.setVisible(False)
+        layout.addWidget(self.level_bar, alignment=Qt.AlignCenter)
+
+        self.preview_label = QLabel()
+        self.preview_label.setAlignment(Qt.AlignCenter)
+        self.preview_label.setFixedSize(480, 270)
+        self.preview_label.setVisible(False)
+        layout.addWidget(self.preview_label, alignment=Qt.AlignCenter)
+
+        # Trabajos de finalización en segundo plano (solo sin codificación directa con ffmpeg)
+        self.jobs_widget = QWidget()
+        jobs_layout = QVBoxLayout()
+        jobs_layout.setContentsMargins(0, 0, 0, 0)
+        jobs_layout.addWidget(QLabel("Processing:"))
+        self.jobs_list = QListWidget()
+        self.jobs_list.setMaximumHeight(100)
+        jobs_layout.addWidget(self.jobs_list)
+        jobs_buttons = QHBoxLayout()
+        self.cancel_job_button = QPushButton("Cancel")
+        self.cancel_job_button.setIcon(qta.icon('fa.times-circle'))
+        self.cancel_job_button.clicked.connect(self.cancel_job)
+        jobs_buttons.addWidget(self.cancel_job_button)
+        self.resume_job_button = QPushButton("Resume")
+        self.resume_job_button.setIcon(qta.icon('fa.refresh'))
+        self.resume_job_button.clicked.connect(self.resume_job)
+        jobs_buttons.addWidget(self.resume_job_button)
+        jobs_layout.addLayout(jobs_buttons)
+        self.jobs_widget.setLayout(jobs_layout)
+        self.jobs_widget.setVisible(False)
+        layout.addWidget(self.jobs_widget)
 
         recording_tab.setLayout(layout)
         return recording_tab
@@ -317,7 +458,7 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         self.filename_input = QLineEdit("recording")
         name_and_extension_layout.addWidget(self.filename_input, 0, 1)
         self.extension_combo = QComboBox()
-        self.extension_combo.addItems([".mp4", ".avi", ".mov"])
+        self.extension_combo.addItems([".mp4", ".avi", ".mov", ".mkv"])
         name_and_extension_layout.addWidget(self.extension_combo, 0, 2)
         form_layout.addLayout(name_and_extension_layout)
 
@@ -338,7 +479,7 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         audio_and_cursor_layout.addWidget(self.show_cursor_checkbox, 0, 2)
 
         self.cursor_style_combo = QComboBox()
-        self.cursor_style_combo.addItems(["Default", "White Circle", "Red Circle", "Green Circle", "Blue Circle", "Cross"])
+        self.cursor_style_combo.addItems(CURSOR_STYLES)
         audio_and_cursor_layout.addWidget(self.cursor_style_combo, 0, 3)
 
         form_layout.addLayout(audio_and_cursor_layout)
@@ -350,8 +491,7 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         mic_settings_layout.addWidget(self.mic_recording_checkbox, 0, 0)
 
         self.mic_combo = QComboBox()
-        self.mic_devices = [d for d in sd.query_devices() if d['max_input_channels'] > 0]
-        self.mic_combo.addItems([d['name'] for d in self.mic_devices])
+        self.update_mic_devices(self.audio_devices.devices())
         self.mic_combo.setEnabled(True)
         mic_settings_layout.addWidget(self.mic_combo, 0, 1)
 
@@ -361,6 +501,12 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         self.mic_volume_slider.setEnabled(True)
         mic_settings_layout.addWidget(self.mic_volume_slider, 0, 2)
 
+        self.refresh_mic_button = QPushButton()
+        self.refresh_mic_button.setIcon(qta.icon('fa.refresh'))
+        self.refresh_mic_button.setToolTip("Rescan audio devices")
+        self.refresh_mic_button.clicked.connect(self.audio_devices.refresh)
+        mic_settings_layout.addWidget(self.refresh_mic_button, 0, 3)
+
         self.test_mic_button = QPushButton("Test")
         self.test_mic_button.setIcon(qta.icon('fa.microphone'))
         self.test_mic_button.setIconSize(QtCore.QSize(24, 24))
@@ -386,6 +532,152 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         shortcut_layout.addWidget(self.shortcut_input)
         form_layout.addLayout(shortcut_layout)
 
+        # Repetición instantánea: se graba a un anillo en memoria y solo se escribe al guardar
+        replay_layout = QHBoxLayout()
+        self.replay_checkbox = QCheckBox("Instant Replay (keep last seconds in memory)")
+        self.replay_checkbox.setChecked(False)
+        self.replay_checkbox.stateChanged.connect(self.toggle_replay_controls)
+        replay_layout.addWidget(self.replay_checkbox)
+        replay_layout.addWidget(QLabel("Seconds:"))
+        self.replay_seconds_spin = QSpinBox()
+        self.replay_seconds_spin.setRange(5, 600)
+        self.replay_seconds_spin.setValue(30)
+        self.replay_seconds_spin.setEnabled(False)
+        replay_layout.addWidget(self.replay_seconds_spin)
+        replay_layout.addWidget(QLabel("Memory Cap (MB):"))
+        self.replay_memory_spin = QSpinBox()
+        self.replay_memory_spin.setRange(32, 4096)
+        self.replay_memory_spin.setValue(256)
+        self.replay_memory_spin.setEnabled(False)
+        replay_layout.addWidget(self.replay_memory_spin)
+        form_layout.addLayout(replay_layout)
+
+        replay_shortcut_layout = QHBoxLayout()
+        replay_shortcut_layout.addWidget(QLabel("Set Shortcut for Save Replay:"))
+        self.replay_shortcut_input = QLineEdit()
+        self.replay_shortcut_input.setPlaceholderText("Press a key combination")
+        self.replay_shortcut_input.setReadOnly(True)
+        self.replay_shortcut_input.setFocusPolicy(Qt.StrongFocus)
+        self.replay_shortcut_input.keyPressEvent = self.set_replay_shortcut
+        replay_shortcut_layout.addWidget(self.replay_shortcut_input)
+        form_layout.addLayout(replay_shortcut_layout)
+
+        # Códec, preset y calidad; "Auto" mide la CPU y elige el mejor que aguante los FPS
+        encoder_layout = QHBoxLayout()
+        encoder_layout.addWidget(QLabel("Encoder:"))
+        self.encoder_combo = QComboBox()
+        self.encoder_combo.addItem("Auto (Probe CPU)", "auto")
+        for backend in ENCODER_BACKENDS.values():
+            self.encoder_combo.addItem(backend.label, backend.name)
+        self.encoder_combo.setCurrentIndex(self.encoder_combo.findData("x264"))
+        encoder_layout.addWidget(self.encoder_combo)
+        encoder_layout.addWidget(QLabel("Preset:"))
+        self.preset_combo = QComboBox()
+        self.preset_combo.addItems(PRESETS)
+        self.preset_combo.setCurrentText("veryfast")
+        encoder_layout.addWidget(self.preset_combo)
+        encoder_layout.addWidget(QLabel("Quality (CRF):"))
+        self.crf_spin = QSpinBox()
+        self.crf_spin.setRange(0, 51)
+        self.crf_spin.setValue(23)
+        encoder_layout.addWidget(self.crf_spin)
+        form_layout.addLayout(encoder_layout)
+
+        # Resolución de salida: la captura se reduce antes de convertir y codificar
+        resolution_layout = QHBoxLayout()
+        resolution_layout.addWidget(QLabel("Output Resolution:"))
+        self.output_size_combo = QComboBox()
+        self.output_size_combo.addItem("Native", None)
+        for label, size in (("2160p", (3840, 2160)), ("1440p", (2560, 1440)), ("1080p", (1920, 1080)),
+                            ("720p", (1280, 720)), ("480p", (854, 480))):
+            self.output_size_combo.addItem(label, size)
+        resolution_layout.addWidget(self.output_size_combo)
+        resolution_layout.addWidget(QLabel("Scaling:"))
+        self.interpolation_combo = QComboBox()
+        self.interpolation_combo.addItem("Area (Sharpest)", "area")
+        self.interpolation_combo.addItem("Linear (Fastest)", "linear")
+        self.interpolation_combo.addItem("2x2 Box (Fast)", "box")
+        resolution_layout.addWidget(self.interpolation_combo)
+        form_layout.addLayout(resolution_layout)
+
+        # Con varios monitores seleccionados: un vídeo con todos o un fichero sincronizado por monitor
+        monitors_layout = QHBoxLayout()
+        monitors_layout.addWidget(QLabel("Multiple Monitors:"))
+        self.monitor_layout_combo = QComboBox()
+        self.monitor_layout_combo.addItem("Stitch Into One Video", STITCH)
+        self.monitor_layout_combo.addItem("Separate Synchronized Files", SEPARATE)
+        monitors_layout.addWidget(self.monitor_layout_combo)
+        form_layout.addLayout(monitors_layout)
+
+        # Grabación por segmentos para sesiones largas (0 = sin límite)
+        segment_layout = QHBoxLayout()
+        self.segment_checkbox = QCheckBox("Split Into Segments")
+        self.segment_checkbox.setChecked(False)
+        self.segment_checkbox.stateChanged.connect(self.toggle_segment_controls)
+        segment_layout.addWidget(self.segment_checkbox)
+        segment_layout.addWidget(QLabel("Every (min):"))
+        self.segment_minutes_spin = QSpinBox()
+        self.segment_minutes_spin.setRange(0, 600)
+        self.segment_minutes_spin.setValue(30)
+        self.segment_minutes_spin.setEnabled(False)
+        segment_layout.addWidget(self.segment_minutes_spin)
+        segment_layout.addWidget(QLabel("Max Size (MB):"))
+        self.segment_size_spin = QSpinBox()
+        self.segment_size_spin.setRange(0, 100000)
+        self.segment_size_spin.setValue(0)
+        self.segment_size_spin.setEnabled(False)
+        segment_layout.addWidget(self.segment_size_spin)
+        form_layout.addLayout(segment_layout)
+
+        # Solo procesar las zonas de la pantalla que cambian
+        self.damage_tracking_checkbox = QCheckBox("Skip Unchanged Screen Regions")
+        self.damage_tracking_checkbox.setChecked(False)
+        form_layout.addWidget(self.damage_tracking_checkbox)
+
+        # Política cuando la codificación no da abasto
+        drop_policy_layout = QHBoxLayout()
+        drop_policy_layout.addWidget(QLabel("When Encoding Falls Behind:"))
+        self.drop_policy_combo = QComboBox()
+        self.drop_policy_combo.addItem("Drop Oldest Frame", DROP_OLDEST)
+        self.drop_policy_combo.addItem("Drop Newest Frame", DROP_NEWEST)
+        self.drop_policy_combo.addItem("Wait (No Drops)", BLOCK)
+        drop_policy_layout.addWidget(self.drop_policy_combo)
+        form_layout.addLayout(drop_policy_layout)
+
+        # Bajar preset, escala o fps si el equipo no da abasto, y recuperarlos después
+        self.adaptive_quality_checkbox = QCheckBox("Reduce Quality Automatically Under Load")
+        self.adaptive_quality_checkbox.setChecked(False)
+        form_layout.addWidget(self.adaptive_quality_checkbox)
+
+        # Vista previa de lo que se está grabando, tomada del propio pipeline
+        preview_layout = QHBoxLayout()
+        self.preview_checkbox = QCheckBox("Show Live Preview")
+        self.preview_checkbox.setChecked(True)
+        self.preview_checkbox.stateChanged.connect(self.toggle_preview)
+        preview_layout.addWidget(self.preview_checkbox)
+        preview_layout.addWidget(QLabel("Every N Frames:"))
+        self.preview_every_spin = QSpinBox()
+        self.preview_every_spin.setRange(1, 60)
+        self.preview_every_spin.setValue(5)
+        preview_layout.addWidget(self.preview_every_spin)
+        form_layout.addLayout(preview_layout)
+
+        # Telemetría: métricas por etapa en JSON lines (y Prometheus si hay puerto) y perfilado
+        telemetry_layout = QHBoxLayout()
+        self.metrics_checkbox = QCheckBox("Export Metrics")
+        self.metrics_checkbox.setChecked(False)
+        self.metrics_checkbox.setToolTip("Write per-stage timings to a .metrics.jsonl file in the tmp folder")
+        telemetry_layout.addWidget(self.metrics_checkbox)
+        telemetry_layout.addWidget(QLabel("Prometheus Port (0 = Off):"))
+        self.metrics_port_spin = QSpinBox()
+        self.metrics_port_spin.setRange(0, 65535)
+        self.metrics_port_spin.setValue(0)
+        telemetry_layout.addWidget(self.metrics_port_spin)
+        self.profile_checkbox = QCheckBox("Profile Recording (cProfile + tracemalloc)")
+        self.profile_checkbox.setChecked(False)
+        telemetry_layout.addWidget(self.profile_checkbox)
+        form_layout.addLayout(telemetry_layout)
+
         # Add minimize on start option
         self.minimize_on_start_checkbox = QCheckBox("Minimize on Start Recording")
         self.minimize_on_start_checkbox.setChecked(True)
@@ -413,24 +705,107 @@ class ScreenRecorderApp(QtWidgets.QWidget):
         self.timer_label.setText(time_string)
         self.mini_timer_label.setText(time_string)
 
-    def update_progress(self, value):
-        self.progress_bar.setValue(value)
-
-    def capture_screen(self, monitor):
-        bbox = {'left': monitor.x, 'top': monitor.y, 'width': monitor.width, 'height': monitor.height}
-        sct_img = mss.mss().grab(bbox)
-        img = QImage(sct_img.rgb, sct_img.width, sct_img.height, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(img)
-        pixmap = pixmap.scaled(360, 202, Qt.KeepAspectRatio)  # Increased size for better visibility
+    def update_job(self, job_id, output, state, progress):
+        item = self.job_items.get(job_id)
+        if item is None:
+            item = QListWidgetItem()
+            item.setData(Qt.UserRole, job_id)
+            self.jobs_list.addItem(item)
+            self.job_items[job_id] = item
+        text = f"{os.path.basename(output)}: {state}"
+        if state == RUNNING:
+            text += f" {progress}%"
+        item.setText(text)
+        self.jobs_widget.setVisible(True)
+
+    def selected_job(self):
+        item = self.jobs_list.currentItem()
+        return item.data(Qt.UserRole) if item is not None else None
+
+    def cancel_job(self):
+        job_id = self.selected_job()
+        if job_id and self.jobs.cancel(job_id):
+            self.log(f"Cancelling {job_id}; its files are kept so it can be resumed.")
+
+    def resume_job(self):
+        job_id = self.selected_job()
+        job = self.jobs.jobs.get(job_id)
+        if job is not None and job.state in (CANCELLED, FAILED):
+            self.jobs.resume(job_id)
+
+    def monitor_bbox(self, monitor):
+        return {'left': monitor.x, 'top': monitor.y, 'width': monitor.width, 'height': monitor.height}
+
+    def placeholder_pixmap(self, monitor, width=360, height=202):
+        pixmap = QPixmap(QtCore.QSize(width, height))
+        pixmap.fill(QtGui.QColor("#34495e"))
+        painter = QtGui.QPainter(pixmap)
+        painter.setPen(QtGui.QColor("#ecf0f1"))
+        painter.drawText(pixmap.rect(), Qt.AlignCenter, f"{monitor.name}\n{monitor.width}x{monitor.height}")
+        painter.end()
         return pixmap
 
+    def thumbnail_pixmap(self, rgb, width=360, height=202):
+        # El worker ya redujo la captura con NumPy; aquí solo se ajusta al tamaño del botón
+        img = QImage(rgb.data, rgb.shape[1], rgb.shape[0], rgb.strides[0], QImage.Format_RGB888)
+        return QPixmap.fromImage(img).scaled(width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+    def update_thumbnail(self, key, rgb):
+        btn = self.screen_buttons.get(key)
+        if btn is not None:
+            btn.setIcon(QtGui.QIcon(self.thumbnail_pixmap(rgb)))
+
     def select_screen(self, monitor, button):
-        self.selected_screen = monitor
-        self.log(f"Selected screen: {monitor.name}")
-        if self.selected_button:
-            self.selected_button.setStyleSheet("background: transparent; border: none;")
+        if QtWidgets.QApplication.keyboardModifiers() & Qt.ControlModifier and self.selected_screens:
+            # Ctrl+clic añade o quita monitores; siempre queda al menos uno
+            if monitor in self.selected_screens:
+                if len(self.selected_screens) > 1:
+                    self.selected_screens.remove(monitor)
+            else:
+                self.selected_screens.append(monitor)
+        else:
+            self.selected_screens = [monitor]
+        self.selected_screen = self.selected_screens[0]
         self.selected_button = button
-        self.selected_button.setStyleSheet("background: transparent; border: 2px solid #007ACC;")
+        selected_keys = {geometry_key(self.monitor_bbox(screen)) for screen in self.selected_screens}
+        for key, btn in self.screen_buttons.items():
+            if key in selected_keys:
+                btn.setStyleSheet("background: transparent; border: 2px solid #007ACC;")
+            else:
+                btn.setStyleSheet("background: transparent; border: none;")
+        self.log(f"Selected screens: {', '.join(screen.name for screen in self.selected_screens)}")
+        # Recortar una región solo tiene sentido con un único monitor
+        self.select_region_button.setEnabled(len(self.selected_screens) == 1)
+        self.clear_region()
+
+    def select_region(self):
+        dialog = QtWidgets.QDialog(self)
+        dialog.setWindowTitle("Drag to Select the Region to Record")
+        dialog_layout = QVBoxLayout()
+        rgb = self.thumbnails.get(self.monitor_bbox(self.selected_screen))
+        if rgb is not None:
+            pixmap = self.thumbnail_pixmap(rgb, 960, 540)
+        else:
+            pixmap = self.placeholder_pixmap(self.selected_screen, 960, 540)
+        selector = RegionSelector(pixmap, self.selected_screen)
+        dialog_layout.addWidget(selector)
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        dialog_layout.addWidget(buttons)
+        dialog.setLayout(dialog_layout)
+        if dialog.exec_() != QtWidgets.QDialog.Accepted or selector.selection is None:
+            return
+        self.selected_region = selector.selection
+        region = self.selected_region
+        self.region_label.setText(f"{region['width']}x{region['height']} at ({region['left']}, {region['top']})")
+        self.full_screen_button.setEnabled(True)
+        self.log(f"Selected region: {self.region_label.text()}")
+
+    def clear_region(self):
+        self.selected_region = None
+        self.region_label.setText("Full screen")
+        self.full_screen_button.setEnabled(False)
 
     def select_location(self):
         self.filepath = QFileDialog.getExistingDirectory(self, "Select Storage Location")
@@ -455,6 +830,104 @@ class ScreenRecorderApp(QtWidgets.QWidget):
     def toggle_system_audio_volume_slider(self):
         self.system_audio_volume_slider.setEnabled(self.record_system_audio_checkbox.isChecked())
 
+    def toggle_segment_controls(self):
+        enabled = self.segment_checkbox.isChecked()
+        self.segment_minutes_spin.setEnabled(enabled)
+        self.segment_size_spin.setEnabled(enabled)
+
+    def toggle_replay_controls(self):
+        enabled = self.replay_checkbox.isChecked()
+        self.replay_seconds_spin.setEnabled(enabled)
+        self.replay_memory_spin.setEnabled(enabled)
+
+    def save_replay(self):
+        recorder = self.active_recorder
+        if recorder is None or recorder.replay is None:
+            self.log("Instant replay is not running.")
+            return
+        # Remultiplexar al contenedor elegido no debe bloquear la interfaz
+        Thread(target=self.write_replay, args=(recorder,)).start()
+
+    def write_replay(self, recorder):
+        try:
+            recorder.save_replay()
+        except (subprocess.CalledProcessError, OSError) as e:
+            details = e.stderr.decode(errors="replace").strip() if getattr(e, "stderr", None) else ""
+            self.comm.replay_failed_signal.emit(f"{e} {details}".strip())
+
+    def replay_failed(self, message):
+        self.log(f"Replay could not be saved: {message}")
+        QtWidgets.QMessageBox.warning(self, "Replay Not Saved", f"The instant replay could not be saved:\n{message}")
+
+    def toggle_preview(self):
+        enabled = self.preview_checkbox.isChecked()
+        recorder = self.active_recorder
+        # Apagarla durante la grabación deja la derivación sin trabajo alguno
+        if recorder is not None and recorder.preview is not None:
+            recorder.preview.enabled = enabled
+        if not enabled:
+            self.preview_label.setVisible(False)
+            self.mini_preview_label.setVisible(False)
+            self.mini_window.setFixedSize(400, 170)
+
+    def update_preview(self):
+        recorder = self.active_recorder
+        if recorder is None or recorder.preview is None or not recorder.preview.enabled:
+            return
+        self.preview_sequence, rgb = recorder.preview.latest(self.preview_sequence)
+        if rgb is None:
+            return
+        for label in (self.preview_label, self.mini_preview_label):
+            label.setPixmap(self.thumbnail_pixmap(rgb, label.width(), label.height()))
+            label.setVisible(True)
+        self.mini_window.setFixedSize(400, 360)
+
+    def update_levels(self):
+        from recorder.meter import FLOOR_DB, level_percent, to_dbfs
+
+        # Se pinta el último nivel publicado por cada medidor; el hilo de audio no espera nunca a la interfaz
+        meters = self.active_recorder.meters if self.active_recorder is not None else {}
+        levels = [level for level in (meter.latest()[1] for meter in meters.values()) if level is not None]
+        microphone = self.mic_meter if self.mic_testing else meters.get("microphone")
+        mic_level = microphone.latest()[1] if microphone is not None else None
+        # Barra del micrófono (en prueba o grabando) y barras de la fuente más fuerte de la grabación
+        for bar, sources in ((self.mic_progress_bar, [mic_level] if mic_level else []),
+                             (self.level_bar, levels), (self.mini_level_bar, levels)):
+            rms = max((max(level["rms"]) for level in sources), default=0.0)
+            hold = max((max(level["hold"]) for level in sources), default=0.0)
+            bar.setValue(level_percent(rms))
+            bar.setFormat(f"{max(FLOOR_DB, to_dbfs(hold)):.0f} dBFS")
+
+    def update_level_timer(self):
+        if self.mic_testing or self.recording:
+            self.level_timer.start()
+            return
+        self.level_timer.stop()
+        for bar in (self.mic_progress_bar, self.level_bar, self.mini_level_bar):
+            bar.setValue(0)
+            bar.setFormat("%p%")
+
+    def update_mic_devices(self, devices):
+        # Se conserva la selección por clave: los índices cambian al conectar o desconectar dispositivos
+        selected = self.mic_combo.currentData() or self.audio_devices.default_input
+        self.mic_combo.clear()
+        for device in devices:
+            if device.inputs > 0:
+                self.mic_combo.addItem(device.name, device.key)
+        index = self.mic_combo.findData(selected)
+        if index >= 0:
+            self.mic_combo.setCurrentIndex(index)
+
+    def selected_mic_device(self):
+        # Índice actual del micrófono elegido; None es la entrada por defecto del sistema
+        key = self.mic_combo.currentData()
+        if key is None:
+            return None
+        index = self.audio_devices.resolve(key)
+        if index is None:
+            self.comm.log_signal.emit(f"Microphone '{self.mic_combo.currentText()}' not found, using the default input.")
+        return index
+
     def toggle_mic_controls(self):
         mic_enabled = self.mic_recording_checkbox.isChecked()
         self.mic_combo.setEnabled(mic_enabled)
@@ -469,44 +942,48 @@ class ScreenRecorderApp(QtWidgets.QWidget):
             self.start_mic_test()
 
     def start_mic_test(self):
+        import sounddevice as sd
+        from recorder.meter import LevelMeter
+
         self.log("Testing microphone...")
         self.mic_progress_bar.setValue(0)
-        self.mic_testing = True
         self.test_mic_button.setText("Stop")
+        gain = self.mic_volume_slider.value() / 1000.0
 
+        # El callback solo mide; la barra se actualiza con level_timer, no con una señal por bloque
         def callback(indata, frames, time, status):
-            volume_norm = np.linalg.norm(indata) * 10
-            self.comm.update_mic_progress_signal.emit(min(100, int(volume_norm)))
-            self.comm.log_signal.emit(f"Microphone volume level: {volume_norm}")
+            self.mic_meter.process(indata, gain)
 
-        self.mic_stream = sd.InputStream(callback=callback)
+        # Sin reescaneos mientras el stream está abierto: reiniciarían PortAudio
+        self.audio_devices.pause()
+        self.mic_stream = sd.InputStream(device=self.selected_mic_device(), dtype='float32', callback=callback)
+        self.mic_meter = LevelMeter(self.mic_stream.channels, self.mic_stream.samplerate)
         self.mic_stream.start()
+        self.mic_testing = True
+        self.update_level_timer()
 
     def stop_mic_test(self):
         self.mic_stream.stop()
         self.mic_stream.close()
+        if not self.recording and self.active_recorder is None:
+            self.audio_devices.resume()
         self.mic_testing = False
         self.test_mic_button.setText("Test")
         self.comm.log_signal.emit("Microphone test ended.")
-        self.mic_progress_bar.setValue(0)
+        self.update_level_timer()
 
     def toggle_recording(self):
         if self.recording:
-            self.recording = False
-            self.record_button.setText("Start Recording")
-            self.record_button.setIcon(qta.icon('fa.play-circle'))
-            self.mini_stop_button.setText("Start Recording")
-            self.mini_stop_button.setIcon(qta.icon('fa.play-circle'))
-            self.timer_label.setVisible(False)
+            self.reset_recording_ui()
             self.comm.log_signal.emit("Recording stopped.")
-            self.show_main_window()
         else:
             if self.selected_screen is None:
                 self.comm.log_signal.emit("Error: No screen selected.")
                 QtWidgets.QMessageBox.warning(self, "Screen Not Selected", "Please select a screen to record before starting.")
                 return
-            output_name = f"{self.filepath}/{self.filename_input.text()}{self.extension_combo.currentText()}"
-            if os.path.exists(output_name):
+            output_name = self.get_output_name()
+            # Las repeticiones se guardan con marca de tiempo, no sobrescriben nada
+            if os.path.exists(output_name) and not self.replay_checkbox.isChecked():
                 reply = QtWidgets.QMessageBox.question(self, 'File Exists',
                                                     f"The file '{output_name}' already exists. Replace it?",
                                                     QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No, QtWidgets.QMessageBox.No)
@@ -515,225 +992,176 @@ class ScreenRecorderApp(QtWidgets.QWidget):
                     return
             
             self.recording = True
+            # Sin miniaturas durante la grabación: no compiten con la captura
+            self.thumbnails.paused = True
+            self.audio_devices.pause()
+            self.preview_sequence = 0
+            self.preview_timer.start()
+            self.save_replay_button.setVisible(self.replay_checkbox.isChecked())
             self.record_button.setText("Stop Recording")
             self.record_button.setIcon(qta.icon('fa.stop-circle'))
             self.mini_stop_button.setText("Stop Recording")
             self.mini_stop_button.setIcon(qta.icon('fa.stop-circle'))
             self.timer_label.setVisible(True)
+            self.level_bar.setVisible(True)
+            self.mini_level_bar.setVisible(True)
+            self.update_level_timer()
             self.comm.log_signal.emit("Starting recording...")
             if self.minimize_on_start_checkbox.isChecked():
                 self.hide()
                 self.mini_window.show()
-            Thread(target=self.record).start()
+            self.stop_event = Event()
+            Thread(target=self.record, args=(self.build_recorder_config(), self.stop_event,
+                                             self.monitor_layout_combo.currentData())).start()
             self.comm.log_signal.emit("Recording started.")
 
     
-    def capture_cursor(self):
-        cursor_info = win32gui.GetCursorInfo()
-        cursor_handle = cursor_info[1]
-
-        hdc = win32gui.GetDC(0)
-        hdc_mem = win32ui.CreateDCFromHandle(hdc)
-        hdc_compatible = hdc_mem.CreateCompatibleDC()
-        hbitmap = win32ui.CreateBitmap()
-        hbitmap.CreateCompatibleBitmap(hdc_mem, 32, 32)
-        hdc_compatible.SelectObject(hbitmap)
-
-        icon_info = win32gui.GetIconInfo(cursor_handle)
-        win32gui.DrawIconEx(hdc_compatible.GetHandleOutput(), 0, 0, cursor_handle, 32, 32, 0, 0, win32con.DI_NORMAL)
-
-        bmpinfo = hbitmap.GetInfo()
-        bmpstr = hbitmap.GetBitmapBits(True)
-
-        cursor_img = np.frombuffer(bmpstr, dtype='uint8')
-        cursor_img = cursor_img.reshape((bmpinfo['bmHeight'], bmpinfo['bmWidth'], 4))
-
-        hdc_compatible.DeleteDC()
-        hdc_mem.DeleteDC()
-        win32gui.ReleaseDC(0, hdc)
-        win32gui.DeleteObject(hbitmap.GetHandle())
-
-        return cursor_img, icon_info[1], icon_info[2]  # Return cursor image and its hot spot
-
-
-
-    def record(self):
-        screen_name = os.path.join(self.tmp_filepath, "screen.avi")
-        audio_name = os.path.join(self.tmp_filepath, "audio.wav")
-
-        # Crear la carpeta de grabaciones si no existe
-        if not os.path.exists(self.filepath):
-            os.makedirs(self.filepath)
-        if not os.path.exists(self.tmp_filepath):
-            os.makedirs(self.tmp_filepath)
-
-        # Inicializar mss dentro del hilo
-        sct = mss.mss()
-
-        # Configuración de audio
-        p = pyaudio.PyAudio()
-        audio_format = pyaudio.paInt16
-        rate = 44100
-
-        # Obtener el índice del micrófono seleccionado
-        mic_index = self.mic_combo.currentIndex()
-        mic_device = self.mic_devices[mic_index]
-        mic_name = mic_device['name']
-
-        # Comprobar el número de canales admitidos
-        for i in range(p.get_device_count()):
-            info = p.get_device_info_by_index(i)
-            if info['name'] == mic_name:
-                max_input_channels = info['maxInputChannels']
-                break
-
-        channels = 2 if max_input_channels >= 2 else 1
-
-        # Ajustar el tamaño del buffer de frames
-        frames_per_buffer = 2048
-
-        stream = p.open(format=audio_format, channels=channels, rate=rate,
-                        input=True, input_device_index=i, frames_per_buffer=frames_per_buffer)
-
-        # Configuración de video
-        bbox = {'top': self.selected_screen.y, 'left': self.selected_screen.x, 'width': self.selected_screen.width, 'height': self.selected_screen.height}
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        out = cv2.VideoWriter(screen_name, fourcc, self.fps, (bbox['width'], bbox['height']))
-
-        audio_frames = []
-        start_time = time.time()
-        frame_interval = 1.0 / self.fps
-        next_frame_time = start_time + frame_interval
-
-        def capture_audio():
-            system_volume = self.system_audio_volume_slider.value() / 1000.0
-            mic_volume = self.mic_volume_slider.value() / 1000.0
-            max_value = 32767  # Maximum value for int16
-            threshold = 0.8 * max_value  # Threshold for normalization and compression
-
-            while self.recording:
-                data = stream.read(frames_per_buffer)
-                audio_data = np.frombuffer(data, dtype=np.int16)
-
-                # Normalizing
-                max_amplitude = np.max(np.abs(audio_data))
-                if max_amplitude > threshold:
-                    normalization_factor = threshold / max_amplitude
-                    audio_data = audio_data * normalization_factor
-
-                # Apply volume and clipping
-                audio_data = np.clip(audio_data * mic_volume, -max_value, max_value)
-
-                audio_frames.append(audio_data.astype(np.int16).tobytes())
-
-        audio_thread = None
-        if self.mic_recording_checkbox.isChecked():
-            audio_thread = Thread(target=capture_audio)
-            audio_thread.start()
-
-        while self.recording:
-            current_time = time.time()
-            if current_time >= next_frame_time:
-                # Captura de pantalla
-                img = sct.grab(bbox)
-                frame = np.array(img)
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-
-                # Mostrar cursor si está seleccionado
-                if self.show_cursor_checkbox.isChecked():
-                    cursor_pos = win32api.GetCursorPos()
-                    cursor_style = self.cursor_style_combo.currentText()
-                    cursor_x = cursor_pos[0] - bbox['left']
-                    cursor_y = cursor_pos[1] - bbox['top']
-
-                    if cursor_style == "White Circle":
-                        cv2.circle(frame, (cursor_x, cursor_y), 10, (255, 255, 255), 2)
-                    elif cursor_style == "Red Circle":
-                        cv2.circle(frame, (cursor_x, cursor_y), 10, (0, 0, 255), 2)
-                    elif cursor_style == "Green Circle":
-                        cv2.circle(frame, (cursor_x, cursor_y), 10, (0, 255, 0), 2)
-                    elif cursor_style == "Blue Circle":
-                        cv2.circle(frame, (cursor_x, cursor_y), 10, (255, 0, 0), 2)
-                    elif cursor_style == "Cross":
-                        cv2.line(frame, (cursor_x - 10, cursor_y), (cursor_x + 10, cursor_y), (0, 0, 0), 2)
-                        cv2.line(frame, (cursor_x, cursor_y - 10), (cursor_x, cursor_y + 10), (0, 0, 0), 2)
-                    else:
-                        cursor_img, hotspot_x, hotspot_y = self.capture_cursor()
-                        for i in range(cursor_img.shape[0]):
-                            for j in range(cursor_img.shape[1]):
-                                if cursor_img[i, j, 3] > 0:  # alpha channel check
-                                    frame[cursor_y - hotspot_y + i, cursor_x - hotspot_x + j] = cursor_img[i, j, :3]
-
-                out.write(frame)
-                next_frame_time += frame_interval
-
-                # Actualizar el temporizador
-                elapsed_time = current_time - start_time
-                self.comm.update_timer_signal.emit(time.strftime('%H:%M:%S', time.gmtime(elapsed_time)))
-
+    def reset_recording_ui(self):
         self.recording = False
-        if audio_thread:
-            audio_thread.join()
-
-        # Detener y guardar la grabación de audio
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
-
-        # Guardar audio
-        if self.mic_recording_checkbox.isChecked():
-            with wave.open(audio_name, 'wb') as wf:
-                wf.setnchannels(channels)
-                wf.setsampwidth(p.get_sample_size(audio_format))
-                wf.setframerate(rate)
-                wf.writeframes(b''.join(audio_frames))
-
-        out.release()
-
-        # Procesar grabación
-        self.processing = True
-        self.loading_label.setVisible(True)
-        self.record_button.setEnabled(False)
-
-        self.combine_audio_video(screen_name, audio_name)
-
-    def combine_audio_video(self, video_file, audio_file):
-        output_name = f"{self.filepath}/{self.filename_input.text()}{self.extension_combo.currentText()}"
-
-        video_clip = VideoFileClip(video_file)
-        if self.mic_recording_checkbox.isChecked():
-            audio_clip = AudioFileClip(audio_file)
-            video_with_audio = video_clip.set_audio(audio_clip)
+        if self.stop_event is not None:
+            self.stop_event.set()
+            self.stop_event = None
+        self.thumbnails.paused = False
+        self.thumbnails.refresh()
+        self.preview_timer.stop()
+        self.save_replay_button.setVisible(False)
+        self.preview_label.setVisible(False)
+        self.mini_preview_label.setVisible(False)
+        self.mini_window.setFixedSize(400, 170)
+        self.record_button.setText("Start Recording")
+        self.record_button.setIcon(qta.icon('fa.play-circle'))
+        self.mini_stop_button.setText("Start Recording")
+        self.mini_stop_button.setIcon(qta.icon('fa.play-circle'))
+        self.timer_label.setVisible(False)
+        self.level_bar.setVisible(False)
+        self.mini_level_bar.setVisible(False)
+        self.update_level_timer()
+        self.show_main_window()
+
+    def recording_failed(self, message, stop_event):
+        # Hilo de la interfaz: la grabación no llegó a arrancar; si ya se paró y hay otra en marcha, no se toca
+        self.log(f"Recording failed: {message}")
+        if stop_event is self.stop_event:
+            self.reset_recording_ui()
+        QtWidgets.QMessageBox.warning(self, "Recording Failed", f"The recording could not be started:\n{message}")
+
+    def get_output_name(self):
+        return f"{self.filepath}/{self.filename_input.text()}{self.extension_combo.currentText()}"
+
+    def build_recorder_config(self):
+        from recorder.engine import RecorderConfig
+        from recorder.scaling import crop_region
+
+        # Se lee el estado de los widgets en el hilo de la interfaz, antes de arrancar la grabación
+        bbox = {'top': self.selected_screen.y, 'left': self.selected_screen.x, 'width': self.selected_screen.width, 'height': self.selected_screen.height}
+        if self.selected_region:
+            bbox = crop_region(bbox, self.selected_region)
+        monitors = [self.monitor_bbox(screen) for screen in self.selected_screens] if len(self.selected_screens) > 1 else None
+        segmented = self.segment_checkbox.isChecked()
+        mic_device = self.selected_mic_device() if self.mic_recording_checkbox.isChecked() else None
+        return RecorderConfig(
+            self.get_output_name(),
+            bbox,
+            fps=self.fps,
+            encoder=self.encoder_combo.currentData(),
+            preset=self.preset_combo.currentText(),
+            crf=self.crf_spin.value(),
+            mic=self.mic_recording_checkbox.isChecked(),
+            mic_device=mic_device,
+            mic_gain=self.mic_volume_slider.value() / 1000.0,
+            system_audio=self.record_system_audio_checkbox.isChecked(),
+            system_gain=self.system_audio_volume_slider.value() / 1000.0,
+            cursor_style=self.cursor_style_combo.currentText() if self.show_cursor_checkbox.isChecked() else None,
+            segment_seconds=self.segment_minutes_spin.value() * 60 if segmented else 0,
+            segment_bytes=self.segment_size_spin.value() * 1024 * 1024 if segmented else 0,
+            damage_tracking=self.damage_tracking_checkbox.isChecked(),
+            drop_policy=self.drop_policy_combo.currentData(),
+            adaptive_quality=self.adaptive_quality_checkbox.isChecked(),
+            output_size=self.output_size_combo.currentData(),
+            interpolation=self.interpolation_combo.currentData(),
+            preview_every=self.preview_every_spin.value() if self.preview_checkbox.isChecked() else 0,
+            metrics_path=os.path.join(self.tmp_filepath, f"{self.filename_input.text()}.metrics.jsonl")
+            if self.metrics_checkbox.isChecked() else None,
+            metrics_port=self.metrics_port_spin.value(),
+            profile=self.profile_checkbox.isChecked(),
+            replay_seconds=self.replay_seconds_spin.value() if self.replay_checkbox.isChecked() else 0,
+            replay_max_mb=self.replay_memory_spin.value(),
+            monitors=monitors,
+            level_meter_rate=30,
+            tmp_dir=self.tmp_filepath,
+        )
+
+    def record(self, config, stop_event, layout=STITCH):
+        from recorder.engine import MultiMonitorRecorder, Recorder
+
+        separate = config.monitors and layout == SEPARATE
+        if separate:
+            recorder = MultiMonitorRecorder.for_monitors(config, config.monitors, logger=self.comm.log_signal.emit)
         else:
-            video_with_audio = video_clip
-
-        video_with_audio.write_videofile(output_name, codec='libx264', audio_codec='aac')
-
-        self.comm.log_signal.emit(f"Recording saved to: {output_name}")
-
-        # Eliminar archivos temporales
-        os.remove(video_file)
-        if self.mic_recording_checkbox.isChecked():
-            os.remove(audio_file)
-
-        self.loading_label.setVisible(False)
-        self.record_button.setEnabled(True)
-        self.processing = False
-
+            recorder = Recorder(config, logger=self.comm.log_signal.emit)
+        self.active_recorder = recorder
+        try:
+            recorder.start()
+        except Exception as e:
+            # ffmpeg o un dispositivo de audio que no abre: se cierra lo que llegó a arrancar
+            if recorder.recording:
+                try:
+                    recorder.stop()
+                except Exception as stop_error:
+                    logging.error(f"Stopping failed recording: {stop_error}")
+            self.finish_recorder(recorder)
+            self.comm.recording_failed_signal.emit(str(e), stop_event)
+            return
+        while not stop_event.wait(0.25):
+            # Actualizar el temporizador
+            self.comm.update_timer_signal.emit(time.strftime('%H:%M:%S', time.gmtime(recorder.elapsed)))
+        recorder.stop()
+        self.finish_recorder(recorder)
+
+        # Procesar grabación en segundo plano; se puede empezar otra mientras tanto
+        if separate:
+            for job in recorder.finalize_jobs():
+                self.jobs.submit(job)
+        elif recorder.needs_processing:
+            self.jobs.submit(recorder.finalize_job())
+
+    def finish_recorder(self, recorder):
+        # Una grabación nueva puede haber empezado mientras esta se cerraba: entonces sigue siendo la activa
+        if self.active_recorder is recorder:
+            self.active_recorder = None
+        # Los streams de audio ya están cerrados: se puede volver a reescanear
+        if not self.recording and not self.mic_testing:
+            self.audio_devices.resume()
+
+    def closeEvent(self, event):
+        self.thumbnails.stop()
+        self.audio_devices.stop()
+        # Los trabajos en curso se cancelan y aparecen como pendientes en la próxima sesión
+        self.jobs.shutdown()
+        super().closeEvent(event)
 
     def set_shortcut(self, event):
         key_sequence = QKeySequence(event.key() + int(event.modifiers()))
         self.shortcut_input.setText(key_sequence.toString())
-        self.set_global_shortcut(key_sequence)
+        self.shortcut = self.set_global_shortcut(key_sequence, self.shortcut, self.record_button.click)
 
-    def set_global_shortcut(self, key_sequence):
-        if self.shortcut:
-            self.shortcut.setEnabled(False)
-        self.shortcut = QShortcut(key_sequence, self)
-        self.shortcut.activated.connect(self.record_button.click)
-        self.log(f"Shortcut set to: {key_sequence.toString()}")
+    def set_replay_shortcut(self, event):
+        key_sequence = QKeySequence(event.key() + int(event.modifiers()))
+        self.replay_shortcut_input.setText(key_sequence.toString())
+        self.replay_shortcut = self.set_global_shortcut(key_sequence, self.replay_shortcut, self.save_replay,
+                                                        "Replay shortcut")
+
+    def set_global_shortcut(self, key_sequence, previous, action, name="Shortcut"):
+        if previous:
+            previous.setEnabled(False)
+        shortcut = QShortcut(key_sequence, self)
+        shortcut.activated.connect(action)
+        self.log(f"{name} set to: {key_sequence.toString()}")
+        return shortcut
 
 if __name__ == "__main__":
+    # Los procesos de finalización arrancan este mismo ejecutable cuando está empaquetado con PyInstaller
+    multiprocessing.freeze_support()
     try:
         app = QtWidgets.QApplication(sys.argv)
         recorder = ScreenRecorderApp()
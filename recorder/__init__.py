@@ -0,0 +1,19 @@
+import importlib
+
+from recorder.options import BLOCK, DROP_NEWEST, DROP_OLDEST, POLICIES
+
+# El motor se carga al usarlo: importar ``recorder.options`` o ``recorder.jobs`` no arrastra NumPy ni OpenCV
+_LAZY = {
+    "CapturePipeline": "recorder.pipeline",
+    "FrameRing": "recorder.pipeline",
+    "Recorder": "recorder.engine",
+    "RecorderConfig": "recorder.engine",
+}
+
+__all__ = ["BLOCK", "DROP_NEWEST", "DROP_OLDEST", "POLICIES"] + list(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module 'recorder' has no attribute {name!r}")
+    return getattr(importlib.import_module(_LAZY[name]), name)
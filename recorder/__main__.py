@@ -0,0 +1,180 @@
+"""Grabación de pantalla desde la línea de comandos, sin interfaz gráfica.
+
+Uso: python -m recorder salida.mp4 [--monitor 1 | --region 1280x720+0+0] [--duration 60]
+       [--crop 1280x720+100+100] [--output-size 1920x1080 --interpolation box]
+       [--instant-replay 30] [--monitors 1 2 --layout separate]
+"""
+import argparse
+import logging
+import re
+import sys
+import time
+
+from recorder.encoders import ENCODER_BACKENDS, PRESETS
+from recorder.engine import MultiMonitorRecorder, Recorder, RecorderConfig
+from recorder.options import INTERPOLATIONS, LAYOUTS, POLICIES, SEPARATE
+from recorder.scaling import crop_region
+from recorder.sources import SOURCE_KINDS
+
+
+def parse_region(value):
+    match = re.fullmatch(r"(\d+)x(\d+)([+-]\d+)([+-]\d+)", value)
+    if not match:
+        raise argparse.ArgumentTypeError("expected WIDTHxHEIGHT+LEFT+TOP, e.g. 1920x1080+0+0")
+    width, height, left, top = (int(group) for group in match.groups())
+    return {'left': left, 'top': top, 'width': width, 'height': height}
+
+
+def parse_size(value):
+    match = re.fullmatch(r"(\d+)x(\d+)", value)
+    if not match:
+        raise argparse.ArgumentTypeError("expected WIDTHxHEIGHT, e.g. 1920x1080 (0 = unbounded)")
+    return int(match.group(1)), int(match.group(2))
+
+
+def monitor_region(index):
+    import mss
+    with mss.mss() as sct:
+        # monitors[0] es el escritorio completo; los monitores empiezan en 1
+        if not 0 <= index < len(sct.monitors):
+            raise SystemExit(f"Monitor {index} not found ({len(sct.monitors) - 1} available)")
+        monitor = sct.monitors[index]
+    return {key: monitor[key] for key in ('left', 'top', 'width', 'height')}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m recorder", description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="output file; the extension selects the container")
+    area = parser.add_mutually_exclusive_group()
+    area.add_argument("--monitor", type=int, default=1, help="monitor number, 0 = whole desktop")
+    area.add_argument("--monitors", type=int, nargs="+", metavar="N", help="record several monitors together")
+    area.add_argument("--region", type=parse_region, action="append",
+                      help="WIDTHxHEIGHT+LEFT+TOP; repeat it to record several regions as monitors")
+    parser.add_argument("--layout", choices=LAYOUTS, default=LAYOUTS[0],
+                        help="several monitors: stitch them into one video or write one synchronized file each")
+    parser.add_argument("--crop", type=parse_region, metavar="WxH+X+Y",
+                        help="record only this rectangle of the monitor (relative to its top-left corner)")
+    parser.add_argument("--output-size", type=parse_size, metavar="WxH",
+                        help="downscale to fit this size, keeping the aspect ratio")
+    parser.add_argument("--interpolation", choices=INTERPOLATIONS, default="area",
+                        help="box averages 2x2 blocks when the output is exactly half the capture")
+    parser.add_argument("--duration", type=float, help="seconds to record; Ctrl+C stops earlier")
+    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--encoder", choices=list(ENCODER_BACKENDS) + ["auto"], default="x264",
+                        help="auto probes the CPU and picks the best quality that sustains --fps")
+    parser.add_argument("--preset", choices=PRESETS, default="veryfast")
+    parser.add_argument("--crf", type=int, default=23)
+    parser.add_argument("--mic", nargs="?", const="default", metavar="DEVICE",
+                        help="record the microphone (sounddevice index or name)")
+    parser.add_argument("--mic-gain", type=float, default=1.0)
+    parser.add_argument("--system-audio", action="store_true")
+    parser.add_argument("--system-gain", type=float, default=0.7)
+    parser.add_argument("--cursor", metavar="STYLE", help="draw the cursor with this style (Windows)")
+    parser.add_argument("--segment-minutes", type=float, default=0)
+    parser.add_argument("--segment-mb", type=int, default=0)
+    parser.add_argument("--damage-tracking", action="store_true")
+    parser.add_argument("--drop-policy", choices=POLICIES, default=POLICIES[0])
+    parser.add_argument("--adaptive", action="store_true",
+                        help="lower fps under load and restore it when possible; "
+                             "with segments, also preset and encoded scale")
+    parser.add_argument("--source", choices=SOURCE_KINDS, default="screen",
+                        help="where frames come from; synthetic and replay need no display")
+    parser.add_argument("--replay", metavar="PATH", help="video or raw BGRA dump for --source replay")
+    parser.add_argument("--motion", type=float, default=0.1, help="moving fraction of the synthetic pattern")
+    parser.add_argument("--cursor-provider", choices=("system", "scripted", "none"), default="system")
+    parser.add_argument("--synthetic-audio", action="store_true", help="mix in a test tone instead of a device")
+    parser.add_argument("--metrics", metavar="PATH", help="write per-stage metrics as JSON lines")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--profile", action="store_true",
+                        help="run each stage under cProfile and record allocations with tracemalloc")
+    parser.add_argument("--instant-replay", type=float, default=0, metavar="SECONDS",
+                        help="keep only the last SECONDS in memory and save them to output when stopping")
+    parser.add_argument("--replay-max-mb", type=int, default=256, help="memory cap of the instant replay buffer")
+    parser.add_argument("--level-meter", action="store_true",
+                        help="meter each audio source; the peak level is reported in the mixer stats")
+    return parser
+
+
+def config_from_args(args):
+    mic_device = None
+    if args.mic and args.mic != "default":
+        mic_device = int(args.mic) if args.mic.isdigit() else args.mic
+    monitors = None
+    if args.region:
+        monitors = args.region
+    elif args.monitors:
+        monitors = [monitor_region(index) for index in args.monitors]
+    if monitors and len(monitors) > 1:
+        if args.crop:
+            raise SystemExit("--crop needs a single monitor")
+        region = monitors[0]
+    else:
+        monitors = None
+        region = args.region[0] if args.region else None
+        if region is None and args.monitors:
+            region = monitor_region(args.monitors[0])
+        if region is None:
+            # Las fuentes sintéticas no necesitan pantalla: sin --region se usa 1920x1080
+            region = monitor_region(args.monitor) if args.source == "screen" else parse_region("1920x1080+0+0")
+        if args.crop:
+            region = crop_region(region, args.crop)
+    return RecorderConfig(
+        args.output,
+        region,
+        fps=args.fps,
+        encoder=args.encoder,
+        preset=args.preset,
+        crf=args.crf,
+        mic=args.mic is not None,
+        mic_device=mic_device,
+        mic_gain=args.mic_gain,
+        system_audio=args.system_audio,
+        system_gain=args.system_gain,
+        cursor_style=args.cursor,
+        segment_seconds=int(args.segment_minutes * 60),
+        segment_bytes=args.segment_mb * 1024 * 1024,
+        damage_tracking=args.damage_tracking,
+        drop_policy=args.drop_policy,
+        source=args.source,
+        source_path=args.replay,
+        motion=args.motion,
+        cursor_provider=args.cursor_provider,
+        synthetic_audio=args.synthetic_audio,
+        adaptive_quality=args.adaptive,
+        output_size=args.output_size,
+        interpolation=args.interpolation,
+        metrics_path=args.metrics,
+        metrics_port=args.metrics_port,
+        profile=args.profile,
+        replay_seconds=args.instant_replay,
+        replay_max_mb=args.replay_max_mb,
+        monitors=monitors,
+        level_meter_rate=30 if args.level_meter else 0,
+    )
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+    config = config_from_args(args)
+    if config.monitors and args.layout == SEPARATE:
+        recorder = MultiMonitorRecorder.for_monitors(config, config.monitors)
+    else:
+        recorder = Recorder(config)
+    recorder.start()
+    try:
+        while args.duration is None or recorder.elapsed < args.duration:
+            time.sleep(0.25)
+    except KeyboardInterrupt:
+        pass
+    recorder.stop()
+    if recorder.replay is not None and not recorder.failed:
+        recorder.save_replay(args.output)
+    if recorder.needs_processing:
+        recorder.process()
+    return 1 if recorder.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
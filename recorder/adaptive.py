@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+
+from recorder.encoders import PRESETS
+
+
+class QualityLevel:
+    __slots__ = ("preset", "scale", "fps_divisor")
+
+    def __init__(self, preset, scale=1.0, fps_divisor=1):
+        self.preset = preset
+        self.scale = scale
+        self.fps_divisor = fps_divisor
+
+    def describe(self, fps):
+        return f"preset {self.preset}, scale {self.scale:.0%}, {fps / self.fps_divisor:g} fps"
+
+
+def build_ladder(preset, fps, restartable=True, min_fps=5):
+    """Niveles de calidad de mayor a menor: primero preset, luego escala y por último fps.
+
+    Cambiar preset o escala exige reiniciar el codificador, así que solo se
+    incluyen si ``restartable`` (grabación por segmentos); sin segmentos la
+    escalera solo baja los fps. La escala se aplica dentro de ffmpeg: alivia
+    al códec, no a la captura ni a la composición. Bajar los fps sí captura y
+    compone menos frames, pero la salida sigue siendo de fps constante y el
+    escritor CFR repite los que faltan, que el códec codifica igualmente
+    (repeticiones exactas, casi gratis en bits pero no en CPU).
+    """
+    ladder = [QualityLevel(preset)]
+    if restartable:
+        index = PRESETS.index(preset) if preset in PRESETS else 2
+        for faster in (max(index - 2, 0), 0):
+            if PRESETS[faster] != ladder[-1].preset:
+                ladder.append(QualityLevel(PRESETS[faster]))
+        for scale in (0.75, 0.5):
+            ladder.append(QualityLevel(ladder[-1].preset, scale))
+    divisor = 2
+    while fps / divisor >= min_fps:
+        last = ladder[-1]
+        ladder.append(QualityLevel(last.preset, last.scale, divisor))
+        divisor *= 2
+    return ladder
+
+
+def cpu_load():
+    # Carga de CPU del sistema (%): psutil si está instalado, si no la carga media de Unix
+    try:
+        import psutil
+    except ImportError:
+        if hasattr(os, "getloadavg"):
+            return os.getloadavg()[0] / (os.cpu_count() or 1) * 100
+        return None
+    return psutil.cpu_percent(interval=None)
+
+
+class AdaptiveQualityController:
+    """Bucle de realimentación que baja la calidad cuando la grabación no da abasto.
+
+    Cada ``interval`` segundos mira la profundidad de las colas, el tiempo de
+    codificación por frame frente al presupuesto, los frames perdidos y la carga
+    de CPU. Tras ``down_after`` muestras con presión baja un nivel; tras
+    ``up_after`` muestras holgadas sube uno. ``apply(level)`` aplica el nivel y
+    cada transición queda en ``transitions`` y en el log con su motivo.
+    """
+
+    def __init__(self, pipeline, ladder, apply, interval=1.0, down_after=2, up_after=10,
+                 depth_high=0.5, budget_high=0.9, budget_low=0.6, cpu_high=90.0, cpu_low=60.0,
+                 logger=None, clock=time.time, load=cpu_load):
+        self.pipeline = pipeline
+        self.ladder = ladder
+        self.apply = apply
+        self.interval = interval
+        self.down_after = down_after
+        self.up_after = up_after
+        self.depth_high = depth_high
+        self.budget_high = budget_high
+        self.budget_low = budget_low
+        self.cpu_high = cpu_high
+        self.cpu_low = cpu_low
+        self.logger = logger
+        self.clock = clock
+        self.load = load
+        self.level = 0
+        self.transitions = []
+        self.start_time = None
+        self._pressure = 0
+        self._headroom = 0
+        self._last = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.start_time = self.clock()
+        self._last = self._snapshot()
+        self.load()
+        self._thread = threading.Thread(target=self._run, name="adaptive-quality", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.pipeline.running:
+                break
+            self.sample()
+
+    def _snapshot(self):
+        pipeline = self.pipeline
+        encode = pipeline.stage_stats["encode"]
+        return {
+            "encode_frames": encode.frames,
+            "encode_busy": encode.busy,
+            "dropped": pipeline.capture_ring.dropped + pipeline.encode_ring.dropped + pipeline.scheduler.missed,
+        }
+
+    def sample(self):
+        pipeline = self.pipeline
+        current = self._snapshot()
+        last, self._last = self._last, current
+        frames = current["encode_frames"] - last["encode_frames"]
+        encode_time = (current["encode_busy"] - last["encode_busy"]) / frames if frames else 0.0
+        dropped = current["dropped"] - last["dropped"]
+        budget = self.ladder[self.level].fps_divisor / pipeline.fps
+        depth = max(pipeline.capture_ring.depth / pipeline.capture_ring.capacity,
+                    pipeline.encode_ring.depth / pipeline.encode_ring.capacity)
+        cpu = self.load()
+
+        reasons = []
+        if depth >= self.depth_high:
+            reasons.append(f"queue {depth:.0%} full")
+        if encode_time > budget * self.budget_high:
+            reasons.append(f"encode {encode_time * 1000:.1f} ms > {budget * 1000:.1f} ms budget")
+        if dropped:
+            reasons.append(f"{dropped} frames dropped")
+        if cpu is not None and cpu >= self.cpu_high:
+            reasons.append(f"CPU {cpu:.0f}%")
+
+        if reasons:
+            self._headroom = 0
+            self._pressure += 1
+            if self._pressure >= self.down_after and self.level < len(self.ladder) - 1:
+                self._change(self.level + 1, "; ".join(reasons))
+        else:
+            self._pressure = 0
+            calm = encode_time <= budget * self.budget_low and (cpu is None or cpu < self.cpu_low)
+            self._headroom = self._headroom + 1 if calm else 0
+            if self._headroom >= self.up_after and self.level > 0:
+                self._change(self.level - 1, f"encode {encode_time * 1000:.1f} ms, headroom regained")
+
+    def _change(self, level, reason):
+        previous = self.level
+        self.level = level
+        self._pressure = 0
+        self._headroom = 0
+        self.apply(self.ladder[level])
+        now = self.clock()
+        transition = {
+            "time": time.strftime('%H:%M:%S', time.localtime(now)),
+            "elapsed": round(now - self.start_time, 2),
+            "from": previous,
+            "to": level,
+            "level": self.ladder[level].describe(self.pipeline.fps),
+            "reason": reason,
+        }
+        self.transitions.append(transition)
+        if self.logger:
+            direction = "down" if level > previous else "up"
+            self.logger(f"[{transition['time']} +{transition['elapsed']:.1f}s] Quality {direction} "
+                        f"{previous} -> {level} ({transition['level']}): {reason}")
+
+
+def apply_level(pipeline, initial, muxer=None):
+    """Función ``apply`` para el controlador: fps en la captura y preset/escala en el codificador."""
+    state = {"preset": initial.preset, "scale": initial.scale}
+
+    def apply(level):
+        pipeline.frame_divisor = level.fps_divisor
+        if muxer is not None and hasattr(muxer, "reconfigure"):
+            if (level.preset, level.scale) != (state["preset"], state["scale"]):
+                muxer.reconfigure(preset=level.preset, scale=level.scale)
+        state["preset"], state["scale"] = level.preset, level.scale
+
+    return apply
@@ -0,0 +1,477 @@
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+
+from recorder.dsp import INT16_SCALE, LookaheadLimiter
+from recorder.meter import LevelMeter
+from recorder.sync import ClockSync
+
+# Nombres habituales de los dispositivos que capturan lo que suena por los altavoces
+LOOPBACK_NAMES = ("stereo mix", "mezcla estéreo", "what u hear", "loopback", "monitor of")
+
+
+class AudioSource:
+    """Fuente de audio que entrega bloques float32 (frames, canales) con su marca de tiempo.
+
+    ``start(deliver, clock)`` debe llamar a ``deliver(samples, timestamp)`` desde
+    su propio hilo, donde ``timestamp`` es el instante (según ``clock``) de la
+    primera muestra del bloque.
+    """
+
+    def __init__(self, name, rate, channels, gain=1.0):
+        self.name = name
+        self.rate = rate
+        self.channels = channels
+        self.gain = gain
+
+    def start(self, deliver, clock):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+
+class SoundDeviceSource(AudioSource):
+    """Dispositivo de entrada de PortAudio, con su propio hilo de callback."""
+
+    def __init__(self, device, name=None, rate=None, channels=None, gain=1.0, loopback=False, blocksize=1024):
+        import sounddevice as sd
+        self.sd = sd
+        # Sin dispositivo se usa la entrada por defecto; en loopback se captura un dispositivo de salida
+        info = sd.query_devices(device, 'output' if loopback else 'input')
+        self.device = info['index'] if 'index' in info else device
+        self.loopback = loopback
+        self.blocksize = blocksize
+        max_channels = info['max_input_channels'] or info['max_output_channels']
+        super().__init__(name or info['name'], int(rate or info['default_samplerate']),
+                         channels or min(2, max(1, max_channels)), gain)
+        self.extra_settings = None
+        if loopback:
+            # WASAPI captura la salida de un dispositivo; falla con TypeError si sounddevice no lo soporta
+            self.extra_settings = sd.WasapiSettings(loopback=True)
+        self.stream = None
+
+    def start(self, deliver, clock):
+        rate = self.rate
+
+        def callback(indata, frames, time_info, status):
+            deliver(indata, clock() - frames / rate)
+
+        self.stream = self.sd.InputStream(device=self.device, samplerate=rate, channels=self.channels,
+                                          dtype='float32', blocksize=self.blocksize, callback=callback,
+                                          extra_settings=self.extra_settings)
+        self.stream.start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+
+class BufferSource(AudioSource):
+    """Dispositivo simulado que reproduce un array (o un WAV) en tiempo real desde un hilo.
+
+    ``skew`` simula un reloj de dispositivo que no va exactamente a su frecuencia
+    nominal (1.0001 = 100 ppm rápido) y ``jitter`` el retraso aleatorio (en
+    segundos) con el que un callback real recibe sus bloques. Sirve para pruebas
+    y benchmarks sin hardware.
+    """
+
+    def __init__(self, samples, rate, name="buffer", gain=1.0, blocksize=1024, loop=True, skew=1.0, jitter=0.0):
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim == 1:
+            samples = samples[:, None]
+        super().__init__(name, rate, samples.shape[1], gain)
+        self.samples = samples
+        self.blocksize = blocksize
+        self.loop = loop
+        self.skew = skew
+        self.jitter = jitter
+        self.delivered = 0
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def from_wav(cls, path, **kwargs):
+        with wave.open(path, 'rb') as wf:
+            pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+            samples = pcm.reshape(-1, wf.getnchannels()).astype(np.float32) / INT16_SCALE
+            return cls(samples, wf.getframerate(), name=kwargs.pop('name', path), **kwargs)
+
+    @classmethod
+    def tone(cls, frequency, rate, seconds=1.0, channels=1, level=0.5, **kwargs):
+        t = np.arange(int(rate * seconds)) / rate
+        signal = (np.sin(2 * np.pi * frequency * t) * level).astype(np.float32)
+        return cls(np.repeat(signal[:, None], channels, axis=1), rate, name=kwargs.pop('name', f"tone {frequency} Hz"),
+                   **kwargs)
+
+    def start(self, deliver, clock):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, args=(deliver, clock), daemon=True)
+        self._thread.start()
+
+    def _run(self, deliver, clock):
+        # El dispositivo produce rate * skew muestras por segundo real
+        period = self.blocksize / (self.rate * self.skew)
+        start = clock()
+        position = 0
+        blocks = 0
+        total = len(self.samples)
+        rng = np.random.default_rng()
+        while self._running:
+            due = start + (blocks + 1) * period
+            now = clock()
+            if now < due:
+                time.sleep(due - now)
+            if position + self.blocksize > total:
+                if not self.loop:
+                    break
+                position = 0
+            block = self.samples[position:position + self.blocksize]
+            deliver(block, start + blocks * period + rng.uniform(0.0, self.jitter))
+            position += self.blocksize
+            blocks += 1
+            self.delivered += len(block)
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def find_loopback_device(devices):
+    # Primer dispositivo de entrada cuyo nombre indica que captura el audio del sistema
+    for device in devices:
+        name = device['name'].lower()
+        if device['max_input_channels'] > 0 and any(key in name for key in LOOPBACK_NAMES):
+            return device
+    return None
+
+
+def create_system_source(gain=1.0, blocksize=1024):
+    """Fuente para el audio del sistema, o None si no hay forma de capturarlo."""
+    import sounddevice as sd
+    device = find_loopback_device(sd.query_devices())
+    if device is not None:
+        return SoundDeviceSource(device['index'], name="system", gain=gain, blocksize=blocksize)
+    if sys.platform == 'win32':
+        try:
+            return SoundDeviceSource(sd.default.device[1], name="system", gain=gain, blocksize=blocksize,
+                                     loopback=True)
+        except (TypeError, ValueError, sd.PortAudioError):
+            pass
+    return None
+
+
+def remix(samples, channels):
+    # Adapta el número de canales: mono se duplica, más canales se promedian a mono
+    source_channels = samples.shape[1]
+    if source_channels == channels:
+        return samples
+    if source_channels == 1:
+        return np.repeat(samples, channels, axis=1)
+    if channels == 1:
+        return samples.mean(axis=1, keepdims=True)
+    result = np.zeros((samples.shape[0], channels), dtype=np.float32)
+    common = min(source_channels, channels)
+    result[:, :common] = samples[:, :common]
+    return result
+
+
+class StreamResampler:
+    """Remuestreo lineal con estado, continuo entre bloques.
+
+    ``ratio`` (salida / entrada) puede ajustarse en marcha para compensar deriva.
+    """
+
+    def __init__(self, in_rate, out_rate, channels):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.channels = channels
+        self.ratio = out_rate / in_rate
+        self._position = 0.0  # posición de la siguiente muestra de salida, en muestras de entrada
+        self._last = None
+
+    @property
+    def passthrough(self):
+        return self.ratio == 1.0
+
+    def process(self, samples):
+        if self.passthrough:
+            return samples
+        if self._last is None:
+            self._last = samples[:1]
+        # La muestra anterior se antepone para interpolar a través del borde del bloque
+        extended = np.concatenate((self._last, samples))
+        step = 1.0 / self.ratio
+        available = len(extended) - 1
+        count = int(np.ceil((available - self._position) / step)) if available > self._position else 0
+        positions = self._position + step * np.arange(count)
+        index = positions.astype(np.int64)
+        frac = (positions - index).astype(np.float32)[:, None]
+        result = extended[index] * (1.0 - frac) + extended[np.minimum(index + 1, available)] * frac
+        self._position = self._position + step * count - available
+        self._last = extended[-1:].copy()
+        return result.astype(np.float32, copy=False)
+
+
+class JitterBuffer:
+    """Anillo acotado de muestras indexado por posición absoluta en la línea de tiempo de salida."""
+
+    def __init__(self, channels, capacity):
+        self.channels = channels
+        self.capacity = capacity
+        self._ring = np.zeros((capacity, channels), dtype=np.float32)
+        self._lock = threading.Lock()
+        self.write_position = 0
+        self.read_position = 0
+        self.underruns = 0
+        self.late = 0
+        self.overruns = 0
+
+    def write(self, samples, position):
+        with self._lock:
+            # Lo que llega después de haberse mezclado ya no sirve
+            if position < self.read_position:
+                skip = min(self.read_position - position, len(samples))
+                self.late += skip
+                samples = samples[skip:]
+                position += skip
+            count = len(samples)
+            if not count:
+                return
+            if count > self.capacity:
+                samples = samples[-self.capacity:]
+                position += count - self.capacity
+                count = self.capacity
+            # Huecos entre bloques se rellenan con silencio
+            if position > self.write_position:
+                self._fill(self.write_position, position - self.write_position, None)
+            end = position + count
+            if end - self.read_position > self.capacity:
+                dropped = end - self.capacity - self.read_position
+                self.overruns += dropped
+                self.read_position += dropped
+            self._fill(position, count, samples)
+            self.write_position = max(self.write_position, end)
+
+    def _fill(self, position, count, samples):
+        count = min(count, self.capacity)
+        start = position % self.capacity
+        first = min(count, self.capacity - start)
+        if samples is None:
+            self._ring[start:start + first] = 0.0
+            self._ring[:count - first] = 0.0
+        else:
+            self._ring[start:start + first] = samples[:first]
+            self._ring[:count - first] = samples[first:count]
+
+    def read(self, out, position):
+        # Copia [position, position + len(out)) en out; lo que falte queda en silencio
+        frames = len(out)
+        with self._lock:
+            available_start = max(position, self.read_position, self.write_position - self.capacity)
+            available_end = min(position + frames, self.write_position)
+            out[:] = 0.0
+            if available_end > available_start:
+                offset = available_start - position
+                count = available_end - available_start
+                start = available_start % self.capacity
+                first = min(count, self.capacity - start)
+                out[offset:offset + first] = self._ring[start:start + first]
+                out[offset + first:offset + count] = self._ring[:count - first]
+                missing = frames - count
+            else:
+                missing = frames
+            if missing and position + frames > self.write_position:
+                self.underruns += missing
+            self.read_position = max(self.read_position, position + frames)
+
+    def stats(self):
+        return {"underrun_frames": self.underruns, "late_frames": self.late, "overrun_frames": self.overruns,
+                "buffered_frames": max(self.write_position - self.read_position, 0)}
+
+
+class SourceChannel:
+    __slots__ = ("source", "resampler", "sync", "jitter", "next_position", "resyncs", "received", "read_time",
+                 "meter")
+
+    def __init__(self, source, rate, channels, capacity, drift_correction=True, meter_rate=0):
+        self.source = source
+        self.resampler = StreamResampler(source.rate, rate, source.channels)
+        self.sync = ClockSync(source.rate, rate, enabled=drift_correction)
+        self.jitter = JitterBuffer(channels, capacity)
+        self.next_position = None
+        self.resyncs = 0
+        self.received = 0
+        self.read_time = None
+        self.meter = LevelMeter(source.channels, source.rate, publish_rate=meter_rate) if meter_rate else None
+
+
+class AudioMixer:
+    """Mezcla N fuentes en tiempo real a una frecuencia y número de canales comunes.
+
+    Cada fuente entrega desde su propio hilo; sus bloques se remuestrean, se
+    colocan en su jitter buffer según la marca de tiempo de captura y un hilo de
+    mezcla los suma con la ganancia de cada fuente ``latency`` segundos por
+    detrás del tiempo real. El resultado pasa por el limitador y se entrega a
+    ``sink`` como PCM int16 entrelazado.
+
+    Todas las marcas de tiempo salen de ``clock``, el mismo reloj maestro que
+    usa el vídeo. La deriva de cada dispositivo se corrige remuestreando
+    ligeramente su audio (``drift_correction``).
+
+    Con ``meter_rate`` > 0 cada fuente mide sus niveles (ya con su ganancia)
+    en su propio hilo y los publica ``meter_rate`` veces por segundo en
+    ``meters[nombre]``.
+    """
+
+    def __init__(self, sources, sink, rate=48000, channels=2, block=1024, latency=0.15,
+                 resync_threshold=0.05, limiter=True, drift_correction=True, clock=time.perf_counter, meter_rate=0):
+        self.sources = list(sources)
+        self.sink = sink
+        self.rate = rate
+        self.channels = channels
+        self.block = block
+        self.latency = latency
+        self.resync_frames = int(resync_threshold * rate)
+        self.clock = clock
+        capacity = int((latency * 2 + 0.5) * rate)
+        self.channel_state = [SourceChannel(source, rate, channels, capacity, drift_correction, meter_rate)
+                              for source in self.sources]
+        self.limiter = LookaheadLimiter(rate, channels) if limiter else None
+        self.start_time = None
+        self.position = 0
+        self.late_blocks = 0
+        self._running = False
+        self._thread = None
+        self._mix = np.zeros((block, channels), dtype=np.float32)
+        self._scratch = np.zeros((block, channels), dtype=np.float32)
+        self._pcm = np.zeros((block, channels), dtype=np.int16)
+        self.mix_time = None
+        self.mux_time = None
+
+    @property
+    def meters(self):
+        return {state.source.name: state.meter for state in self.channel_state if state.meter is not None}
+
+    def instrument(self, metrics):
+        self.mix_time = metrics.histogram("audio_mix_seconds", "Time to mix and limit one audio block")
+        self.mux_time = metrics.histogram("mux_audio_seconds", "Time to hand one mixed block to the muxer")
+        metrics.counter("audio_late_blocks", "Mixer blocks produced late", fn=lambda: self.late_blocks)
+        for state in self.channel_state:
+            name = state.source.name
+            state.read_time = metrics.histogram("audio_read_seconds", "Time to resample and buffer one input block",
+                                                source=name)
+            metrics.counter("audio_underrun_frames", "Frames the mixer read before they arrived",
+                            fn=lambda j=state.jitter: j.underruns, source=name)
+            metrics.counter("audio_resyncs", "Timestamp jumps beyond the resync threshold",
+                            fn=lambda s=state: s.resyncs, source=name)
+            metrics.gauge("audio_drift_ppm", "Estimated clock drift against the master clock",
+                          fn=lambda s=state: s.sync.drift_ppm, source=name)
+
+    def start(self, start_time=None):
+        self.start_time = self.clock() if start_time is None else start_time
+        self._running = True
+        for state in self.channel_state:
+            state.source.start(lambda samples, timestamp, state=state: self._receive(state, samples, timestamp),
+                               self.clock)
+        self._thread = threading.Thread(target=self._run, name="audio-mixer", daemon=True)
+        self._thread.start()
+
+    def _receive(self, state, samples, timestamp):
+        # Hilo de la fuente: remuestrear, adaptar canales y colocar en su posición
+        started = time.perf_counter() if state.read_time is not None else None
+        if state.meter is not None:
+            state.meter.process(samples, state.source.gain)
+        position = int(round((timestamp - self.start_time) * self.rate))
+        offset = 0
+        if state.next_position is None or abs(position - state.next_position) > self.resync_frames:
+            if state.next_position is not None:
+                state.resyncs += 1
+                state.sync.reset_offset()
+        else:
+            # Dentro de la tolerancia los bloques se encadenan sin huecos ni solapes
+            offset = state.next_position - position
+            position = state.next_position
+        state.resampler.ratio = state.sync.update(timestamp, len(samples), offset)
+        data = remix(state.resampler.process(samples), self.channels)
+        state.jitter.write(data, position)
+        state.next_position = position + len(data)
+        state.received += len(data)
+        if started is not None:
+            state.read_time.observe(time.perf_counter() - started)
+
+    def _run(self):
+        while self._running:
+            due = self.start_time + self.latency + (self.position + self.block) / self.rate
+            now = self.clock()
+            if now < due:
+                time.sleep(min(due - now, 0.05))
+                continue
+            if now - due > self.block / self.rate:
+                self.late_blocks += 1
+            self._mix_block()
+
+    def _mix_block(self, frames=None):
+        started = time.perf_counter() if self.mix_time is not None else None
+        mix = self._mix
+        mix[:] = 0.0
+        for state in self.channel_state:
+            state.jitter.read(self._scratch, self.position)
+            self._scratch *= state.source.gain
+            mix += self._scratch
+        if self.limiter is not None:
+            self.limiter.process(mix)
+        else:
+            np.clip(mix, -1.0, 1.0, out=mix)
+        mix *= INT16_SCALE - 1
+        np.rint(mix, out=mix)
+        np.copyto(self._pcm, mix, casting='unsafe')
+        frames = self.block if frames is None else frames
+        self.position += frames
+        if started is None:
+            self.sink(self._pcm[:frames].tobytes())
+            return
+        muxing = time.perf_counter()
+        self.mix_time.observe(muxing - started)
+        self.sink(self._pcm[:frames].tobytes())
+        self.mux_time.observe(time.perf_counter() - muxing)
+
+    def stop(self, stop_time=None):
+        # Con stop_time se mezcla lo que quede hasta ese instante para que el audio dure lo mismo que el vídeo
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for state in self.channel_state:
+            state.source.stop()
+        if stop_time is not None:
+            self.flush(stop_time)
+
+    def flush(self, end_time):
+        # Mezcla lo que quede en los jitter buffers (o silencio) hasta end_time
+        if self.start_time is None:
+            return
+        end = int(round((end_time - self.start_time) * self.rate))
+        while self.position < end:
+            self._mix_block(min(self.block, end - self.position))
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "channels": self.channels,
+            "mixed_frames": self.position,
+            "late_blocks": self.late_blocks,
+            "sources": {
+                state.source.name: dict(state.jitter.stats(), received_frames=state.received,
+                                        resyncs=state.resyncs, gain=state.source.gain, **state.sync.report(),
+                                        **(state.meter.stats() if state.meter is not None else {}))
+                for state in self.channel_state
+            },
+        }
@@ -0,0 +1,270 @@
+import sys
+import time
+
+import cv2
+import mss
+import numpy as np
+
+from recorder.damage import TileDamageTracker
+
+
+class ScreenGrabber:
+    """Captura con mss (todas las plataformas).
+
+    mss devuelve cada captura en un bytearray nuevo, así que aquí sigue
+    habiendo una asignación y una copia al buffer del anillo por frame; solo
+    ``GdiGrabber`` captura sin asignar nada.
+    """
+
+    def __init__(self, bbox, cursor_sample=None):
+        self.bbox = bbox
+        self.cursor_sample = cursor_sample
+        self.sct = None
+
+    def open(self):
+        # mss debe crearse en el hilo que captura
+        self.sct = mss.mss()
+
+    def grab(self, buffer):
+        img = self.sct.grab(self.bbox)
+        # Vista directa sobre el bytearray de mss, sin la copia intermedia de np.array()
+        np.copyto(buffer, np.frombuffer(img.raw, dtype=np.uint8).reshape(buffer.shape))
+        return self.sample_cursor()
+
+    def sample_cursor(self):
+        # La posición del cursor se toma junto al frame; la forma se resuelve al componer
+        if self.cursor_sample is None:
+            return None
+        cursor = self.cursor_sample()
+        if cursor is None:
+            return None
+        x, y, handle = cursor
+        return (x - self.bbox['left'], y - self.bbox['top'], handle)
+
+    def close(self):
+        if self.sct is not None:
+            self.sct.close()
+            self.sct = None
+
+
+class GdiGrabber(ScreenGrabber):
+    """Captura con BitBlt directamente sobre los buffers del anillo (solo Windows).
+
+    Cada slot del anillo de captura es la memoria de una sección DIB propia, así
+    que el frame llega a NumPy sin copias ni asignaciones por frame.
+    """
+
+    def __init__(self, bbox, cursor_sample=None):
+        super().__init__(bbox, cursor_sample)
+        import ctypes
+        from ctypes import wintypes
+        self.ctypes = ctypes
+        self.user32 = ctypes.WinDLL('user32')
+        self.gdi32 = ctypes.WinDLL('gdi32')
+        # Los handles son de 64 bits: sin argtypes ctypes los truncaría a int
+        self.gdi32.CreateDIBSection.argtypes = [wintypes.HDC, ctypes.c_void_p, wintypes.UINT,
+                                                ctypes.POINTER(ctypes.c_void_p), wintypes.HANDLE, wintypes.DWORD]
+        self.gdi32.CreateDIBSection.restype = wintypes.HBITMAP
+        self.gdi32.CreateCompatibleDC.argtypes = [wintypes.HDC]
+        self.gdi32.CreateCompatibleDC.restype = wintypes.HDC
+        self.gdi32.SelectObject.argtypes = [wintypes.HDC, wintypes.HGDIOBJ]
+        self.gdi32.SelectObject.restype = wintypes.HGDIOBJ
+        self.gdi32.BitBlt.argtypes = [wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                      wintypes.HDC, ctypes.c_int, ctypes.c_int, wintypes.DWORD]
+        self.gdi32.DeleteDC.argtypes = [wintypes.HDC]
+        self.gdi32.DeleteObject.argtypes = [wintypes.HGDIOBJ]
+        self.user32.GetWindowDC.argtypes = [wintypes.HWND]
+        self.user32.GetWindowDC.restype = wintypes.HDC
+        self.user32.ReleaseDC.argtypes = [wintypes.HWND, wintypes.HDC]
+        self._dibs = {}
+        self._srcdc = None
+        self._memdc = None
+
+    def allocate(self, shape, dtype):
+        ctypes = self.ctypes
+        height, width = shape[:2]
+
+        class BITMAPINFOHEADER(ctypes.Structure):
+            _fields_ = [
+                ("biSize", ctypes.c_uint32), ("biWidth", ctypes.c_int32), ("biHeight", ctypes.c_int32),
+                ("biPlanes", ctypes.c_uint16), ("biBitCount", ctypes.c_uint16),
+                ("biCompression", ctypes.c_uint32), ("biSizeImage", ctypes.c_uint32),
+                ("biXPelsPerMeter", ctypes.c_int32), ("biYPelsPerMeter", ctypes.c_int32),
+                ("biClrUsed", ctypes.c_uint32), ("biClrImportant", ctypes.c_uint32),
+            ]
+
+        header = BITMAPINFOHEADER()
+        header.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+        header.biWidth = width
+        header.biHeight = -height  # top-down
+        header.biPlanes = 1
+        header.biBitCount = 32
+        bits = ctypes.c_void_p()
+        hbitmap = self.gdi32.CreateDIBSection(None, ctypes.byref(header), 0, ctypes.byref(bits), None, 0)
+        if not hbitmap:
+            raise MemoryError("CreateDIBSection failed")
+        memory = (ctypes.c_uint8 * (width * height * 4)).from_address(bits.value)
+        buffer = np.ctypeslib.as_array(memory).reshape((height, width, 4))
+        self._dibs[buffer.ctypes.data] = hbitmap
+        return buffer
+
+    def open(self):
+        self._srcdc = self.user32.GetWindowDC(0)
+        self._memdc = self.gdi32.CreateCompatibleDC(self._srcdc)
+
+    def grab(self, buffer):
+        bbox = self.bbox
+        self.gdi32.SelectObject(self._memdc, self._dibs[buffer.ctypes.data])
+        # SRCCOPY | CAPTUREBLT
+        self.gdi32.BitBlt(self._memdc, 0, 0, bbox['width'], bbox['height'], self._srcdc,
+                          bbox['left'], bbox['top'], 0x00CC0020 | 0x40000000)
+        self.gdi32.GdiFlush()
+        return self.sample_cursor()
+
+    def close(self):
+        if self._memdc:
+            self.gdi32.DeleteDC(self._memdc)
+            self._memdc = None
+        if self._srcdc:
+            self.user32.ReleaseDC(0, self._srcdc)
+            self._srcdc = None
+
+    def release(self):
+        # Solo cuando ninguna etapa puede seguir leyendo los buffers
+        for hbitmap in self._dibs.values():
+            self.gdi32.DeleteObject(hbitmap)
+        self._dibs = {}
+
+
+def create_grabber(bbox, cursor_sample=None):
+    if sys.platform == 'win32':
+        return GdiGrabber(bbox, cursor_sample)
+    return ScreenGrabber(bbox, cursor_sample)
+
+
+class FrameComposer:
+    """Prepara el frame para el codificador en un buffer reutilizado.
+
+    Con ``pix_fmt='bgra'`` no hay conversión de color: el codificador acepta BGRA
+    directamente y la composición se reduce a una copia y el cursor. Con un
+    ``scaler`` el frame se reduce antes de convertir, así que la conversión y el
+    codificador solo pagan por los píxeles de salida.
+    """
+
+    def __init__(self, cursor=None, pix_fmt='bgr24', scaler=None):
+        self.cursor = cursor
+        self.pix_fmt = pix_fmt
+        self.scaler = scaler if scaler is not None and not scaler.identity else None
+        self.scaled = None
+        self.convert_time = None
+        self.cursor_time = None
+        if self.scaler is not None and self.channels != 4:
+            width, height = self.scaler.dst_size
+            self.scaled = np.empty((height, width, 4), dtype=np.uint8)
+
+    @property
+    def channels(self):
+        return 4 if self.pix_fmt == 'bgra' else 3
+
+    def convert(self, src, dst):
+        if self.pix_fmt == 'bgra':
+            np.copyto(dst, src)
+        else:
+            cv2.cvtColor(src, cv2.COLOR_BGRA2BGR, dst=dst)
+
+    def instrument(self, metrics):
+        # Separa el tiempo de composición en conversión/escalado y cursor
+        self.convert_time = metrics.histogram("convert_seconds", "Color conversion and scaling time per frame")
+        self.cursor_time = metrics.histogram("cursor_seconds", "Cursor drawing time per frame")
+
+    def draw_cursor(self, dst, cursor):
+        if cursor is None or self.cursor is None:
+            return
+        started = time.perf_counter() if self.cursor_time is not None else None
+        if self.scaler is not None:
+            # El sprite se dibuja a tamaño real sobre la posición reescalada, para que siga siendo legible
+            x, y, handle = cursor
+            cursor = self.scaler.scale_point(x, y) + (handle,)
+        self.cursor.draw(dst, cursor)
+        if started is not None:
+            self.cursor_time.observe(time.perf_counter() - started)
+
+    def compose(self, src, dst, cursor):
+        started = time.perf_counter() if self.convert_time is not None else None
+        if self.scaler is None:
+            self.convert(src, dst)
+        elif self.scaled is None:
+            self.scaler.scale(src, dst)
+        else:
+            self.scaler.scale(src, self.scaled)
+            self.convert(self.scaled, dst)
+        if started is not None:
+            self.convert_time.observe(time.perf_counter() - started)
+        self.draw_cursor(dst, cursor)
+
+
+class DamageTrackingComposer(FrameComposer):
+    """Convierte solo los tiles que cambiaron sobre un lienzo persistente.
+
+    Si ni la pantalla ni el cursor cambiaron, ``compose`` devuelve False y el
+    frame no se publica: el codificador repite el anterior.
+    """
+
+    # Por encima de esta fracción de tiles sucios sale más barato convertir todo
+    FULL_CONVERT_FRACTION = 0.5
+
+    def __init__(self, shape, cursor=None, tile=64, pix_fmt='bgr24', scaler=None):
+        super().__init__(cursor, pix_fmt, scaler)
+        self.tracker = TileDamageTracker(shape, tile)
+        self.canvas = np.zeros(shape[:2] + (self.channels,), dtype=np.uint8)
+        self.last_cursor = None
+        self.unchanged = 0
+
+    def compose(self, src, dst, cursor):
+        dirty = self.tracker.update(src)
+        dirty_count = int(dirty.sum())
+        if not dirty_count and cursor == self.last_cursor:
+            self.unchanged += 1
+            return False
+
+        started = time.perf_counter() if self.convert_time is not None else None
+        if dirty_count > self.FULL_CONVERT_FRACTION * self.tracker.tiles:
+            self.convert(src, self.canvas)
+        else:
+            for rows, cols in self.tracker.dirty_tiles(dirty):
+                self.convert(src[rows, cols], self.canvas[rows, cols])
+        # El lienzo guarda la resolución de captura; se reduce completo al publicar
+        if self.scaler is None:
+            np.copyto(dst, self.canvas)
+        else:
+            self.scaler.scale(self.canvas, dst)
+        if started is not None:
+            self.convert_time.observe(time.perf_counter() - started)
+        self.last_cursor = cursor
+        self.draw_cursor(dst, cursor)
+        return True
+
+    def stats(self):
+        stats = self.tracker.stats()
+        stats["unchanged_frames"] = self.unchanged
+        return stats
+
+
+class VideoWriterEncoder:
+    def __init__(self, path, fps, size, fourcc='XVID'):
+        self.path = path
+        self.fps = fps
+        self.size = size
+        self.fourcc = fourcc
+        self.out = None
+
+    def open(self):
+        self.out = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, self.size)
+
+    def write(self, frame):
+        self.out.write(frame)
+
+    def close(self):
+        if self.out is not None:
+            self.out.release()
+            self.out = None
@@ -0,0 +1,259 @@
+import sys
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from recorder.options import CURSOR_COLORS
+
+
+class CursorSprite:
+    """Imagen de cursor con alfa premultiplicado y su punto activo."""
+
+    __slots__ = ("color", "inv_alpha", "hotspot", "scratch")
+
+    def __init__(self, color, alpha, hotspot):
+        # color ya multiplicado por alfa; se guarda 1 - alfa para mezclar con una sola operación
+        self.color = np.ascontiguousarray(color, dtype=np.float32)
+        # Expandido a los tres canales: multiplicar sin broadcasting evita buffers temporales
+        inv_alpha = 1.0 - alpha.astype(np.float32) / 255.0
+        self.inv_alpha = np.repeat(inv_alpha[..., None], 3, axis=2)
+        self.hotspot = hotspot
+        # Buffer de trabajo para mezclar sin asignar memoria en cada frame
+        self.scratch = np.zeros_like(self.color)
+
+    @classmethod
+    def from_bgra(cls, bgra, hotspot):
+        alpha = bgra[..., 3]
+        color = bgra[..., :3].astype(np.float32) * (alpha[..., None] / 255.0)
+        return cls(color, alpha, hotspot)
+
+    @property
+    def size(self):
+        return self.color.shape[1], self.color.shape[0]
+
+
+def blend_sprite(frame, sprite, x, y):
+    # Posición de la esquina superior izquierda del sprite en el frame
+    left = x - sprite.hotspot[0]
+    top = y - sprite.hotspot[1]
+    width, height = sprite.size
+    frame_height, frame_width = frame.shape[:2]
+
+    # Recortar contra los bordes del frame
+    x0, y0 = max(left, 0), max(top, 0)
+    x1, y1 = min(left + width, frame_width), min(top + height, frame_height)
+    if x0 >= x1 or y0 >= y1:
+        return
+    sx0, sy0 = x0 - left, y0 - top
+    sx1, sy1 = sx0 + (x1 - x0), sy0 + (y1 - y0)
+
+    roi = frame[y0:y1, x0:x1, :3]
+    # Se mezcla siempre el sprite completo en float32 sobre el buffer de trabajo contiguo,
+    # aunque esté recortado: operar sobre subvistas obligaría a NumPy a usar temporales
+    scratch = sprite.scratch
+    np.copyto(scratch[sy0:sy1, sx0:sx1], roi, casting='unsafe')
+    scratch *= sprite.inv_alpha
+    scratch += sprite.color
+    np.copyto(roi, scratch[sy0:sy1, sx0:sx1], casting='unsafe')
+
+
+def make_circle_sprite(color, radius=10, thickness=2):
+    size = 2 * (radius + thickness) + 1
+    center = size // 2
+    canvas = np.zeros((size, size, 4), dtype=np.uint8)
+    cv2.circle(canvas, (center, center), radius, tuple(color) + (255,), thickness)
+    return CursorSprite.from_bgra(canvas, (center, center))
+
+
+def make_arrow_sprite(size=20):
+    # Flecha negra con borde blanco, parecida al puntero por defecto; la punta es el hotspot
+    bgra = np.zeros((size, size, 4), dtype=np.uint8)
+    arrow = np.array([[0, 0], [0, size * 0.8], [size * 0.22, size * 0.6], [size * 0.36, size * 0.95],
+                      [size * 0.48, size * 0.9], [size * 0.34, size * 0.56], [size * 0.6, size * 0.56]], np.int32)
+    cv2.fillPoly(bgra, [arrow], (0, 0, 0, 255))
+    cv2.polylines(bgra, [arrow], True, (255, 255, 255, 255), 1)
+    return CursorSprite.from_bgra(bgra, (0, 0))
+
+
+def make_cross_sprite(arm=10, thickness=2, color=(0, 0, 0)):
+    size = 2 * (arm + thickness) + 1
+    center = size // 2
+    canvas = np.zeros((size, size, 4), dtype=np.uint8)
+    bgra = tuple(color) + (255,)
+    cv2.line(canvas, (center - arm, center), (center + arm, center), bgra, thickness)
+    cv2.line(canvas, (center, center - arm), (center, center + arm), bgra, thickness)
+    return CursorSprite.from_bgra(canvas, (center, center))
+
+
+class CursorCache:
+    """Caché LRU de sprites decodificados, indexada por el handle del cursor."""
+
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self._sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, loader):
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        sprite = loader(key)
+        if sprite is not None:
+            self._sprites[key] = sprite
+            if len(self._sprites) > self.capacity:
+                self._sprites.popitem(last=False)
+        return sprite
+
+    def __len__(self):
+        return len(self._sprites)
+
+
+class Win32CursorProvider:
+    """Posición y forma del cursor del sistema en Windows."""
+
+    def __init__(self):
+        import win32api
+        import win32con
+        import win32gui
+        import win32ui
+        self.win32con = win32con
+        self.win32gui = win32gui
+        self.win32ui = win32ui
+        self.cursor_size = win32api.GetSystemMetrics(win32con.SM_CXCURSOR) or 32
+
+    def sample(self):
+        # Devuelve (x, y, handle) o None si el cursor está oculto
+        flags, handle, position = self.win32gui.GetCursorInfo()
+        if not flags & self.win32con.CURSOR_SHOWING or not handle:
+            return None
+        return position[0], position[1], handle
+
+    def load_sprite(self, handle):
+        # Dibujar el cursor sobre negro y sobre blanco da directamente el color
+        # premultiplicado y el alfa, también para cursores monocromo sin canal alfa
+        on_black = self._render(handle, 0x000000)
+        on_white = self._render(handle, 0xFFFFFF)
+        alpha = 255 - (on_white[..., :3].astype(np.int16) - on_black[..., :3]).max(axis=2)
+        alpha = np.clip(alpha, 0, 255).astype(np.uint8)
+
+        icon_info = self.win32gui.GetIconInfo(handle)
+        for bitmap in icon_info[3:]:
+            if bitmap:
+                self.win32gui.DeleteObject(bitmap)
+        return CursorSprite(on_black[..., :3], alpha, (icon_info[1], icon_info[2]))
+
+    def _render(self, handle, background):
+        size = self.cursor_size
+        hdc = self.win32gui.GetDC(0)
+        hdc_mem = self.win32ui.CreateDCFromHandle(hdc)
+        hdc_compatible = hdc_mem.CreateCompatibleDC()
+        hbitmap = self.win32ui.CreateBitmap()
+        hbitmap.CreateCompatibleBitmap(hdc_mem, size, size)
+        try:
+            hdc_compatible.SelectObject(hbitmap)
+            hdc_compatible.FillSolidRect((0, 0, size, size), background)
+            self.win32gui.DrawIconEx(hdc_compatible.GetHandleOutput(), 0, 0, handle, size, size, 0, 0,
+                                     self.win32con.DI_NORMAL)
+            bmpinfo = hbitmap.GetInfo()
+            bits = hbitmap.GetBitmapBits(True)
+            return np.frombuffer(bits, dtype=np.uint8).reshape((bmpinfo['bmHeight'], bmpinfo['bmWidth'], 4))
+        finally:
+            hdc_compatible.DeleteDC()
+            hdc_mem.DeleteDC()
+            self.win32gui.ReleaseDC(0, hdc)
+            self.win32gui.DeleteObject(hbitmap.GetHandle())
+
+
+class NullCursorProvider:
+    """Sin cursor: para capturas en las que no hay puntero o no interesa."""
+
+    def sample(self):
+        return None
+
+    def load_sprite(self, handle):
+        return None
+
+
+class ScriptedCursorProvider:
+    """Cursor que recorre una lista de puntos en bucle, para pruebas sin ratón real.
+
+    ``points`` son posiciones de escritorio visitadas una tras otra en ``period``
+    segundos, interpolando linealmente entre ellas.
+    """
+
+    HANDLE = 1
+
+    def __init__(self, points, period=4.0, clock=time.perf_counter):
+        self.points = np.asarray(points, dtype=np.float64)
+        self.period = period
+        self.clock = clock
+        self.start_time = None
+        self.sprite = make_arrow_sprite()
+
+    @classmethod
+    def around(cls, bbox, **kwargs):
+        # Rombo inscrito en la región capturada
+        cx = bbox['left'] + bbox['width'] / 2
+        cy = bbox['top'] + bbox['height'] / 2
+        rx, ry = bbox['width'] * 0.4, bbox['height'] * 0.4
+        return cls([(cx - rx, cy), (cx, cy - ry), (cx + rx, cy), (cx, cy + ry)], **kwargs)
+
+    def sample(self):
+        now = self.clock()
+        if self.start_time is None:
+            self.start_time = now
+        count = len(self.points)
+        phase = ((now - self.start_time) / self.period % 1.0) * count
+        i = int(phase)
+        frac = phase - i
+        x, y = self.points[i] * (1.0 - frac) + self.points[(i + 1) % count] * frac
+        return int(x), int(y), self.HANDLE
+
+    def load_sprite(self, handle):
+        return self.sprite
+
+
+def create_cursor_provider(kind, bbox=None):
+    # "system" es el cursor real (solo Windows); fuera de Windows no hay cursor que leer
+    if kind == "system":
+        if sys.platform == 'win32':
+            return Win32CursorProvider()
+        return NullCursorProvider()
+    if kind == "scripted":
+        return ScriptedCursorProvider.around(bbox)
+    if kind == "none":
+        return NullCursorProvider()
+    raise ValueError(f"Unknown cursor provider: {kind}")
+
+
+class CursorCompositor:
+    """Dibuja el cursor en el frame con un único recorte y mezcla por ROI."""
+
+    def __init__(self, style, provider=None, cache_size=32):
+        self.style = style
+        self.provider = provider
+        self.cache = CursorCache(cache_size)
+        if style in CURSOR_COLORS:
+            self.fixed_sprite = make_circle_sprite(CURSOR_COLORS[style])
+        elif style == "Cross":
+            self.fixed_sprite = make_cross_sprite()
+        else:
+            self.fixed_sprite = None
+
+    def draw(self, frame, cursor):
+        # cursor = (x, y, handle) relativo al frame
+        x, y, handle = cursor
+        sprite = self.fixed_sprite
+        if sprite is None:
+            if self.provider is None or not handle:
+                return
+            sprite = self.cache.get(handle, self.provider.load_sprite)
+            if sprite is None:
+                return
+        blend_sprite(frame, sprite, x, y)
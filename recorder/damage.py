@@ -0,0 +1,92 @@
+import time
+from collections import deque
+
+import numpy as np
+
+
+class TileDamageTracker:
+    """Detecta qué tiles de un frame BGRA cambiaron respecto al anterior."""
+
+    def __init__(self, shape, tile=64, history=3600):
+        if tile % 8:
+            raise ValueError("Tile size must be a multiple of 8")
+        height, width = shape[:2]
+        self.shape = shape
+        self.tile = tile
+        self.rows = -(-height // tile)
+        self.cols = -(-width // tile)
+        self.row_starts = np.arange(self.rows) * tile
+        self.col_starts = np.arange(self.cols) * tile
+        self.tiles = self.rows * self.cols
+        self.previous = np.zeros(shape, dtype=np.uint8)
+        # Máscara por píxel con relleno hasta múltiplos del tile; el relleno nunca cambia
+        self._mask = np.zeros((self.rows * tile, self.cols * tile), dtype=bool)
+        self._mask_view = self._mask[:height, :width]
+        self._primed = False
+        # Fracción de tiles sucios agregada por segundo
+        self.history = deque(maxlen=history)
+        self._window_start = None
+        self._window_dirty = 0
+        self._window_total = 0
+
+    def update(self, frame, timestamp=None):
+        # Devuelve la máscara (filas x columnas de tiles) de tiles modificados
+        if not self._primed:
+            dirty = np.ones((self.rows, self.cols), dtype=bool)
+            np.copyto(self.previous, frame)
+            self._primed = True
+        else:
+            # Un píxel BGRA se compara como un único uint32
+            np.not_equal(frame.view(np.uint32)[..., 0], self.previous.view(np.uint32)[..., 0], out=self._mask_view)
+            dirty = self._reduce_tiles()
+            for y, x in self.dirty_tiles(dirty):
+                self.previous[y, x] = frame[y, x]
+        self._account(int(dirty.sum()), timestamp)
+        return dirty
+
+    def _reduce_tiles(self):
+        # Se reduce de 8 en 8 booleanos viéndolos como uint64: primero las filas
+        # de cada banda de tiles y después las columnas de cada tile
+        tile = self.tile
+        packed = self._mask.view(np.uint64).reshape(self.rows, tile, self.cols * tile // 8)
+        bands = packed.max(axis=1)
+        return bands.reshape(self.rows, self.cols, tile // 8).max(axis=2) != 0
+
+    def dirty_tiles(self, dirty):
+        # Rebanadas (filas, columnas) de cada tile marcado
+        tile = self.tile
+        for row, col in zip(*np.nonzero(dirty)):
+            y = self.row_starts[row]
+            x = self.col_starts[col]
+            yield slice(y, y + tile), slice(x, x + tile)
+
+    def _account(self, dirty_count, timestamp):
+        now = time.perf_counter() if timestamp is None else timestamp
+        if self._window_start is None:
+            self._window_start = now
+        if now - self._window_start >= 1.0 and self._window_total:
+            self.history.append(self._window_dirty / self._window_total)
+            self._window_start = now
+            self._window_dirty = 0
+            self._window_total = 0
+        self._window_dirty += dirty_count
+        self._window_total += self.tiles
+
+    @property
+    def dirty_fraction(self):
+        # Último valor por segundo disponible
+        if self.history:
+            return self.history[-1]
+        if self._window_total:
+            return self._window_dirty / self._window_total
+        return 0.0
+
+    def stats(self):
+        history = list(self.history)
+        return {
+            "tiles": self.tiles,
+            "tile_size": self.tile,
+            "dirty_fraction": round(self.dirty_fraction, 4),
+            "mean_dirty_fraction": round(sum(history) / len(history), 4) if history else round(self.dirty_fraction, 4),
+            "dirty_fraction_per_second": [round(value, 4) for value in history],
+        }
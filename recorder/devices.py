@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import threading
+
+
+def _restart_portaudio(sd):
+    # PortAudio solo enumera los dispositivos al inicializarse y sounddevice no
+    # tiene una API pública para repetirlo: se usan sus funciones internas
+    # _terminate()/_initialize(). Si una versión las cambia, no se reescanea.
+    try:
+        terminate, initialize = sd._terminate, sd._initialize
+    except AttributeError:
+        return False
+    terminate()
+    initialize()
+    return True
+
+
+class AudioDevice:
+    """Dispositivo de audio tal como lo vio PortAudio en el último escaneo.
+
+    ``index`` es el índice de PortAudio, el mismo que usa sounddevice, y cambia
+    al conectar o desconectar dispositivos. ``key`` (API de audio y nombre) no
+    cambia: es lo que se guarda para volver a encontrar el dispositivo.
+    """
+
+    __slots__ = ("index", "name", "hostapi", "inputs", "outputs", "samplerate")
+
+    def __init__(self, index, name, hostapi, inputs=0, outputs=0, samplerate=48000.0):
+        self.index = index
+        self.name = name
+        self.hostapi = hostapi
+        self.inputs = inputs
+        self.outputs = outputs
+        self.samplerate = samplerate
+
+    @property
+    def key(self):
+        return f"{self.hostapi}: {self.name}"
+
+    def as_dict(self):
+        return {"index": self.index, "name": self.name, "hostapi": self.hostapi, "inputs": self.inputs,
+                "outputs": self.outputs, "samplerate": self.samplerate}
+
+
+class AudioDeviceRegistry:
+    """Lista de dispositivos de audio enumerada una sola vez y compartida por toda la aplicación.
+
+    La última lista se guarda en ``cache_path``, así que la interfaz puede
+    rellenar sus selectores al arrancar sin cargar sounddevice ni inicializar
+    PortAudio. ``start()`` escanea en un hilo propio y repite cada ``interval``
+    segundos para detectar dispositivos conectados o desconectados;
+    ``on_change(devices)`` se llama desde ese hilo cuando la lista cambia (en
+    Qt, conectarlo a una señal). PortAudio solo enumera al inicializarse, así
+    que cada reescaneo lo reinicia: con un stream abierto hay que llamar a
+    ``pause()``.
+    """
+
+    def __init__(self, cache_path=None, interval=10.0, on_change=None, logger=None):
+        self.cache_path = cache_path
+        self.interval = interval
+        self.on_change = on_change
+        self.log = logger or logging.getLogger("recorder").info
+        self.lock = threading.Lock()
+        self.default_input = None
+        self.scans = 0
+        self.paused = False
+        self.running = False
+        self.wakeup = threading.Event()
+        self.thread = None
+        self._devices = []
+        # Un escaneo en curso no puede coincidir con la apertura de un stream
+        self._scan_lock = threading.Lock()
+        self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding="utf-8") as cache:
+                data = json.load(cache)
+            self._devices = [AudioDevice(**device) for device in data["devices"]]
+            self.default_input = data.get("default_input")
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.log(f"Ignoring audio device cache: {e}")
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        data = {"devices": [device.as_dict() for device in self.devices()], "default_input": self.default_input}
+        try:
+            with open(self.cache_path + ".tmp", "w", encoding="utf-8") as cache:
+                json.dump(data, cache, indent=2)
+            os.replace(self.cache_path + ".tmp", self.cache_path)
+        except OSError as e:
+            self.log(f"Could not save the audio device cache: {e}")
+
+    def devices(self):
+        with self.lock:
+            return list(self._devices)
+
+    def inputs(self):
+        return [device for device in self.devices() if device.inputs > 0]
+
+    def resolve(self, key):
+        """Índice actual de PortAudio para ``key``, o None si el dispositivo ya no está.
+
+        Si no coincide la clave completa se acepta el nombre, pero solo cuando
+        un único dispositivo de entrada lo tiene: mejor la entrada por defecto
+        que grabar de otro micrófono.
+        """
+        inputs = self.inputs()
+        for device in inputs:
+            if device.key == key:
+                return device.index
+        name = key.split(": ", 1)[-1]
+        matches = [device for device in inputs if device.name == name]
+        return matches[0].index if len(matches) == 1 else None
+
+    def scan(self):
+        # Devuelve True si la lista ha cambiado
+        import sounddevice as sd
+        if self.scans and not _restart_portaudio(sd):
+            # La lista ya escaneada sigue valiendo; solo se pierde la detección de cambios
+            self.log("This sounddevice version cannot rescan audio devices, hotplug detection is off.")
+            self.running = False
+            return False
+        hostapis = [hostapi['name'] for hostapi in sd.query_hostapis()]
+        devices = [AudioDevice(index, info['name'], hostapis[info['hostapi']], info['max_input_channels'],
+                               info['max_output_channels'], info['default_samplerate'])
+                   for index, info in enumerate(sd.query_devices())]
+        default_index = sd.default.device[0]
+        default_input = next((device.key for device in devices if device.index == default_index), None)
+        self.scans += 1
+        with self.lock:
+            changed = ([device.as_dict() for device in devices] != [device.as_dict() for device in self._devices]
+                       or default_input != self.default_input)
+            self._devices = devices
+            self.default_input = default_input
+        if changed:
+            self._save_cache()
+            if self.on_change is not None:
+                self.on_change(devices)
+        return changed
+
+    def refresh(self):
+        # Adelanta el siguiente escaneo
+        self.wakeup.set()
+
+    def pause(self):
+        # Espera a que termine un escaneo en curso: después ya se puede abrir un stream
+        with self._scan_lock:
+            self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="audio-devices", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def _run(self):
+        while self.running:
+            with self._scan_lock:
+                if not self.paused:
+                    try:
+                        self.scan()
+                    except Exception as e:
+                        self.log(f"Audio device scan failed: {e}")
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
@@ -0,0 +1,176 @@
+import math
+
+import numpy as np
+
+INT16_SCALE = 32768.0
+
+
+class LookaheadLimiter:
+    """Limitador con anticipación y ataque/relajación suavizados entre bloques.
+
+    Trabaja en float32 (frames, canales) con la ganancia de cada canal por
+    separado. La ganancia se calcula por sub-bloques de ``block`` muestras y se
+    interpola linealmente dentro de cada uno; la salida va retrasada
+    ``lookahead_ms`` para que la ganancia ya haya bajado cuando llega el pico.
+    El estado (línea de retardo, ganancia, picos recientes) se conserva entre
+    llamadas, así no hay saltos de ganancia en los bordes de cada chunk.
+
+    Los chunks pueden tener cualquier longitud: sólo se procesan bloques
+    completos y las muestras sobrantes esperan a la siguiente llamada. Para
+    devolver siempre tantas muestras como entran, la salida lleva ``block - 1``
+    muestras más de retardo; el total está en ``latency_samples``.
+    """
+
+    def __init__(self, rate, channels, threshold=0.8, lookahead_ms=5.0, attack_ms=1.0,
+                 release_ms=150.0, block=32):
+        self.rate = rate
+        self.channels = channels
+        self.threshold = threshold
+        self.block = block
+        self.lookahead_blocks = max(1, int(round(lookahead_ms * rate / 1000.0 / block)))
+        self.delay_samples = self.lookahead_blocks * block
+        self.latency_samples = self.delay_samples + block - 1
+        block_seconds = block / rate
+        self.attack_coeff = math.exp(-block_seconds / (attack_ms / 1000.0)) if attack_ms > 0 else 0.0
+        self.release_coeff = math.exp(-block_seconds / (release_ms / 1000.0))
+        self.gain = [1.0] * channels
+        self.reduction_db = 0.0
+        self._history = np.ones((self.lookahead_blocks, channels), dtype=np.float32)
+        self._delay = np.zeros((self.delay_samples, channels), dtype=np.float32)
+        self._ramp = (np.arange(1, block + 1, dtype=np.float32) / block)[:, None]
+        # Entrada que no llena un bloque y salida ya procesada que aún no se ha devuelto
+        self._carry = 0
+        self._pending = block - 1
+        self._staged = np.zeros((block, channels), dtype=np.float32)
+        self._out = np.zeros((block, channels), dtype=np.float32)
+        self._capacity = 0
+        self._ensure(4096)
+
+    def _ensure(self, frames):
+        # Buffers de trabajo reutilizados; sólo crecen si llega un chunk mayor
+        if frames <= self._capacity:
+            return
+        blocks = -(-frames // self.block) + 1
+        self._capacity = frames
+        # El resto de la entrada y la salida pendiente (< block) se conservan al crecer
+        staged = np.empty((blocks * self.block, self.channels), dtype=np.float32)
+        staged[:self._carry] = self._staged[:self._carry]
+        self._staged = staged
+        out = np.empty((blocks * self.block, self.channels), dtype=np.float32)
+        out[:self._pending] = self._out[:self._pending]
+        self._out = out
+        self._work = np.empty((self.delay_samples + blocks * self.block, self.channels), dtype=np.float32)
+        self._gains = np.empty((blocks * self.block, self.channels), dtype=np.float32)
+        # Picos por canal en filas contiguas: reducir a lo largo del último eje es lo más rápido
+        self._peaks = np.empty((self.channels, blocks * self.block), dtype=np.float32)
+        self._wanted = np.empty((blocks, self.channels), dtype=np.float32)
+        self._targets = np.empty((self.lookahead_blocks + blocks, self.channels), dtype=np.float32)
+        self._block_gains = np.empty((blocks + 1, self.channels), dtype=np.float32)
+        self._diffs = np.empty((blocks, 1, self.channels), dtype=np.float32)
+
+    def process(self, samples):
+        frames = samples.shape[0]
+        if not frames:
+            return samples
+        self._ensure(frames)
+        carry = self._carry
+        total = carry + frames
+        whole = total - total % self.block
+        staged = self._staged
+        staged[carry:total] = samples
+        if whole:
+            self._process_blocks(staged[:whole])
+        # La salida procesada se encola detrás de la pendiente y se devuelven las primeras ``frames``
+        out = self._out
+        pending = self._pending + whole
+        out[self._pending:pending] = staged[:whole]
+        samples[:] = out[:frames]
+        self._pending = pending - frames
+        out[:self._pending] = out[frames:pending]
+        self._carry = total - whole
+        staged[:self._carry] = staged[whole:total]
+        return samples
+
+    def _process_blocks(self, samples):
+        # ``samples`` tiene un número entero de bloques y se procesa en su sitio
+        frames = samples.shape[0]
+        block = self.block
+        blocks = frames // block
+        lookahead = self.lookahead_blocks
+
+        # Ganancia necesaria por sub-bloque: umbral / pico (máximo 1)
+        peaks = self._peaks[:, :frames]
+        np.abs(samples.T, out=peaks)
+        block_peaks = peaks.reshape(self.channels, blocks, block).max(axis=2)
+        np.maximum(block_peaks, self.threshold, out=block_peaks)
+        targets = self._targets[:lookahead + blocks]
+        targets[:lookahead] = self._history
+        np.divide(self.threshold, block_peaks.T, out=targets[lookahead:])
+        self._history[:] = targets[blocks:]
+
+        # Anticipación: cada bloque de salida usa el mínimo de la ventana que aún está en el retardo
+        wanted = self._wanted[:blocks]
+        wanted[:] = targets[:blocks]
+        for shift in range(1, lookahead + 1):
+            np.minimum(wanted, targets[shift:shift + blocks], out=wanted)
+
+        # Suavizado ataque/relajación, un paso por sub-bloque
+        block_gains = self._block_gains[:blocks + 1]
+        block_gains[0] = self.gain
+        attack, release = self.attack_coeff, self.release_coeff
+        if min(self.gain) >= 1.0 and wanted.min() >= 1.0:
+            # Caso habitual: nada supera el umbral y no hay ganancia que recuperar
+            block_gains[1:] = 1.0
+        else:
+            for channel in range(self.channels):
+                gain = self.gain[channel]
+                column = wanted[:, channel].tolist()
+                out = block_gains[1:, channel]
+                for i, target in enumerate(column):
+                    coeff = attack if target < gain else release
+                    gain = target + coeff * (gain - target)
+                    out[i] = gain
+                self.gain[channel] = gain
+
+        # Rampa lineal entre la ganancia al inicio y al final de cada sub-bloque
+        gains = self._gains[:blocks * block].reshape(blocks, block, self.channels)
+        start = block_gains[:-1, None, :]
+        diffs = self._diffs[:blocks]
+        np.subtract(block_gains[1:, None, :], start, out=diffs)
+        np.multiply(diffs, self._ramp, out=gains)
+        gains += start
+
+        # Salida retrasada: línea de retardo + chunk actual, multiplicada por la ganancia
+        work = self._work[:self.delay_samples + frames]
+        work[:self.delay_samples] = self._delay
+        work[self.delay_samples:] = samples
+        np.multiply(work[:frames], self._gains[:frames], out=samples)
+        self._delay[:] = work[frames:]
+        np.clip(samples, -1.0, 1.0, out=samples)
+        self.reduction_db = -20.0 * math.log10(max(min(self.gain), 1e-6))
+
+
+class AudioProcessor:
+    """Volumen + limitador sobre chunks PCM int16 entrelazados, con buffers reutilizados."""
+
+    def __init__(self, rate, channels, volume=1.0, **limiter_kwargs):
+        self.channels = channels
+        self.volume = volume
+        self.limiter = LookaheadLimiter(rate, channels, **limiter_kwargs)
+        self._float = np.empty((0, channels), dtype=np.float32)
+        self._int16 = np.empty((0, channels), dtype=np.int16)
+
+    def process(self, data):
+        pcm = np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels)
+        frames = pcm.shape[0]
+        if self._float.shape[0] < frames:
+            self._float = np.empty((frames, self.channels), dtype=np.float32)
+            self._int16 = np.empty((frames, self.channels), dtype=np.int16)
+        samples = self._float[:frames]
+        out = self._int16[:frames]
+        np.multiply(pcm, self.volume / INT16_SCALE, out=samples, casting='unsafe')
+        self.limiter.process(samples)
+        samples *= INT16_SCALE - 1
+        np.rint(samples, out=samples)
+        np.copyto(out, samples, casting='unsafe')
+        return out.tobytes()
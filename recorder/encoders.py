@@ -0,0 +1,169 @@
+import json
+import os
+import platform
+import tempfile
+import time
+
+from recorder.ffmpeg_mux import FFmpegMuxer, find_ffmpeg
+
+# Presets de x264/x265, del más rápido al de mejor compresión
+PRESETS = ("ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow")
+
+# Candidatos del sondeo, de mejor a peor calidad: se elige el primero que aguanta los fps
+DEFAULT_CANDIDATES = [("x264", preset) for preset in reversed(PRESETS[:6])]
+
+
+class EncoderBackend:
+    """Códec de ffmpeg que codifica y multiplexa mientras se graba."""
+
+    streaming = True
+
+    def __init__(self, name, label, codec, lossless=False, containers=None, audio_codec='aac'):
+        self.name = name
+        self.label = label
+        self.codec = codec
+        self.lossless = lossless
+        self.containers = containers  # extensiones admitidas, None = cualquiera
+        self.audio_codec = audio_codec
+
+    @property
+    def available(self):
+        return find_ffmpeg() is not None
+
+    def supports(self, output):
+        return self.containers is None or os.path.splitext(output)[1].lower() in self.containers
+
+    def options(self, preset, crf):
+        # Argumentos para FFmpegMuxer / SegmentedMuxer
+        return {'codec': self.codec, 'preset': preset, 'crf': crf, 'audio_codec': self.audio_codec}
+
+    def create(self, output, fps, size, audio=None, preset='veryfast', crf=23, pix_fmt='bgra'):
+        return FFmpegMuxer(output, fps, size, audio=audio, pix_fmt=pix_fmt, **self.options(preset, crf))
+
+
+class OpenCVBackend(EncoderBackend):
+    """VideoWriter de OpenCV a un fichero temporal; el audio se une después."""
+
+    streaming = False
+
+    def __init__(self, name, label, fourcc, extension='.avi'):
+        super().__init__(name, label, fourcc)
+        self.fourcc = fourcc
+        self.extension = extension
+
+    @property
+    def available(self):
+        return True
+
+    def supports(self, output):
+        return True
+
+    def create(self, output, fps, size, audio=None, preset='veryfast', crf=23, pix_fmt='bgr24'):
+        # OpenCV solo se carga si se graba con este backend
+        from recorder.capture import VideoWriterEncoder
+        return VideoWriterEncoder(output, fps, size, fourcc=self.fourcc)
+
+
+ENCODER_BACKENDS = {}
+
+
+def register_backend(backend):
+    ENCODER_BACKENDS[backend.name] = backend
+    return backend
+
+
+def get_backend(name):
+    try:
+        return ENCODER_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown encoder: {name} (available: {', '.join(ENCODER_BACKENDS)})")
+
+
+register_backend(EncoderBackend("x264", "H.264 (x264)", "libx264"))
+register_backend(EncoderBackend("x265", "H.265 (x265)", "libx265", containers=(".mp4", ".mov", ".mkv")))
+register_backend(EncoderBackend("vp9", "VP9", "libvpx-vp9", containers=(".mkv", ".mp4", ".webm"),
+                                audio_codec='libopus'))
+register_backend(EncoderBackend("ffv1", "FFV1 (Lossless)", "ffv1", lossless=True, containers=(".mkv", ".avi"),
+                                audio_codec='pcm_s16le'))
+register_backend(EncoderBackend("raw", "Raw BGRA (Lossless)", "rawvideo", lossless=True,
+                                containers=(".avi", ".mov"), audio_codec='pcm_s16le'))
+register_backend(OpenCVBackend("opencv", "OpenCV XVID (Post-Process)", "XVID"))
+
+
+def _probe_frames(size, count=16):
+    # Frames de pantalla sintéticos y distintos entre sí; el contenido influye en la velocidad del códec
+    import numpy as np
+    from recorder.sources import SyntheticSource
+    width, height = size
+    source = SyntheticSource({'left': 0, 'top': 0, 'width': width, 'height': height})
+    source.open()
+    frames = [np.empty((height, width, 4), dtype=np.uint8) for _ in range(count)]
+    for frame in frames:
+        source.grab(frame)
+    return frames
+
+
+def probe_encoder(backend, preset, crf, size, fps, frames, seconds=1.0):
+    """Mide cuántos frames por segundo codifica ``backend`` con este preset, incluyendo el cierre."""
+    with tempfile.TemporaryDirectory() as folder:
+        extension = backend.containers[0] if backend.containers else getattr(backend, "extension", ".mkv")
+        output = os.path.join(folder, "probe" + extension)
+        encoder = backend.create(output, fps, size, preset=preset, crf=crf)
+        started = time.perf_counter()
+        encoder.open()
+        written = 0
+        try:
+            while time.perf_counter() - started < seconds:
+                encoder.write(frames[written % len(frames)])
+                written += 1
+        finally:
+            encoder.close()
+        return written / (time.perf_counter() - started)
+
+
+def select_encoder(size, fps, candidates=None, crf=23, headroom=1.2, seconds=1.0, cache_path=None, logger=None):
+    """Sondea los candidatos en esta CPU y devuelve (backend, preset, resultados).
+
+    Se elige el primero (el de mejor calidad) cuya velocidad medida supera
+    ``fps * headroom``; si ninguno llega, el más rápido. Las medidas se guardan
+    en ``cache_path`` por CPU, resolución, códec y preset para no repetirlas.
+    """
+    candidates = candidates or DEFAULT_CANDIDATES
+    cache = {}
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+    frames = None
+    results = []
+    chosen = None
+    for name, preset in candidates:
+        backend = get_backend(name)
+        if not backend.available or not backend.streaming:
+            continue
+        key = f"{platform.processor() or platform.machine()}|{size[0]}x{size[1]}|{name}|{preset}|{crf}"
+        measured = cache.get(key)
+        if measured is None:
+            if frames is None:
+                frames = _probe_frames(size)
+            try:
+                measured = probe_encoder(backend, preset, crf, size, fps, frames, seconds)
+            except (OSError, RuntimeError) as e:
+                if logger:
+                    logger(f"Encoder probe {name}/{preset} failed: {e}")
+                continue
+            cache[key] = measured
+        results.append((name, preset, round(measured, 1)))
+        if logger:
+            logger(f"Encoder probe {name}/{preset}: {measured:.1f} fps")
+        if measured >= fps * headroom:
+            chosen = (name, preset)
+            break
+    if cache_path and cache:
+        with open(cache_path, "w") as f:
+            json.dump(cache, f, indent=2)
+    if chosen is None:
+        if not results:
+            return get_backend("opencv"), PRESETS[0], results
+        name, preset, _ = max(results, key=lambda result: result[2])
+        chosen = (name, preset)
+    return get_backend(chosen[0]), chosen[1], results
@@ -0,0 +1,561 @@
+import copy
+import logging
+import os
+import shutil
+import time
+
+from recorder.adaptive import AdaptiveQualityController, apply_level, build_ladder
+from recorder.audio_engine import AudioMixer, BufferSource, SoundDeviceSource, create_system_source
+from recorder.capture import DamageTrackingComposer, FrameComposer
+from recorder.cursor import CursorCompositor, create_cursor_provider
+from recorder.encoders import get_backend, select_encoder
+from recorder.ffmpeg_mux import FFmpegMuxer
+from recorder.jobs import FinalizeJob, finalize
+from recorder.multimonitor import MultiMonitorSource, lockstep_report, monitor_outputs, union_region
+from recorder.pipeline import DROP_OLDEST, CapturePipeline
+from recorder.preview import PreviewTap
+from recorder.replay import ReplayBuffer
+from recorder.scaling import FrameScaler, fit_size
+from recorder.segments import SegmentedMuxer
+from recorder.sources import create_source
+from recorder.sync import sync_report
+from recorder.telemetry import JsonLinesExporter, MetricsRegistry, MetricsServer, RecordingProfiler
+from recorder.wav_writer import WavWriter
+
+
+class RecorderConfig:
+    """Parámetros de una grabación, independientes de la interfaz.
+
+    ``region`` es un dict con ``left``, ``top``, ``width`` y ``height`` en
+    coordenadas de escritorio. ``encoder`` es el nombre de un backend de
+    ``recorder.encoders`` o "auto" para sondear la CPU y elegir el de mejor
+    calidad que aguante los fps. ``mic_device`` acepta un índice o nombre de
+    sounddevice (None = entrada por defecto) y solo se usa con ``mic=True``.
+
+    ``source`` elige de dónde salen los frames ("screen", "synthetic" o
+    "replay" con ``source_path``) y ``cursor_provider`` de dónde sale el cursor
+    ("system", "scripted" o "none"); junto con ``synthetic_audio`` permiten
+    ejecutar la grabación completa sin pantalla ni dispositivos de audio.
+
+    ``output_size`` (ancho, alto) limita la resolución del vídeo: la captura se
+    reduce manteniendo la proporción con ``interpolation`` ("area", "linear" o
+    "box"). Para grabar solo una parte del monitor basta con que ``region`` sea
+    ese rectángulo; ver ``recorder.scaling.crop_region``.
+
+    Con ``preview_every`` > 0, uno de cada N frames compuestos se publica
+    reducido a ``preview_size`` en ``Recorder.preview`` para mostrarlo en vivo.
+
+    Telemetría: ``metrics_path`` escribe una instantánea de las métricas por
+    línea (JSON) cada ``metrics_interval`` segundos y ``metrics_port`` las sirve
+    en http://127.0.0.1:PORT/metrics para Prometheus. ``profile`` ejecuta cada
+    etapa bajo cProfile y registra la memoria con tracemalloc; los resultados
+    quedan en ``tmp_dir/profile``.
+
+    Repetición instantánea: con ``replay_seconds`` > 0 no se escribe ningún
+    fichero mientras se graba; el vídeo y el audio codificados se guardan en un
+    anillo en memoria de como mucho ``replay_max_mb`` y ``Recorder.save_replay()``
+    vuelca los últimos segundos a disco sin recodificar.
+
+    Con ``monitors`` (lista de rectángulos) se graban varios monitores en un
+    solo vídeo: ``region`` pasa a ser el rectángulo que los contiene a todos y
+    cada monitor se captura en paralelo en su parte del lienzo. Para un fichero
+    por monitor se usa ``MultiMonitorRecorder``.
+
+    Con ``level_meter_rate`` > 0 cada fuente de audio publica sus niveles
+    (RMS, pico y pico retenido por canal) ese número de veces por segundo en
+    ``Recorder.meters``, un ``recorder.meter.LevelMeter`` por fuente.
+    """
+
+    def __init__(self, output, region, fps=15, encoder='x264', preset='veryfast', crf=23,
+                 mic=False, mic_device=None, mic_gain=1.0, system_audio=False, system_gain=0.7,
+                 cursor_style=None, segment_seconds=0, segment_bytes=0,
+                 damage_tracking=False, drop_policy=DROP_OLDEST, tmp_dir=None,
+                 audio_rate=48000, audio_channels=2, source="screen", source_path=None, motion=0.1,
+                 cursor_provider="system", synthetic_audio=False, adaptive_quality=False,
+                 output_size=None, interpolation="area", preview_every=0, preview_size=(480, 270),
+                 metrics_path=None, metrics_port=0, metrics_interval=1.0, profile=False,
+                 replay_seconds=0, replay_max_mb=256, monitors=None, level_meter_rate=0):
+        self.output = output
+        self.region = dict(region)
+        self.fps = fps
+        self.encoder = encoder
+        self.preset = preset
+        self.crf = crf
+        self.mic = mic
+        self.mic_device = mic_device
+        self.mic_gain = mic_gain
+        self.system_audio = system_audio
+        self.system_gain = system_gain
+        self.cursor_style = cursor_style
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.damage_tracking = damage_tracking
+        self.drop_policy = drop_policy
+        self.tmp_dir = tmp_dir or os.path.join(os.path.dirname(output) or ".", "tmp")
+        self.audio_rate = audio_rate
+        self.audio_channels = audio_channels
+        self.source = source
+        self.source_path = source_path
+        self.motion = motion
+        self.cursor_provider = cursor_provider
+        self.synthetic_audio = synthetic_audio
+        self.adaptive_quality = adaptive_quality
+        self.output_size = output_size
+        self.interpolation = interpolation
+        self.preview_every = preview_every
+        self.preview_size = preview_size
+        self.metrics_path = metrics_path
+        self.metrics_port = metrics_port
+        self.metrics_interval = metrics_interval
+        self.profile = profile
+        self.replay_seconds = replay_seconds
+        self.replay_max_mb = replay_max_mb
+        self.monitors = [dict(monitor) for monitor in monitors] if monitors and len(monitors) > 1 else None
+        self.level_meter_rate = level_meter_rate
+        if self.monitors:
+            self.region = union_region(self.monitors)
+
+    @property
+    def capture_size(self):
+        return self.region['width'], self.region['height']
+
+    @property
+    def size(self):
+        return fit_size(self.capture_size, self.output_size)
+
+
+class Recorder:
+    """Motor de grabación sin interfaz: captura, mezcla de audio y codificación.
+
+    Uso: ``start()``, ``stop()`` y, si ``needs_processing``, ``process()`` para
+    unir el vídeo y el audio temporales cuando no se pudo codificar con ffmpeg.
+    Los temporales van a una carpeta propia de la grabación bajo
+    ``tmp_dir/jobs``; ``finalize_job()`` la describe para procesarla en segundo
+    plano con ``recorder.jobs.JobQueue``. ``record(duration)`` hace todo el
+    ciclo de una vez.
+    """
+
+    def __init__(self, config, logger=None):
+        self.config = config
+        self.log = logger or logging.getLogger("recorder").info
+        self.pipeline = None
+        self.backend = None
+        self.preset = config.preset
+        self.controller = None
+        self.mixer = None
+        self.muxer = None
+        self.composer = None
+        self.preview = PreviewTap(config.preview_every, config.preview_size) if config.preview_every else None
+        self.audio_writer = None
+        self.metrics = MetricsRegistry() if config.metrics_path or config.metrics_port else None
+        self.exporters = []
+        self.profiler = None
+        self.replay = None
+        if config.replay_seconds:
+            self.replay = ReplayBuffer(config.replay_seconds, config.replay_max_mb * 1024 * 1024)
+        self.work_dir = None
+        self.screen_name = None
+        self.audio_name = None
+        self.start_time = None
+        self.stop_time = None
+
+    @property
+    def recording(self):
+        return self.start_time is not None and self.stop_time is None
+
+    @property
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        end = self.stop_time if self.stop_time is not None else time.time()
+        return end - self.start_time
+
+    @property
+    def needs_processing(self):
+        return self.stop_time is not None and self.muxer is None
+
+    @property
+    def failed(self):
+        return self.pipeline.failed
+
+    @property
+    def meters(self):
+        return self.mixer.meters if self.mixer else {}
+
+    def _audio_sources(self):
+        config = self.config
+        sources = []
+        if config.mic:
+            sources.append(SoundDeviceSource(config.mic_device, name="microphone", gain=config.mic_gain))
+        if config.system_audio:
+            system_source = create_system_source(gain=config.system_gain)
+            if system_source:
+                sources.append(system_source)
+            else:
+                self.log("No loopback device found, system audio will not be recorded.")
+        if config.synthetic_audio:
+            sources.append(BufferSource.tone(440, config.audio_rate, channels=config.audio_channels,
+                                             level=0.2, name="synthetic"))
+        return sources
+
+    def _choose_encoder(self):
+        config = self.config
+        if self.replay is not None:
+            # El anillo guarda MPEG-TS, que admite H.264 y HEVC
+            backend = get_backend(config.encoder if config.encoder in ("x264", "x265") else "x264")
+            if backend.name != config.encoder:
+                self.log(f"Instant replay needs H.264 or HEVC, using {backend.label}.")
+            return backend, config.preset
+        if config.encoder == "auto":
+            backend, preset, _ = select_encoder(config.size, config.fps, crf=config.crf,
+                                                cache_path=os.path.join(config.tmp_dir, "encoder_probe.json"),
+                                                logger=self.log)
+            self.log(f"Encoder selected: {backend.label}, preset {preset}")
+            return backend, preset
+        backend = get_backend(config.encoder)
+        if backend.streaming and not backend.supports(config.output):
+            self.log(f"{backend.label} cannot be stored in {os.path.splitext(config.output)[1]}, using H.264.")
+            backend = get_backend("x264")
+        return backend, config.preset
+
+    def _create_muxer(self, audio):
+        config = self.config
+        backend, preset = self._choose_encoder()
+        self.backend = backend
+        self.preset = preset
+        if not backend.streaming:
+            return None
+        encoding = backend.options(preset, config.crf)
+        if self.replay is not None:
+            # Un keyframe por segundo: el anillo se recorta y se vuelca con esa granularidad
+            muxer = FFmpegMuxer("pipe:1", config.fps, config.size, audio=audio, pix_fmt='bgra',
+                                output_args=["-g", str(max(int(config.fps), 1)), "-f", "mpegts"],
+                                stdout_sink=self.replay.feed, **encoding)
+            if muxer.ffmpeg is None:
+                raise RuntimeError("Instant replay needs ffmpeg")
+            return muxer
+        if config.segment_seconds or config.segment_bytes:
+            # Ficheros rotados cada N segundos o N bytes, con lista para unirlos
+            muxer = SegmentedMuxer(config.output, config.fps, config.size, audio=audio, pix_fmt='bgra',
+                                   segment_seconds=config.segment_seconds, segment_bytes=config.segment_bytes,
+                                   logger=self.log, **encoding)
+            if muxer.ffmpeg is None:
+                self.log("ffmpeg not found, segmented recording is not available.")
+                return None
+            return muxer
+        # ffmpeg acepta BGRA, así que se evita la conversión de color en Python
+        muxer = FFmpegMuxer(config.output, config.fps, config.size, audio=audio, pix_fmt='bgra', **encoding)
+        if muxer.ffmpeg is None:
+            self.log("ffmpeg not found, falling back to post-processing.")
+            self.backend = get_backend("opencv")
+            return None
+        return muxer
+
+    def _create_source(self, cursor_provider):
+        config = self.config
+        cursor_sample = cursor_provider.sample if cursor_provider else None
+        if config.monitors:
+            return MultiMonitorSource(config.source, config.monitors, config.region,
+                                      cursor_sample=cursor_sample, motion=config.motion)
+        return create_source(config.source, config.region, cursor_sample=cursor_sample,
+                             path=config.source_path, motion=config.motion)
+
+    def prepare(self):
+        # Todo lo que tarda (ffmpeg, dispositivos de audio) antes de fijar el instante de inicio
+        config = self.config
+        for folder in (os.path.dirname(config.output), config.tmp_dir):
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+
+        # Audio: micrófono y audio del sistema mezclados a una frecuencia común
+        rate = config.audio_rate
+        channels = config.audio_channels
+        audio_sources = self._audio_sources()
+        audio = (rate, channels) if audio_sources else None
+
+        # Vídeo: captura, composición y codificación en etapas separadas
+        cursor = None
+        cursor_provider = None
+        if config.cursor_style:
+            cursor_provider = create_cursor_provider(config.cursor_provider, config.region)
+            cursor = CursorCompositor(config.cursor_style, cursor_provider)
+
+        self.muxer = self._create_muxer(audio)
+        if not self.muxer:
+            # Una carpeta por grabación: la finalización de la anterior puede seguir en curso
+            self.work_dir = FinalizeJob.new_directory(os.path.join(config.tmp_dir, "jobs"))
+            self.screen_name = os.path.join(self.work_dir, "screen.avi")
+        encoder = self.muxer or self.backend.create(self.screen_name, config.fps, config.size)
+        pix_fmt = self.muxer.pix_fmt if self.muxer else 'bgr24'
+        width, height = config.size
+        capture_width, capture_height = config.capture_size
+        scaler = None
+        if config.size != config.capture_size:
+            scaler = FrameScaler(config.capture_size, config.size, config.interpolation)
+            self.log(f"Scaling {capture_width}x{capture_height} to {width}x{height} ({config.interpolation})")
+        if config.damage_tracking:
+            self.composer = DamageTrackingComposer((capture_height, capture_width, 4), cursor,
+                                                   pix_fmt=pix_fmt, scaler=scaler)
+        else:
+            self.composer = FrameComposer(cursor, pix_fmt=pix_fmt, scaler=scaler)
+
+        self.pipeline = CapturePipeline(
+            self._create_source(cursor_provider),
+            self.composer,
+            encoder,
+            config.fps,
+            (capture_height, capture_width, 4),
+            (height, width, self.composer.channels),
+            policy=config.drop_policy,
+            logger=self.log,
+        )
+        self.pipeline.preview = self.preview
+
+        # Sin ffmpeg el audio se vuelca a disco según llega, en lugar de acumularse en memoria
+        sink = None
+        if audio and self.muxer:
+            sink = self.muxer.write_audio
+        elif audio:
+            self.audio_name = os.path.join(self.work_dir, "audio.wav")
+            self.audio_writer = WavWriter(self.audio_name, rate, channels)
+            self.audio_writer.open()
+            sink = self.audio_writer.write
+        if audio_sources:
+            self.mixer = AudioMixer(audio_sources, sink, rate=rate, channels=channels,
+                                    meter_rate=config.level_meter_rate)
+
+    def start(self, start_time=None):
+        # ``start_time`` permite arrancar varias grabaciones sobre el mismo reloj de frames
+        if self.pipeline is None:
+            self.prepare()
+        config = self.config
+        self._start_telemetry()
+
+        # Audio y vídeo comparten el mismo origen de tiempos del reloj maestro
+        self.start_time = time.time()
+        master_start = self.pipeline.start(start_time)
+        if self.mixer:
+            self.mixer.start(master_start)
+        if config.adaptive_quality:
+            self._start_controller()
+
+    def _start_telemetry(self):
+        config = self.config
+        if config.profile:
+            self.profiler = RecordingProfiler(os.path.join(config.tmp_dir, "profile", time.strftime("%Y%m%d-%H%M%S")),
+                                              logger=self.log)
+            self.profiler.start()
+            self.pipeline.profiler = self.profiler
+        if self.metrics is None:
+            return
+        # Solo los histogramas cuestan algo en los bucles; contadores y gauges se leen al exportar
+        self.pipeline.instrument(self.metrics)
+        if self.mixer:
+            self.mixer.instrument(self.metrics)
+        if config.metrics_path:
+            self.exporters.append(JsonLinesExporter(self.metrics, config.metrics_path, config.metrics_interval))
+        if config.metrics_port:
+            self.exporters.append(MetricsServer(self.metrics, config.metrics_port))
+        for exporter in self.exporters:
+            try:
+                exporter.start()
+            except OSError as e:
+                self.log(f"Metrics export unavailable: {e}")
+                continue
+            if isinstance(exporter, MetricsServer):
+                self.log(f"Metrics at http://{exporter.host}:{exporter.port}/metrics")
+
+    def _stop_telemetry(self):
+        for exporter in self.exporters:
+            exporter.stop()
+        self.exporters = []
+        if self.config.metrics_path and self.metrics is not None:
+            self.log(f"Metrics saved to: {self.config.metrics_path}")
+        if self.profiler:
+            self.profiler.stop()
+
+    def _start_controller(self):
+        # Preset y escala solo pueden cambiar reiniciando ffmpeg, es decir, abriendo un segmento nuevo
+        restartable = isinstance(self.muxer, SegmentedMuxer)
+        if not restartable:
+            self.log("Adaptive quality: preset and scale changes need segmented recording, "
+                     "only the frame rate will adapt.")
+        ladder = build_ladder(self.preset, self.config.fps, restartable)
+        self.controller = AdaptiveQualityController(self.pipeline, ladder,
+                                                    apply_level(self.pipeline, ladder[0], self.muxer),
+                                                    logger=self.log)
+        self.controller.start()
+
+    def stop(self):
+        self.stop_time = time.time()
+        if self.controller:
+            self.controller.stop()
+            self.log(f"Quality changes: {len(self.controller.transitions)}, "
+                     f"final level {self.controller.level}/{len(self.controller.ladder) - 1}")
+        # El audio deja de capturarse en el mismo instante que el vídeo, aunque el
+        # codificador tarde en vaciar sus colas, y se completa hasta donde acaba el vídeo
+        self.pipeline.request_stop()
+        if self.mixer:
+            self.mixer.stop()
+        self.pipeline.stop()
+        # El final del audio se mezcla con el codificador aún abierto; al cerrarlo se perdería
+        if self.mixer:
+            self.mixer.flush(self.pipeline.end_time)
+            self.log(f"Audio mixer stats: {self.mixer.stats()}")
+        if self.muxer:
+            self.muxer.end_audio()
+        self.pipeline.close()
+        self._stop_telemetry()
+        self.log(f"Pipeline stats: {self.pipeline.summary()}")
+        self.log(f"Sync report: {sync_report(self.pipeline.timing(), self.mixer)}")
+        if isinstance(self.composer, DamageTrackingComposer):
+            damage = self.composer.stats()
+            self.log(f"Unchanged frames: {damage['unchanged_frames']}, "
+                     f"mean dirty tiles: {damage['mean_dirty_fraction']:.1%}")
+        if isinstance(self.pipeline.grabber, MultiMonitorSource):
+            elapsed = self.pipeline.stop_time - self.pipeline.start_time
+            self.log(f"Monitor stats: {self.pipeline.grabber.monitor_report(elapsed)}")
+
+        if self.muxer:
+            # El fichero final ya está escrito, no hay nada que procesar
+            if self.pipeline.failed:
+                self.log(f"Recording to {self.config.output} failed, see log for details.")
+            elif self.replay is not None:
+                self.log(f"Instant replay stopped: {self.replay.stats()}")
+            elif isinstance(self.muxer, SegmentedMuxer):
+                self.log(f"Recording saved as {len(self.muxer.segments)} segments, "
+                         f"list: {self.muxer.concat_list_path}")
+            else:
+                self.log(f"Recording saved to: {self.config.output}")
+
+        # Cerrar el WAV: la cabecera queda con los tamaños definitivos
+        if self.audio_writer:
+            self.audio_writer.close()
+
+    def replay_path(self):
+        base, ext = os.path.splitext(self.config.output)
+        return f"{base}_replay_{time.strftime('%Y%m%d-%H%M%S')}{ext}"
+
+    def save_replay(self, path=None):
+        # Vuelca el anillo sin parar la grabación; solo se copian los bytes ya codificados
+        path = path or self.replay_path()
+        started = time.perf_counter()
+        seconds = self.replay.duration()
+        size = self.replay.save(path, self.muxer.ffmpeg)
+        if not size:
+            self.log("Instant replay is empty, nothing saved.")
+            return None
+        self.log(f"Replay saved to: {path} ({seconds:.1f} s, {size / 1e6:.1f} MB, "
+                 f"{(time.perf_counter() - started) * 1000:.0f} ms)")
+        return path
+
+    def finalize_job(self):
+        # Trabajo de unión de vídeo y audio para ejecutarlo fuera del hilo de grabación
+        return FinalizeJob(self.work_dir, self.config.output, self.screen_name, self.audio_name,
+                           preset=self.config.preset, crf=self.config.crf)
+
+    def process(self):
+        # Une el vídeo y el audio temporales en el fichero final (solo sin ffmpeg directo)
+        finalize(self.finalize_job())
+        self.log(f"Recording saved to: {self.config.output}")
+
+        # Eliminar archivos temporales
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def record(self, duration):
+        self.start()
+        try:
+            while self.elapsed < duration:
+                time.sleep(min(0.25, max(duration - self.elapsed, 0.0)))
+        finally:
+            self.stop()
+        if self.needs_processing:
+            self.process()
+
+
+class MultiMonitorRecorder:
+    """Un ``Recorder`` por monitor con el mismo reloj de frames y una sola pista de audio.
+
+    Todas las grabaciones se preparan primero (ffmpeg, audio, composición) y
+    después arrancan con el mismo instante de inicio, de modo que el frame N de
+    cada fichero corresponde al mismo plazo del planificador; paran también en el
+    mismo instante. Solo el primer monitor graba el audio.
+    """
+
+    def __init__(self, configs, logger=None):
+        self.recorders = [Recorder(config, logger=logger) for config in configs]
+        self.log = self.recorders[0].log
+
+    @classmethod
+    def for_monitors(cls, config, monitors, logger=None):
+        # Una copia de la configuración por monitor, con su región y su fichero (salida_1.mp4, salida_2.mp4...)
+        configs = []
+        for index, (bbox, output) in enumerate(zip(monitors, monitor_outputs(config.output, len(monitors)))):
+            monitor_config = copy.copy(config)
+            monitor_config.output = output
+            monitor_config.region = dict(bbox)
+            monitor_config.monitors = None
+            # La repetición instantánea guarda un único flujo
+            monitor_config.replay_seconds = 0
+            if index:
+                # Una sola pista de audio y un solo endpoint de métricas: los del primer monitor
+                monitor_config.mic = monitor_config.system_audio = monitor_config.synthetic_audio = False
+                monitor_config.metrics_port = 0
+                monitor_config.profile = False
+                if config.metrics_path:
+                    monitor_config.metrics_path = monitor_outputs(config.metrics_path, len(monitors))[index]
+            configs.append(monitor_config)
+        return cls(configs, logger)
+
+    @property
+    def preview(self):
+        return self.recorders[0].preview
+
+    @property
+    def replay(self):
+        return None
+
+    @property
+    def meters(self):
+        return self.recorders[0].meters
+
+    @property
+    def recording(self):
+        return self.recorders[0].recording
+
+    @property
+    def elapsed(self):
+        return self.recorders[0].elapsed
+
+    @property
+    def failed(self):
+        return any(recorder.pipeline.failed for recorder in self.recorders)
+
+    @property
+    def needs_processing(self):
+        return any(recorder.needs_processing for recorder in self.recorders)
+
+    def start(self):
+        for recorder in self.recorders:
+            recorder.prepare()
+        start_time = self.recorders[0].pipeline.scheduler.clock()
+        for recorder in self.recorders:
+            recorder.start(start_time)
+
+    def stop(self):
+        # Mismo instante de parada para todos antes de esperar a que cada uno vacíe sus colas
+        stop_time = self.recorders[0].pipeline.scheduler.clock()
+        for recorder in self.recorders:
+            recorder.pipeline.request_stop(stop_time)
+        for recorder in self.recorders:
+            recorder.stop()
+        names = [os.path.basename(recorder.config.output) for recorder in self.recorders]
+        self.log(f"Monitor lockstep: {lockstep_report([recorder.pipeline for recorder in self.recorders], names)}")
+
+    def finalize_jobs(self):
+        return [recorder.finalize_job() for recorder in self.recorders if recorder.needs_processing]
+
+    def process(self):
+        for recorder in self.recorders:
+            if recorder.needs_processing:
+                recorder.process()
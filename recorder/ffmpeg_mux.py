@@ -0,0 +1,204 @@
+import os
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+from collections import deque
+
+# Contenedor de salida -> argumentos extra para ffmpeg
+CONTAINER_ARGS = {
+    ".mp4": ["-f", "mp4"],
+    ".mov": ["-f", "mov"],
+    ".avi": ["-f", "avi"],
+    ".mkv": ["-f", "matroska"],
+    ".webm": ["-f", "webm"],
+    ".ts": ["-f", "mpegts"],
+}
+
+# VP9 no tiene presets: la velocidad se controla con -cpu-used (más alto = más rápido)
+VP9_CPU_USED = {
+    "ultrafast": 8, "superfast": 8, "veryfast": 7, "faster": 6, "fast": 5,
+    "medium": 4, "slow": 3, "slower": 2, "veryslow": 1,
+}
+
+
+def video_codec_args(codec, preset, crf):
+    # Argumentos de salida de vídeo para cada códec soportado
+    if codec == "libvpx-vp9":
+        return ["-c:v", codec, "-deadline", "realtime", "-cpu-used", str(VP9_CPU_USED.get(preset, 6)),
+                "-row-mt", "1", "-crf", str(crf), "-b:v", "0", "-pix_fmt", "yuv420p"]
+    if codec == "ffv1":
+        # Sin pérdidas y sin pasar a YUV: se conservan los colores exactos de la pantalla
+        return ["-c:v", codec, "-level", "3", "-slices", "16", "-g", "1", "-pix_fmt", "bgr0"]
+    if codec == "rawvideo":
+        return ["-c:v", codec]
+    return ["-c:v", codec, "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p"]
+
+
+def find_ffmpeg():
+    # Preferir el ffmpeg.exe que se distribuye con la aplicación
+    candidates = []
+    if getattr(sys, 'frozen', False):
+        candidates.append(os.path.join(getattr(sys, '_MEIPASS', os.path.dirname(sys.executable)), "ffmpeg.exe"))
+    candidates.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ffmpeg.exe"))
+    for candidate in candidates:
+        if sys.platform == 'win32' and os.path.isfile(candidate):
+            return candidate
+    return shutil.which("ffmpeg")
+
+
+class FFmpegMuxer:
+    """Codifica y multiplexa vídeo y audio en un único proceso ffmpeg mientras se graba.
+
+    Los frames crudos llegan por stdin y el PCM por un socket TCP local al que
+    ffmpeg se conecta como cliente, así no hace falta ningún fichero intermedio.
+    Con ``stdout_sink`` la salida (``output='pipe:1'``) se entrega por trozos a
+    esa función en lugar de escribirse a disco.
+    """
+
+    def __init__(self, output, fps, size, audio=None, pix_fmt='bgr24', codec='libx264',
+                 preset='veryfast', crf=23, audio_codec='aac', audio_bitrate='160k', ffmpeg=None,
+                 output_args=None, scale=1.0, stdout_sink=None):
+        self.output = output
+        self.fps = fps
+        self.size = size
+        self.audio = audio  # (rate, channels) de PCM s16le, o None
+        self.pix_fmt = pix_fmt
+        self.codec = codec
+        self.preset = preset
+        self.crf = crf
+        self.audio_codec = audio_codec
+        self.audio_bitrate = audio_bitrate
+        self.ffmpeg = ffmpeg or find_ffmpeg()
+        self.output_args = output_args or []
+        self.scale = scale  # < 1 reduce la resolución codificada dentro de ffmpeg
+        self.stdout_sink = stdout_sink
+        self.proc = None
+        self.frames_written = 0
+        self.audio_bytes_written = 0
+        self.stderr_tail = deque(maxlen=50)
+        self._listener = None
+        self._audio_conn = None
+        self._audio_queue = None
+        self._audio_ended = False
+        self._threads = []
+
+    def command(self, audio_port=None):
+        width, height = self.size
+        cmd = [
+            self.ffmpeg, "-hide_banner", "-nostats", "-loglevel", "error", "-y",
+            # Las entradas crudas ya vienen descritas; sin sondeo ffmpeg arranca al instante
+            "-thread_queue_size", "512", "-probesize", "32", "-analyzeduration", "0",
+            "-f", "rawvideo", "-pix_fmt", self.pix_fmt, "-video_size", f"{width}x{height}",
+            "-framerate", str(self.fps), "-i", "pipe:0",
+        ]
+        if audio_port is not None:
+            rate, channels = self.audio
+            cmd += [
+                "-thread_queue_size", "512", "-probesize", "32", "-analyzeduration", "0",
+                "-f", "s16le", "-ar", str(rate), "-ac", str(channels),
+                "-i", f"tcp://127.0.0.1:{audio_port}",
+            ]
+        cmd += ["-map", "0:v"]
+        if audio_port is not None:
+            cmd += ["-map", "1:a", "-c:a", self.audio_codec, "-b:a", self.audio_bitrate]
+        if self.scale != 1.0:
+            # Dimensiones pares, como exige yuv420p
+            cmd += ["-vf", f"scale=trunc(iw*{self.scale}/2)*2:trunc(ih*{self.scale}/2)*2:flags=area"]
+        cmd += video_codec_args(self.codec, self.preset, self.crf)
+        cmd += CONTAINER_ARGS.get(os.path.splitext(self.output)[1].lower(), [])
+        cmd += self.output_args
+        cmd.append(self.output)
+        return cmd
+
+    def open(self):
+        if self.ffmpeg is None:
+            raise RuntimeError("ffmpeg executable not found")
+        audio_port = None
+        if self.audio is not None:
+            self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._listener.bind(("127.0.0.1", 0))
+            self._listener.listen(1)
+            audio_port = self._listener.getsockname()[1]
+            self._audio_queue = queue.Queue()
+        self.proc = subprocess.Popen(
+            self.command(audio_port),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE if self.stdout_sink else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0),
+        )
+        self._start_thread(self._drain_stderr)
+        if self.stdout_sink:
+            self._start_thread(self._drain_stdout)
+        if self.audio is not None:
+            self._start_thread(self._send_audio)
+
+    def _start_thread(self, target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _drain_stderr(self):
+        for line in self.proc.stderr:
+            self.stderr_tail.append(line.decode(errors='replace').rstrip())
+
+    def _drain_stdout(self):
+        while True:
+            data = self.proc.stdout.read1(65536)
+            if not data:
+                break
+            self.stdout_sink(data)
+
+    def _send_audio(self):
+        # ffmpeg se conecta al abrir su segunda entrada; hasta entonces el audio se acumula en la cola
+        self._listener.settimeout(30)
+        try:
+            self._audio_conn, _ = self._listener.accept()
+        except OSError as e:
+            self.stderr_tail.append(f"Audio connection failed: {e}")
+            return
+        finally:
+            self._listener.close()
+        while True:
+            chunk = self._audio_queue.get()
+            if chunk is None:
+                break
+            try:
+                self._audio_conn.sendall(chunk)
+            except OSError as e:
+                self.stderr_tail.append(f"Audio pipe closed: {e}")
+                break
+            self.audio_bytes_written += len(chunk)
+        self._audio_conn.close()
+
+    def write(self, frame):
+        self.proc.stdin.write(memoryview(frame).cast('B'))
+        self.frames_written += 1
+
+    def write_audio(self, data):
+        # No bloquea al hilo que lee del micrófono
+        self._audio_queue.put(data)
+
+    def end_audio(self):
+        # Fin del audio: ffmpeg recibe EOF en esa entrada y puede seguir sólo con vídeo
+        if self._audio_queue is not None and not self._audio_ended:
+            self._audio_ended = True
+            self._audio_queue.put(None)
+
+    def close(self):
+        if self.proc is None:
+            return
+        self.end_audio()
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        for thread in self._threads:
+            thread.join(timeout=30)
+        returncode = self.proc.wait()
+        self.proc = None
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {returncode}: {' | '.join(self.stderr_tail)}")
@@ -0,0 +1,294 @@
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+
+# Estados de un trabajo de finalización
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+MANIFEST = "job.json"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class FinalizeJob:
+    """Unión de vídeo y audio temporales en el fichero final, en su propia carpeta.
+
+    Cada grabación que necesita post-proceso escribe ``screen.avi`` y
+    ``audio.wav`` en un directorio único, así que varios trabajos pueden
+    convivir. El estado se guarda en ``job.json`` dentro de ese directorio: un
+    trabajo cancelado o interrumpido (cierre de la aplicación) conserva sus
+    ficheros y puede reanudarse.
+    """
+
+    def __init__(self, directory, output, video, audio=None, preset="veryfast", crf=23,
+                 state=QUEUED, progress=0, error=None, job_id=None):
+        self.id = job_id or os.path.basename(directory)
+        self.directory = directory
+        self.output = output
+        self.video = video
+        self.audio = audio
+        self.preset = preset
+        self.crf = crf
+        self.state = state
+        self.progress = progress
+        self.error = error
+
+    @staticmethod
+    def new_directory(root):
+        directory = os.path.join(root, "job-" + time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6])
+        os.makedirs(directory)
+        return directory
+
+    def as_dict(self):
+        return {"id": self.id, "directory": self.directory, "output": self.output, "video": self.video,
+                "audio": self.audio, "preset": self.preset, "crf": self.crf, "state": self.state,
+                "progress": self.progress, "error": self.error}
+
+    def save(self):
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w", encoding="utf-8") as manifest:
+            json.dump(self.as_dict(), manifest, indent=2)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as manifest:
+            data = json.load(manifest)
+        data["job_id"] = data.pop("id")
+        data["directory"] = directory
+        return cls(**data)
+
+
+def finalize(job, progress=None, cancelled=None):
+    """Une vídeo y audio con moviepy; se ejecuta en un proceso del pool.
+
+    ``progress(percent)`` recibe el avance de la codificación y ``cancelled()``
+    se consulta en cada actualización para abortar.
+    """
+    from moviepy.editor import AudioFileClip, VideoFileClip
+    from proglog import ProgressBarLogger
+
+    class JobLogger(ProgressBarLogger):
+        def bars_callback(self, bar, attr, value, old_value=None):
+            if cancelled is not None and cancelled():
+                raise JobCancelled()
+            # 't' es la barra de frames de vídeo; la de audio ('chunk') es mucho más corta
+            if bar == "t" and attr == "index" and progress is not None:
+                total = self.bars[bar].get("total") or 0
+                if total:
+                    progress(int(value * 100 / total))
+
+    # Se escribe a un nombre temporal: un trabajo cancelado no deja un fichero final a medias
+    partial = job.output + ".partial" + os.path.splitext(job.output)[1]
+    video_clip = VideoFileClip(job.video)
+    try:
+        if job.audio:
+            video_clip = video_clip.set_audio(AudioFileClip(job.audio))
+        video_clip.write_videofile(partial, codec='libx264', audio_codec='aac', preset=job.preset,
+                                   ffmpeg_params=["-crf", str(job.crf)], logger=JobLogger())
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        video_clip.close()
+    os.replace(partial, job.output)
+
+
+def _run_job(target, job_data, attempt, events, cancel_flags):
+    # Punto de entrada en el proceso hijo: todo lo que cruza es picklable
+    data = dict(job_data)
+    data["job_id"] = data.pop("id")
+    job = FinalizeJob(**data)
+    last = [-1]
+
+    def progress(percent):
+        if percent != last[0]:
+            last[0] = percent
+            events.put((job.id, attempt, percent))
+
+    progress(0)
+    try:
+        target(job, progress, lambda: cancel_flags.get(job.id, False))
+    except JobCancelled:
+        return CANCELLED, None
+    except Exception as e:
+        return FAILED, str(e)
+    return DONE, None
+
+
+class JobQueue:
+    """Cola de trabajos de finalización sobre un pool de procesos.
+
+    La codificación no compite con el GIL del proceso de grabación, así que se
+    puede empezar otra grabación mientras termina la anterior. ``on_update(job)``
+    se llama desde un hilo de la cola en cada cambio de estado o de progreso
+    (en Qt, conectarlo a una señal). ``target`` permite sustituir la función
+    que hace el trabajo.
+    """
+
+    def __init__(self, root, workers=1, on_update=None, target=finalize, logger=None):
+        self.root = root
+        self.on_update = on_update
+        self.target = target
+        self.log = logger or logging.getLogger("recorder").info
+        self.jobs = {}
+        self.futures = {}
+        # Cada envío de un trabajo es un intento; los eventos de intentos anteriores se ignoran
+        self.attempts = {}
+        self._lock = threading.Lock()
+        self._workers = workers
+        self._manager = None
+        self._events = None
+        self._cancel_flags = None
+        self._pool = None
+        self._running = False
+        self._monitor = None
+
+    def _executor(self):
+        # El pool se crea con el primer trabajo: arrancar procesos cuesta y muchas sesiones no lo necesitan
+        if self._pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self._manager = multiprocessing.Manager()
+            self._events = self._manager.Queue()
+            self._cancel_flags = self._manager.dict()
+            self._pool = ProcessPoolExecutor(max_workers=self._workers)
+            self._running = True
+            self._monitor = threading.Thread(target=self._watch, name="job-events", daemon=True)
+            self._monitor.start()
+        return self._pool
+
+    def pending(self):
+        # Trabajos que quedaron a medias en sesiones anteriores (cancelados, fallidos o interrumpidos)
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for name in sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, name)
+            if not os.path.isfile(os.path.join(directory, MANIFEST)):
+                continue
+            job = FinalizeJob.load(directory)
+            if job.id in self.jobs or job.state == DONE:
+                continue
+            if job.state in (QUEUED, RUNNING):
+                job.state = CANCELLED
+                job.error = "interrupted"
+            self.jobs[job.id] = job
+            found.append(job)
+        return found
+
+    def submit(self, job):
+        with self._lock:
+            job.state = QUEUED
+            job.progress = 0
+            job.error = None
+            job.save()
+            self.jobs[job.id] = job
+            attempt = self.attempts[job.id] = self.attempts.get(job.id, 0) + 1
+        executor = self._executor()
+        self._cancel_flags[job.id] = False
+        future = executor.submit(_run_job, self.target, job.as_dict(), attempt, self._events,
+                                         self._cancel_flags)
+        self.futures[job.id] = future
+        future.add_done_callback(lambda f, job_id=job.id: self._finished(job_id, f))
+        self._update(job)
+        return job
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.state not in (QUEUED, RUNNING):
+            return False
+        future = self.futures.get(job_id)
+        if future is not None and future.cancel():
+            # Aún no había empezado: no hay proceso que avisar
+            with self._lock:
+                self._set_state(job, CANCELLED)
+            return True
+        self._cancel_flags[job_id] = True
+        return True
+
+    def resume(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.state not in (CANCELLED, FAILED):
+            return False
+        self.submit(job)
+        return True
+
+    def _finished(self, job_id, future):
+        job = self.jobs[job_id]
+        self.futures.pop(job_id, None)
+        if future.cancelled():
+            return
+        try:
+            state, error = future.result()
+        except Exception as e:
+            state, error = FAILED, str(e)
+        with self._lock:
+            job.error = error
+            if state == DONE:
+                job.progress = 100
+                # Los temporales ya no hacen falta; el manifiesto se va con ellos
+                shutil.rmtree(job.directory, ignore_errors=True)
+            self._set_state(job, state)
+        if state == DONE:
+            self.log(f"Recording saved to: {job.output}")
+        elif state == FAILED:
+            self.log(f"Finalizing {job.output} failed: {error}")
+
+    def _set_state(self, job, state):
+        # Con self._lock tomado: el hilo de eventos y el de resultados escriben el mismo manifiesto
+        job.state = state
+        if state != DONE:
+            job.save()
+        self._update(job)
+
+    def _update(self, job):
+        if self.on_update is not None:
+            self.on_update(job)
+
+    def _watch(self):
+        while self._running:
+            try:
+                job_id, attempt, progress = self._events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                job = self.jobs.get(job_id)
+                if job is None or attempt != self.attempts.get(job_id) or job.state not in (QUEUED, RUNNING):
+                    continue
+                job.progress = progress
+                if job.state != RUNNING:
+                    job.state = RUNNING
+                    job.save()
+                self._update(job)
+
+    def busy(self):
+        return any(job.state in (QUEUED, RUNNING) for job in self.jobs.values())
+
+    def shutdown(self, wait=False):
+        # Sin esperar, los trabajos en curso se cancelan y quedan para reanudarse en la próxima sesión
+        if not wait:
+            for job_id in list(self.futures):
+                self.cancel(job_id)
+        if self._pool is None:
+            return
+        self._pool.shutdown(wait=True)
+        self._pool = None
+        self._running = False
+        self._monitor.join(timeout=1.0)
+        self._manager.shutdown()
+        self._manager = None
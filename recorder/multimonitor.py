@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from recorder.capture import ScreenGrabber
+from recorder.pipeline import StageStats, percentile_ms
+from recorder.sources import SyntheticSource
+
+
+def union_region(bboxes):
+    # Rectángulo mínimo que contiene todos los monitores: el lienzo del vídeo unido
+    left = min(bbox['left'] for bbox in bboxes)
+    top = min(bbox['top'] for bbox in bboxes)
+    right = max(bbox['left'] + bbox['width'] for bbox in bboxes)
+    bottom = max(bbox['top'] + bbox['height'] for bbox in bboxes)
+    return {'left': left, 'top': top, 'width': right - left, 'height': bottom - top}
+
+
+def monitor_outputs(output, count):
+    base, ext = os.path.splitext(output)
+    return [f"{base}_{index + 1}{ext}" for index in range(count)]
+
+
+class MultiMonitorSource:
+    """Captura varios monitores a la vez sobre un mismo lienzo.
+
+    Cada monitor tiene su propio hilo y su propia fuente, que escribe
+    directamente en su rectángulo del buffer del anillo. En cada tick del
+    planificador todos los hilos capturan en paralelo y ``grab`` vuelve cuando
+    han terminado todos, así que los monitores avanzan siempre juntos; el
+    desfase entre el primero y el último en terminar se guarda como ``skew``.
+    """
+
+    def __init__(self, kind, bboxes, canvas, cursor_sample=None, motion=0.1, fps=None):
+        if kind not in ("screen", "synthetic"):
+            raise ValueError(f"{kind} source cannot be split across monitors")
+        self.bbox = canvas
+        self.cursor_sample = cursor_sample
+        self.monitors = [dict(bbox) for bbox in bboxes]
+        if kind == "screen":
+            # Con varios monitores se escribe en vistas del lienzo: sin secciones DIB propias
+            self.sources = [ScreenGrabber(bbox) for bbox in self.monitors]
+        else:
+            self.sources = [SyntheticSource(bbox, motion=motion, fps=fps, seed=index)
+                            for index, bbox in enumerate(self.monitors)]
+        self.stats_by_monitor = [StageStats() for _ in self.monitors]
+        self.skews = StageStats()
+        self._buffer = None
+        self._finished = [0.0] * len(self.monitors)
+        self._errors = [None] * len(self.monitors)
+        self._barrier = None
+        self._threads = []
+
+    def allocate(self, shape, dtype):
+        # Lo que no cubre ningún monitor queda en negro; los monitores nunca escriben ahí
+        return np.zeros(shape, dtype)
+
+    def _view(self, buffer, bbox):
+        top = bbox['top'] - self.bbox['top']
+        left = bbox['left'] - self.bbox['left']
+        return buffer[top:top + bbox['height'], left:left + bbox['width']]
+
+    def open(self):
+        # Se abre en el hilo de captura del pipeline; cada monitor abre su fuente en su propio hilo
+        self._barrier = threading.Barrier(len(self.sources) + 1)
+        self._threads = [threading.Thread(target=self._worker, args=(index,), name=f"capture-monitor-{index + 1}",
+                                          daemon=True)
+                         for index in range(len(self.sources))]
+        for thread in self._threads:
+            thread.start()
+
+    def _worker(self, index):
+        source = self.sources[index]
+        stats = self.stats_by_monitor[index]
+        try:
+            source.open()
+        except Exception as e:
+            # Se sigue acudiendo a la barrera para que ``grab`` no se quede esperando y falle con el error
+            self._errors[index] = e
+        try:
+            while True:
+                try:
+                    self._barrier.wait()
+                except threading.BrokenBarrierError:
+                    break
+                started = time.perf_counter()
+                try:
+                    if self._errors[index] is None:
+                        source.grab(self._view(self._buffer, self.monitors[index]))
+                except Exception as e:
+                    self._errors[index] = e
+                self._finished[index] = time.perf_counter()
+                stats.record(self._finished[index] - started)
+                try:
+                    self._barrier.wait()
+                except threading.BrokenBarrierError:
+                    break
+        finally:
+            source.close()
+
+    def grab(self, buffer):
+        self._buffer = buffer
+        self._barrier.wait()
+        self._barrier.wait()
+        for index, error in enumerate(self._errors):
+            if error is not None:
+                raise RuntimeError(f"Monitor {index + 1} capture failed: {error}")
+        self.skews.record(max(self._finished) - min(self._finished))
+        return self.sample_cursor()
+
+    def sample_cursor(self):
+        if self.cursor_sample is None:
+            return None
+        cursor = self.cursor_sample()
+        if cursor is None:
+            return None
+        x, y, handle = cursor
+        return (x - self.bbox['left'], y - self.bbox['top'], handle)
+
+    def close(self):
+        if self._barrier is not None:
+            self._barrier.abort()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._threads = []
+
+    def stats(self):
+        return {"monitors": len(self.monitors), "monitor_skew_p99_ms": percentile_ms(self.skews.latencies, 99)}
+
+    def monitor_report(self, elapsed):
+        # Rendimiento de cada monitor; en el lienzo unido van siempre al paso del más lento
+        elapsed = max(elapsed, 1e-9)
+        report = {}
+        for bbox, stats in zip(self.monitors, self.stats_by_monitor):
+            key = f"{bbox['width']}x{bbox['height']}+{bbox['left']}+{bbox['top']}"
+            report[key] = {"frames": stats.frames, "fps": round(stats.frames / elapsed, 2),
+                           "grab_p50_ms": percentile_ms(stats.latencies, 50),
+                           "grab_p99_ms": percentile_ms(stats.latencies, 99)}
+        return {"monitors": report, "skew_p50_ms": percentile_ms(self.skews.latencies, 50),
+                "skew_p99_ms": percentile_ms(self.skews.latencies, 99)}
+
+
+def lockstep_report(pipelines, names):
+    """Compara los flujos de una grabación con un fichero por monitor.
+
+    Todos comparten origen de tiempos e instante de parada, así que un flujo va
+    al paso si no ha perdido ticks ni frames y ha escrito los mismos frames que
+    los demás; ``max_jitter_ms`` acota el desfase de captura frente al plazo común.
+    """
+    streams = {}
+    written = [pipeline.writer.written for pipeline in pipelines]
+    for name, pipeline in zip(names, pipelines):
+        timing = pipeline.timing()
+        dropped = timing["dropped"] + sum(stage.get("dropped", 0) for stage in pipeline.stats().values())
+        streams[name] = {
+            "achieved_fps": timing["achieved_fps"],
+            "capture_fps": timing["capture_fps"],
+            "missed_ticks": timing["missed_ticks"],
+            "dropped": dropped,
+            "written": timing["written"],
+            "max_jitter_ms": timing["max_jitter_ms"],
+            "lockstep": timing["missed_ticks"] == 0 and dropped == 0 and timing["written"] == max(written),
+        }
+    return {"streams": streams, "lockstep": all(stream["lockstep"] for stream in streams.values()),
+            "frame_spread": max(written) - min(written) if written else 0}
+
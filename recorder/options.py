@@ -0,0 +1,22 @@
+# Opciones que ofrecen la interfaz y la línea de comandos; sin NumPy ni OpenCV para que la ventana abra al instante
+
+# Políticas de contrapresión cuando el consumidor no da abasto
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+# Varios monitores en un único vídeo, o un fichero sincronizado por monitor
+STITCH = "stitch"
+SEPARATE = "separate"
+LAYOUTS = (STITCH, SEPARATE)
+
+INTERPOLATIONS = ("area", "linear", "box")
+
+CURSOR_COLORS = {
+    "White Circle": (255, 255, 255),
+    "Red Circle": (0, 0, 255),
+    "Green Circle": (0, 255, 0),
+    "Blue Circle": (255, 0, 0),
+}
+CURSOR_STYLES = ["Default"] + list(CURSOR_COLORS) + ["Cross"]
@@ -0,0 +1,394 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from recorder.options import BLOCK, DROP_NEWEST, DROP_OLDEST, POLICIES
+from recorder.scheduler import ConstantRateWriter, FrameScheduler, timing_report
+
+
+class FrameSlot:
+    __slots__ = ("buffer", "timestamp", "sequence", "info")
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.timestamp = 0.0
+        self.sequence = 0
+        self.info = None
+
+
+class FrameRing:
+    """Anillo acotado de buffers preasignados entre dos etapas."""
+
+    def __init__(self, name, capacity, shape, dtype=np.uint8, policy=DROP_OLDEST, allocate=np.empty):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown back-pressure policy: {policy}")
+        if capacity < 2:
+            raise ValueError("A frame ring needs at least two slots")
+        self.name = name
+        self.policy = policy
+        self.capacity = capacity
+        self.slots = [FrameSlot(allocate(shape, dtype)) for _ in range(capacity)]
+        self._free = deque(self.slots)
+        self._ready = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.published = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self):
+        return len(self._ready)
+
+    def acquire(self, timeout=None):
+        # Devuelve un slot libre para el productor, o None si hay que descartar el frame
+        with self._cond:
+            while not self._free:
+                if self._closed:
+                    return None
+                if self.policy == DROP_OLDEST and self._ready:
+                    self.dropped += 1
+                    return self._ready.popleft()
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return None
+                if not self._cond.wait(timeout):
+                    return None
+            return self._free.popleft()
+
+    def publish(self, slot):
+        with self._cond:
+            self._ready.append(slot)
+            self.published += 1
+            if len(self._ready) > self.max_depth:
+                self.max_depth = len(self._ready)
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        # Devuelve el siguiente slot listo; None cuando el anillo está cerrado y vacío
+        with self._cond:
+            while not self._ready:
+                if self._closed:
+                    return None
+                if not self._cond.wait(timeout):
+                    return None
+            return self._ready.popleft()
+
+    def release(self, slot):
+        with self._cond:
+            self._free.append(slot)
+            self._cond.notify_all()
+
+    def discard(self, slot):
+        # El productor obtuvo un slot pero no llegó a publicarlo
+        self.release(slot)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "policy": self.policy,
+                "queue_depth": len(self._ready),
+                "max_depth": self.max_depth,
+                "published": self.published,
+                "dropped": self.dropped,
+            }
+
+
+# Nombre de la métrica de tiempo de cada etapa en ``recorder.telemetry``
+STAGE_METRICS = {"capture": "grab_seconds", "compose": "compose_seconds", "encode": "encode_seconds"}
+
+# Muestras de latencia guardadas por etapa para calcular percentiles
+LATENCY_SAMPLES = 8192
+
+
+def percentile_ms(samples, q):
+    if not samples:
+        return 0.0
+    return round(float(np.percentile(np.fromiter(samples, dtype=np.float64), q)) * 1000.0, 3)
+
+
+class StageStats:
+    __slots__ = ("frames", "busy", "errors", "cpu", "latencies", "histogram")
+
+    def __init__(self):
+        self.frames = 0
+        self.busy = 0.0
+        self.errors = 0
+        self.cpu = 0.0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.histogram = None
+
+    def record(self, elapsed):
+        self.busy += elapsed
+        self.frames += 1
+        self.latencies.append(elapsed)
+        if self.histogram is not None:
+            self.histogram.observe(elapsed)
+
+    def as_dict(self):
+        return {"frames": self.frames, "busy_seconds": round(self.busy, 4), "errors": self.errors,
+                "cpu_seconds": round(self.cpu, 4), "p50_ms": percentile_ms(self.latencies, 50),
+                "p99_ms": percentile_ms(self.latencies, 99)}
+
+
+def _call(obj, name):
+    method = getattr(obj, name, None)
+    if method is not None:
+        method()
+
+
+class CapturePipeline:
+    """Captura, composición y codificación en hilos separados.
+
+    ``grabber`` debe implementar ``grab(buffer)`` y devolver la información
+    asociada al frame (p. ej. la posición del cursor); ``composer`` implementa
+    ``compose(src, dst, info)`` y ``encoder`` implementa ``write(frame)``.
+    Los tres pueden ofrecer ``open()``/``close()``, que se llaman dentro del
+    hilo de su etapa, salvo el ``close()`` del codificador: ``stop()`` vacía
+    las etapas pero lo deja abierto para que el audio que falta hasta
+    ``end_time`` llegue antes de cerrarlo con ``close()``.
+    """
+
+    def __init__(self, grabber, composer, encoder, fps, capture_shape, output_shape,
+                 capacity=4, policy=DROP_OLDEST, logger=None):
+        self.grabber = grabber
+        self.composer = composer
+        self.encoder = encoder
+        self.fps = fps
+        self.logger = logger
+        # El capturador puede proporcionar sus propios buffers para escribir en ellos sin copias
+        allocate = getattr(grabber, "allocate", np.empty)
+        self.capture_ring = FrameRing("capture", capacity, capture_shape, policy=policy, allocate=allocate)
+        self.encode_ring = FrameRing("encode", capacity, output_shape, policy=policy)
+        self.stage_stats = {"capture": StageStats(), "compose": StageStats(), "encode": StageStats()}
+        # Latencia de cada frame desde su captura hasta que se entrega al codificador
+        self.frame_latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.scheduler = FrameScheduler(fps)
+        # Capturar solo uno de cada N ticks; el escritor CFR repite el frame en los demás
+        self.frame_divisor = 1
+        # Vista previa opcional (``offer(frame)``), alimentada desde la composición sin segunda captura
+        self.preview = None
+        # Con un ``RecordingProfiler`` cada etapa se ejecuta bajo su propio cProfile
+        self.profiler = None
+        self.writer = ConstantRateWriter(self.scheduler, self._write_frame)
+        self.running = False
+        self.start_time = None
+        self.stop_time = None
+        self._threads = []
+
+    def start(self, start_time=None):
+        # Devuelve el instante de inicio para que el audio use el mismo origen de tiempos
+        self.running = True
+        self.start_time = self.scheduler.start(start_time)
+        self._threads = [
+            threading.Thread(target=self._run_stage, args=("capture", self._capture_loop), name="capture"),
+            threading.Thread(target=self._run_stage, args=("compose", self._compose_loop), name="compose"),
+            threading.Thread(target=self._run_stage, args=("encode", self._encode_loop), name="encode"),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self.start_time
+
+    def request_stop(self, stop_time=None):
+        # Marca el final sin esperar a que las etapas vacíen sus colas
+        if self.stop_time is None or stop_time is not None:
+            self.stop_time = self.scheduler.clock() if stop_time is None else stop_time
+        self.running = False
+        return self.stop_time
+
+    def stop(self, stop_time=None):
+        self.request_stop(stop_time)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        _call(self.grabber, "release")
+
+    def _run_stage(self, name, loop):
+        # Tiempo de CPU del hilo, para saber qué etapa consume la máquina y no solo cuánto tarda
+        cpu_started = time.thread_time()
+        try:
+            if self.profiler is not None:
+                self.profiler.run(name, loop)
+            else:
+                loop()
+        except Exception as e:
+            self.stage_stats[name].errors += 1
+            if self.logger:
+                self.logger(f"Pipeline stage '{name}' failed: {e}")
+            self.running = False
+        finally:
+            self.stage_stats[name].cpu = time.thread_time() - cpu_started
+            # Cerrar el anillo de salida para que la etapa siguiente termine de vaciarlo,
+            # y el de entrada para no dejar bloqueado al productor si esta etapa falla
+            if name == "capture":
+                self.capture_ring.close()
+            elif name == "compose":
+                self.capture_ring.close()
+                self.encode_ring.close()
+            else:
+                self.encode_ring.close()
+
+    def _capture_loop(self):
+        stats = self.stage_stats["capture"]
+        ring = self.capture_ring
+        sequence = 0
+        _call(self.grabber, "open")
+        try:
+            while self.running:
+                current_time = self.scheduler.wait_next()
+                if not self.running:
+                    break
+                if (self.scheduler.index - 1) % self.frame_divisor:
+                    continue
+                sequence += 1
+                slot = ring.acquire()
+                if slot is None:
+                    continue
+                started = time.perf_counter()
+                slot.info = self.grabber.grab(slot.buffer)
+                slot.timestamp = current_time
+                slot.sequence = sequence
+                ring.publish(slot)
+                stats.record(time.perf_counter() - started)
+        finally:
+            _call(self.grabber, "close")
+
+    def _compose_loop(self):
+        stats = self.stage_stats["compose"]
+        _call(self.composer, "open")
+        try:
+            while True:
+                src = self.capture_ring.get()
+                if src is None:
+                    break
+                dst = self.encode_ring.acquire()
+                if dst is None:
+                    self.capture_ring.release(src)
+                    continue
+                started = time.perf_counter()
+                if self.composer.compose(src.buffer, dst.buffer, src.info) is False:
+                    # Frame idéntico al anterior: el escritor CFR lo repetirá
+                    self.capture_ring.release(src)
+                    self.encode_ring.discard(dst)
+                    stats.record(time.perf_counter() - started)
+                    continue
+                dst.timestamp = src.timestamp
+                dst.sequence = src.sequence
+                dst.info = src.info
+                self.capture_ring.release(src)
+                if self.preview is not None:
+                    self.preview.offer(dst.buffer)
+                self.encode_ring.publish(dst)
+                stats.record(time.perf_counter() - started)
+        finally:
+            _call(self.composer, "close")
+
+    def _write_frame(self, frame):
+        self.encoder.write(frame)
+
+    def _encode_loop(self):
+        stats = self.stage_stats["encode"]
+        # Se retiene el último slot escrito por si hay que repetirlo para rellenar huecos
+        held = None
+        _call(self.encoder, "open")
+        try:
+            while True:
+                slot = self.encode_ring.get()
+                if slot is None:
+                    break
+                started = time.perf_counter()
+                # Lo capturado después de la parada no entra: el audio termina en ese mismo instante
+                if (self.stop_time is not None
+                        and self.scheduler.slot_for(slot.timestamp) >= self.scheduler.slot_for(self.stop_time)):
+                    self.encode_ring.release(slot)
+                    continue
+                if self.writer.push(slot.buffer, slot.timestamp):
+                    self.frame_latencies.append(self.scheduler.clock() - slot.timestamp)
+                    if held is not None:
+                        self.encode_ring.release(held)
+                    held = slot
+                else:
+                    self.encode_ring.release(slot)
+                stats.record(time.perf_counter() - started)
+            if self.stop_time is not None:
+                self.writer.finish(self.stop_time)
+        finally:
+            if held is not None:
+                self.encode_ring.release(held)
+
+    def close(self):
+        # Tras stop() y tras entregar el audio pendiente: cerrar el codificador es cerrar el fichero
+        try:
+            _call(self.encoder, "close")
+        except Exception as e:
+            self.stage_stats["encode"].errors += 1
+            if self.logger:
+                self.logger(f"Pipeline stage 'encode' failed: {e}")
+
+    @property
+    def end_time(self):
+        # Instante maestro en el que termina el vídeo escrito; el audio debe cortarse ahí
+        return self.start_time + self.writer.written / self.fps
+
+    def instrument(self, metrics):
+        # Histogramas de tiempo por frame en cada etapa; el resto se lee de los contadores existentes al exportar
+        for name, stage in self.stage_stats.items():
+            stage.histogram = metrics.histogram(STAGE_METRICS[name], f"Time per frame in the {name} stage")
+            metrics.counter("stage_frames", "Frames processed per stage", fn=lambda s=stage: s.frames, stage=name)
+            metrics.counter("stage_errors", "Stage failures", fn=lambda s=stage: s.errors, stage=name)
+        for ring in (self.capture_ring, self.encode_ring):
+            metrics.gauge("queue_depth", "Frames waiting in a ring", fn=lambda r=ring: r.depth, ring=ring.name)
+            metrics.counter("ring_dropped", "Frames dropped by back-pressure", fn=lambda r=ring: r.dropped,
+                            ring=ring.name)
+        metrics.counter("frames_written", "Frames delivered to the encoder", fn=lambda: self.writer.written)
+        metrics.counter("frames_duplicated", "Frames repeated to keep a constant rate",
+                        fn=lambda: self.writer.duplicated)
+        metrics.counter("capture_ticks_missed", "Capture deadlines skipped", fn=lambda: self.scheduler.missed)
+        metrics.gauge("frame_divisor", "Capture one tick out of N", fn=lambda: self.frame_divisor)
+        if hasattr(self.composer, "instrument"):
+            self.composer.instrument(metrics)
+
+    @property
+    def failed(self):
+        return any(stage.errors for stage in self.stage_stats.values())
+
+    def stats(self):
+        result = {}
+        for name, stage in self.stage_stats.items():
+            result[name] = stage.as_dict()
+        # La profundidad y los descartes se atribuyen a la cola de entrada de cada etapa
+        result["compose"].update(self.capture_ring.stats())
+        result["encode"].update(self.encode_ring.stats())
+        if hasattr(self.grabber, "stats"):
+            result["capture"].update(self.grabber.stats())
+        if hasattr(self.composer, "stats"):
+            result["compose"].update(self.composer.stats())
+        if self.preview is not None:
+            result["compose"].update(self.preview.stats())
+        return result
+
+    def timing(self):
+        stop_time = self.stop_time if self.stop_time is not None else self.scheduler.clock()
+        report = timing_report(self.scheduler, self.writer, stop_time)
+        report["latency_p50_ms"] = percentile_ms(self.frame_latencies, 50)
+        report["latency_p99_ms"] = percentile_ms(self.frame_latencies, 99)
+        return report
+
+    def summary(self):
+        stats = self.stats()
+        timing = self.timing()
+        stages = ", ".join(
+            f"{name}: {s['frames']} frames, depth {s.get('max_depth', 0)}, dropped {s.get('dropped', 0)}"
+            for name, s in stats.items()
+        )
+        return (f"{stages}; {timing['achieved_fps']}/{timing['target_fps']} fps, "
+                f"{timing['duplicated']} duplicated, {timing['dropped']} dropped, "
+                f"jitter {timing['jitter_histogram']}")
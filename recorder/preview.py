@@ -0,0 +1,64 @@
+import threading
+import time
+
+from recorder.thumbnails import downsample
+
+
+class LatestFrame:
+    """Buzón de un solo valor: publicar sustituye al anterior, leer nunca bloquea.
+
+    A diferencia de una cola, si el consumidor va lento se pierden frames en
+    lugar de acumularse, y el productor no espera nunca.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = None
+        self.sequence = 0
+
+    def publish(self, value):
+        with self.lock:
+            self.value = value
+            self.sequence += 1
+
+    def latest(self, after=0):
+        # Devuelve (secuencia, valor) solo si hay algo más nuevo que ``after``
+        with self.lock:
+            if self.sequence <= after:
+                return after, None
+            return self.sequence, self.value
+
+
+class PreviewTap:
+    """Derivación de la etapa de composición hacia una vista previa.
+
+    Uno de cada ``every`` frames compuestos se reduce con un paso entero a como
+    mucho ``size`` y se publica en un ``LatestFrame`` como RGB. El coste queda
+    acotado por frame publicado y el codificador no espera nunca a la interfaz.
+    """
+
+    def __init__(self, every=5, size=(480, 270)):
+        self.every = max(1, int(every))
+        self.size = size
+        self.slot = LatestFrame()
+        self.enabled = True
+        self.offered = 0
+        self.published = 0
+        self.busy = 0.0
+
+    def offer(self, frame):
+        self.offered += 1
+        if not self.enabled or (self.offered - 1) % self.every:
+            return
+        started = time.perf_counter()
+        # Nueva matriz por publicación: el lector puede seguir usando la anterior sin copiarla
+        self.slot.publish(downsample(frame, self.size))
+        self.published += 1
+        self.busy += time.perf_counter() - started
+
+    def latest(self, after=0):
+        return self.slot.latest(after)
+
+    def stats(self):
+        mean = self.busy / self.published * 1000 if self.published else 0.0
+        return {"preview_frames": self.published, "preview_ms": round(mean, 3)}
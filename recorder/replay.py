@@ -0,0 +1,175 @@
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+
+TS_PACKET = 188
+TS_SYNC = 0x47
+
+# stream_type de la PMT que son vídeo: MPEG-2, H.264, HEVC
+VIDEO_STREAM_TYPES = (0x02, 0x1B, 0x24)
+
+
+def _section(packet):
+    # Sección PSI que empieza en este paquete (PAT o PMT), o None
+    if not packet[1] & 0x40:
+        return None
+    offset = 4
+    if packet[3] & 0x20:
+        offset += 1 + packet[4]
+    if offset >= TS_PACKET:
+        return None
+    offset += 1 + packet[offset]  # pointer_field
+    return packet[offset:]
+
+
+def parse_pat(packet):
+    # PIDs de las PMT de cada programa
+    section = _section(packet)
+    if section is None or len(section) < 8 or section[0] != 0x00:
+        return []
+    length = ((section[1] & 0x0F) << 8) | section[2]
+    pids = []
+    for offset in range(8, min(3 + length - 4, len(section) - 3), 4):
+        program = (section[offset] << 8) | section[offset + 1]
+        if program:
+            pids.append(((section[offset + 2] & 0x1F) << 8) | section[offset + 3])
+    return pids
+
+
+def parse_pmt(packet):
+    # PIDs de los flujos de vídeo del programa
+    section = _section(packet)
+    if section is None or len(section) < 12 or section[0] != 0x02:
+        return []
+    length = ((section[1] & 0x0F) << 8) | section[2]
+    end = min(3 + length - 4, len(section))
+    offset = 12 + (((section[10] & 0x0F) << 8) | section[11])
+    pids = []
+    while offset + 5 <= end:
+        stream_type = section[offset]
+        pid = ((section[offset + 1] & 0x1F) << 8) | section[offset + 2]
+        if stream_type in VIDEO_STREAM_TYPES:
+            pids.append(pid)
+        offset += 5 + (((section[offset + 3] & 0x0F) << 8) | section[offset + 4])
+    return pids
+
+
+def is_random_access(packet):
+    # random_access_indicator del campo de adaptación: ffmpeg lo marca en el primer paquete de cada keyframe
+    return bool(packet[3] & 0x20) and packet[4] > 0 and bool(packet[5] & 0x40)
+
+
+class ReplayBuffer:
+    """Anillo en memoria con los últimos ``seconds`` segundos ya codificados.
+
+    Recibe el MPEG-TS que ffmpeg escribe por stdout (vídeo y audio ya
+    multiplexados) y lo trocea en GOPs: cada trozo empieza en un keyframe de
+    vídeo, así que el fichero guardado es reproducible desde el primer byte y
+    no hay que recodificar. ``max_bytes`` es un límite duro: se descartan los
+    GOPs más antiguos aunque cubran menos de ``seconds``.
+    """
+
+    def __init__(self, seconds=30, max_bytes=256 * 1024 * 1024, clock=time.monotonic):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.chunks = deque()  # [instante de llegada, bytearray] empezando en keyframe
+        self.bytes = 0
+        self.pat = None
+        self.pmt = None
+        self.pmt_pids = set()
+        self.video_pids = set()
+        self.evicted = 0
+        self.overflows = 0
+        self._pending = b""
+
+    def feed(self, data):
+        # Hilo lector de stdout de ffmpeg; los paquetes pueden llegar partidos entre lecturas
+        data = self._pending + data
+        usable = len(data) - len(data) % TS_PACKET
+        self._pending = data[usable:]
+        view = memoryview(data)
+        with self.lock:
+            for offset in range(0, usable, TS_PACKET):
+                packet = view[offset:offset + TS_PACKET]
+                if packet[0] != TS_SYNC:
+                    continue
+                self._packet(packet)
+
+    def _packet(self, packet):
+        pid = ((packet[1] & 0x1F) << 8) | packet[2]
+        if pid == 0:
+            self.pat = bytes(packet)
+            self.pmt_pids.update(parse_pat(packet))
+            return
+        if pid in self.pmt_pids:
+            self.pmt = bytes(packet)
+            self.video_pids.update(parse_pmt(packet))
+            return
+        if pid in self.video_pids and packet[1] & 0x40 and is_random_access(packet):
+            self._close_chunk()
+            self.chunks.append([self.clock(), bytearray()])
+        if not self.chunks:
+            # Hasta el primer keyframe no hay nada reproducible
+            return
+        self.chunks[-1][1] += packet
+        self.bytes += TS_PACKET
+        if self.bytes > self.max_bytes:
+            self._evict()
+
+    def _close_chunk(self):
+        if not self.chunks:
+            return
+        # Se conservan los GOPs necesarios para cubrir ``seconds`` desde el más reciente
+        now = self.clock()
+        while len(self.chunks) > 1 and now - self.chunks[1][0] >= self.seconds:
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        _, chunk = self.chunks.popleft()
+        self.bytes -= len(chunk)
+        self.evicted += 1
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and len(self.chunks) > 1:
+            self._drop_oldest()
+        if self.bytes > self.max_bytes:
+            # Un solo GOP más grande que el límite: se descarta y se espera al siguiente keyframe
+            self._drop_oldest()
+            self.overflows += 1
+
+    def duration(self):
+        with self.lock:
+            if not self.chunks:
+                return 0.0
+            return self.clock() - self.chunks[0][0]
+
+    def snapshot(self):
+        # Copia consistente del anillo: cabeceras PAT/PMT y GOPs completos
+        with self.lock:
+            if not self.chunks or self.pat is None or self.pmt is None:
+                return b""
+            return b"".join([self.pat, self.pmt] + [chunk for _, chunk in self.chunks])
+
+    def save(self, path, ffmpeg=None):
+        """Vuelca el anillo a ``path``. ``.ts`` se escribe tal cual; otros contenedores se remultiplexan sin recodificar."""
+        data = self.snapshot()
+        if not data:
+            return 0
+        if os.path.splitext(path)[1].lower() == ".ts" or ffmpeg is None:
+            with open(path, "wb") as output:
+                output.write(data)
+            return len(data)
+        subprocess.run([ffmpeg, "-hide_banner", "-loglevel", "error", "-y", "-f", "mpegts", "-i", "pipe:0",
+                        "-map", "0", "-c", "copy", path],
+                       input=data, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True,
+                       creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+        return len(data)
+
+    def stats(self):
+        with self.lock:
+            return {"chunks": len(self.chunks), "bytes": self.bytes, "evicted_chunks": self.evicted,
+                    "overflows": self.overflows}
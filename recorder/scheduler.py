@@ -0,0 +1,125 @@
+import time
+
+# Límites superiores (ms) de los cubos del histograma de jitter
+JITTER_BUCKETS_MS = (1, 2, 5, 10, 20, 50)
+
+
+class FrameScheduler:
+    """Marca el ritmo de captura con un reloj monotónico, durmiendo hasta cada plazo."""
+
+    def __init__(self, fps, clock=time.perf_counter, sleep=time.sleep):
+        self.fps = fps
+        self.interval = 1.0 / fps
+        self.clock = clock
+        self.sleep = sleep
+        self.start_time = None
+        self.index = 0
+        self.ticks = 0
+        self.missed = 0
+        self.histogram = [0] * (len(JITTER_BUCKETS_MS) + 1)
+        self.max_jitter = 0.0
+
+    def start(self, start_time=None):
+        self.start_time = self.clock() if start_time is None else start_time
+        self.index = 0
+        return self.start_time
+
+    def slot_for(self, timestamp):
+        return int(round((timestamp - self.start_time) * self.fps))
+
+    def wait_next(self):
+        # Duerme hasta el siguiente plazo; si vamos tarde se saltan los plazos perdidos
+        # en lugar de intentar recuperarlos en ráfaga
+        deadline = self.start_time + self.index * self.interval
+        now = self.clock()
+        if now < deadline:
+            self.sleep(deadline - now)
+            now = self.clock()
+        elif now - deadline >= self.interval:
+            skipped = int((now - deadline) / self.interval)
+            self.missed += skipped
+            self.index += skipped
+            deadline += skipped * self.interval
+        self._record_jitter(now - deadline)
+        self.index += 1
+        self.ticks += 1
+        return now
+
+    def _record_jitter(self, late):
+        late_ms = abs(late) * 1000.0
+        if late_ms > self.max_jitter:
+            self.max_jitter = late_ms
+        for i, limit in enumerate(JITTER_BUCKETS_MS):
+            if late_ms < limit:
+                self.histogram[i] += 1
+                return
+        self.histogram[-1] += 1
+
+    def jitter_histogram(self):
+        labels = [f"<{limit}ms" for limit in JITTER_BUCKETS_MS] + [f">={JITTER_BUCKETS_MS[-1]}ms"]
+        return dict(zip(labels, self.histogram))
+
+
+class ConstantRateWriter:
+    """Convierte frames con marca de tiempo en una secuencia de frecuencia constante.
+
+    Cada frame ocupa el hueco más cercano a su marca de tiempo; los huecos vacíos se
+    rellenan repitiendo el frame anterior y los frames que caen en un hueco ya
+    escrito se descartan, de modo que la duración del vídeo sigue al reloj real.
+    """
+
+    def __init__(self, scheduler, write):
+        self.scheduler = scheduler
+        self.write = write
+        self.next_slot = 0
+        self.written = 0
+        self.duplicated = 0
+        self.dropped = 0
+        self.last_frame = None
+
+    def push(self, frame, timestamp):
+        # Devuelve True si el frame se usó; el llamador puede reutilizar el anterior
+        slot = self.scheduler.slot_for(timestamp)
+        if slot < self.next_slot:
+            self.dropped += 1
+            return False
+        gap = slot - self.next_slot
+        if gap:
+            self._repeat(self.last_frame if self.last_frame is not None else frame, gap)
+        self.write(frame)
+        self.written += 1
+        self.next_slot = slot + 1
+        self.last_frame = frame
+        return True
+
+    def finish(self, stop_time):
+        # Rellena hasta el instante de parada para que vídeo y audio duren lo mismo
+        if self.last_frame is None:
+            return
+        end_slot = self.scheduler.slot_for(stop_time)
+        if end_slot > self.next_slot:
+            self._repeat(self.last_frame, end_slot - self.next_slot)
+            self.next_slot = end_slot
+
+    def _repeat(self, frame, count):
+        for _ in range(count):
+            self.write(frame)
+        self.written += count
+        self.duplicated += count
+
+
+def timing_report(scheduler, writer, stop_time):
+    elapsed = max(stop_time - scheduler.start_time, 1e-9)
+    return {
+        "target_fps": scheduler.fps,
+        "captured": scheduler.ticks,
+        "capture_fps": round(scheduler.ticks / elapsed, 2),
+        # Frames únicos que llegaron al codificador, sin contar repeticiones
+        "achieved_fps": round((writer.written - writer.duplicated) / elapsed, 2),
+        "missed_ticks": scheduler.missed,
+        "max_jitter_ms": round(scheduler.max_jitter, 2),
+        "jitter_histogram": scheduler.jitter_histogram(),
+        "written": writer.written,
+        "duplicated": writer.duplicated,
+        "dropped": writer.dropped,
+    }
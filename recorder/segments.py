@@ -0,0 +1,245 @@
+import os
+import threading
+from collections import deque
+
+from recorder.ffmpeg_mux import FFmpegMuxer
+
+# mp4/mov fragmentados siguen siendo reproducibles aunque el proceso muera a mitad de segmento
+FRAGMENTED_ARGS = ["-movflags", "+frag_keyframe+empty_moov+default_base_moof", "-frag_duration", "1000000"]
+
+
+class Segment:
+    __slots__ = ("index", "path", "muxer", "start_frame", "end_frame", "end_sample")
+
+    def __init__(self, index, path, muxer, start_frame):
+        self.index = index
+        self.path = path
+        self.muxer = muxer
+        self.start_frame = start_frame
+        self.end_frame = None
+        self.end_sample = None
+
+
+class SegmentedMuxer:
+    """Graba en varios ficheros consecutivos, rotando cada N segundos o N bytes.
+
+    El vídeo decide dónde se corta cada segmento; el audio se retiene para no
+    adelantarse al corte, así cada segmento recibe exactamente las muestras que
+    le corresponden. Tras cerrar cada segmento se reescribe una lista de
+    concatenación de ffmpeg y una lista M3U.
+    """
+
+    # Segundos que el audio puede ir por delante del vídeo
+    AUDIO_LEAD = 0.5
+
+    def __init__(self, output, fps, size, audio=None, segment_seconds=None, segment_bytes=None,
+                 logger=None, **muxer_kwargs):
+        if not segment_seconds and not segment_bytes:
+            raise ValueError("Segmented recording needs a duration or a size limit")
+        self.base, self.extension = os.path.splitext(output)
+        self.fps = fps
+        self.size = size
+        self.audio = audio
+        self.segment_frames = int(segment_seconds * fps) if segment_seconds else None
+        self.segment_bytes = segment_bytes
+        self.logger = logger
+        self.muxer_kwargs = muxer_kwargs
+        if self.extension.lower() in (".mp4", ".mov"):
+            self.muxer_kwargs.setdefault("output_args", FRAGMENTED_ARGS)
+        self.pix_fmt = muxer_kwargs.get("pix_fmt", "bgr24")
+        self.ffmpeg = FFmpegMuxer(output, fps, size, **muxer_kwargs).ffmpeg
+        self.frames = 0
+        self.audio_samples = 0
+        self.segments = []
+        self.finished = []
+        self.current = None
+        self._audio_segments = deque()
+        self._pending = deque()
+        self._audio_ended = False
+        self._lock = threading.Lock()
+        self._closers = []
+        self._next_options = None
+
+    @property
+    def concat_list_path(self):
+        return f"{self.base}_segments.txt"
+
+    @property
+    def playlist_path(self):
+        return f"{self.base}.m3u"
+
+    def segment_path(self, index):
+        return f"{self.base}_{index:03d}{self.extension}"
+
+    def open(self):
+        self._open_segment()
+
+    def reconfigure(self, **options):
+        # Nuevos parámetros de ffmpeg (preset, scale...) para el siguiente segmento, que empieza cuanto antes
+        with self._lock:
+            self._next_options = options
+
+    def _open_segment(self):
+        index = len(self.segments)
+        path = self.segment_path(index)
+        if self._next_options:
+            self.muxer_kwargs.update(self._next_options)
+            self._next_options = None
+        muxer = FFmpegMuxer(path, self.fps, self.size, audio=self.audio, **self.muxer_kwargs)
+        muxer.open()
+        segment = Segment(index, path, muxer, self.frames)
+        self.segments.append(segment)
+        # Solo los segmentos que esperan audio; sin audio cada uno se cierra al rotar
+        if self.audio is not None:
+            self._audio_segments.append(segment)
+        self.current = segment
+        if self.logger:
+            self.logger(f"Recording segment {index}: {path}")
+
+    def _plan_rotation(self):
+        # Decide dónde termina el segmento actual. Con límite de tamaño el corte se
+        # fija con AUDIO_LEAD de antelación para que el audio nunca lo sobrepase
+        segment = self.current
+        if self._next_options:
+            # Cambio de parámetros: adelantar el corte a lo antes que permita el audio ya enviado
+            end_frame = self.frames + int(self.AUDIO_LEAD * self.fps) + 1
+            if segment.end_frame is not None and segment.end_frame <= end_frame:
+                return
+        elif segment.end_frame is not None:
+            return
+        elif self.segment_frames:
+            end_frame = segment.start_frame + self.segment_frames
+        else:
+            recorded = self.frames - segment.start_frame
+            # El tamaño se consulta una vez por segundo de vídeo
+            if not recorded or recorded % max(int(self.fps), 1):
+                return
+            try:
+                if os.path.getsize(segment.path) < self.segment_bytes:
+                    return
+            except OSError:
+                return
+            end_frame = self.frames + int(self.AUDIO_LEAD * self.fps) + 1
+        with self._lock:
+            segment.end_frame = end_frame
+            if self.audio is not None:
+                segment.end_sample = end_frame * self.audio[0] // self.fps
+
+    def write(self, frame):
+        self._plan_rotation()
+        if self.current.end_frame is not None and self.frames >= self.current.end_frame:
+            self._rotate()
+        self.current.muxer.write(frame)
+        self.frames += 1
+        if self.audio is not None and self._pending:
+            with self._lock:
+                self._flush_audio()
+
+    def _rotate(self):
+        with self._lock:
+            previous = self.current
+            self._open_segment()
+            if self.audio is None:
+                self._finish(previous)
+            else:
+                self._flush_audio()
+
+    def write_audio(self, data):
+        with self._lock:
+            self._pending.append(data)
+            self._flush_audio()
+
+    def end_audio(self):
+        if self.audio is None:
+            return
+        with self._lock:
+            self._audio_ended = True
+            self._flush_audio()
+
+    def _flush_audio(self, final=False):
+        # Reparte el audio pendiente. Puede ir hasta AUDIO_LEAD por delante del vídeo
+        # (ffmpeg necesita audio para arrancar) pero nunca más allá del corte del segmento
+        final = final or self._audio_ended
+        rate, channels = self.audio
+        sample_bytes = 2 * channels
+        lead_limit = self.frames * rate // self.fps + int(self.AUDIO_LEAD * rate)
+        while self._pending and self._audio_segments:
+            segment = self._audio_segments[0]
+            limit = None if final else lead_limit
+            if segment.end_sample is not None:
+                limit = segment.end_sample if limit is None else min(limit, segment.end_sample)
+            chunk = self._pending[0]
+            samples = len(chunk) // sample_bytes
+            allowed = samples if limit is None else min(samples, limit - self.audio_samples)
+            if allowed <= 0:
+                if segment is self.current or self.audio_samples < segment.end_sample:
+                    break
+                # El vídeo ya pasó al siguiente segmento y este tiene todo su audio
+                self._audio_segments.popleft()
+                self._finish(segment)
+                continue
+            if allowed < samples:
+                segment.muxer.write_audio(chunk[:allowed * sample_bytes])
+                self._pending[0] = chunk[allowed * sample_bytes:]
+            else:
+                segment.muxer.write_audio(chunk)
+                self._pending.popleft()
+            self.audio_samples += allowed
+        if self._audio_ended and not self._pending:
+            # No llegará más audio: los segmentos abiertos no deben esperarlo
+            for segment in self._audio_segments:
+                segment.muxer.end_audio()
+
+    def _finish(self, segment):
+        # Cerrar ffmpeg en segundo plano para no frenar la captura
+        thread = threading.Thread(target=self._close_segment, args=(segment,), daemon=True)
+        thread.start()
+        self._closers.append(thread)
+
+    def _close_segment(self, segment):
+        try:
+            segment.muxer.close()
+        except RuntimeError as e:
+            if self.logger:
+                self.logger(f"Segment {segment.path} failed: {e}")
+        with self._lock:
+            self.finished.append(segment)
+            self.finished.sort(key=lambda s: s.index)
+            self.write_manifests()
+
+    def write_manifests(self):
+        # Se escriben a un temporal y se sustituyen para no dejar nunca una lista a medias
+        lines = [f"file '{os.path.basename(s.path)}'" for s in self.finished]
+        _replace(self.concat_list_path, "\n".join(lines) + "\n")
+        playlist = ["#EXTM3U"]
+        for segment in self.finished:
+            duration = (segment.end_frame - segment.start_frame) / self.fps
+            playlist.append(f"#EXTINF:{duration:.3f},{os.path.basename(segment.path)}")
+            playlist.append(os.path.basename(segment.path))
+        _replace(self.playlist_path, "\n".join(playlist) + "\n")
+
+    def close(self):
+        if self.current is None:
+            return
+        with self._lock:
+            self.current.end_frame = self.frames
+            self.current.end_sample = None
+            if self.audio is not None:
+                self._flush_audio(final=True)
+            for segment in self._audio_segments:
+                if segment.end_frame is None:
+                    segment.end_frame = self.frames
+                self._finish(segment)
+            self._audio_segments.clear()
+            if self.audio is None:
+                self._finish(self.current)
+            self.current = None
+        for thread in self._closers:
+            thread.join()
+
+
+def _replace(path, content):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
@@ -0,0 +1,169 @@
+import time
+
+import cv2
+import numpy as np
+
+from recorder.capture import create_grabber
+
+SOURCE_KINDS = ("screen", "synthetic", "replay")
+
+
+class PacedSource:
+    """Base de las fuentes que no son la pantalla: su contenido avanza por frames.
+
+    Con ``fps`` el contenido avanza a ese ritmo según el reloj, como un vídeo
+    reproduciéndose en pantalla; sin él, un frame por captura.
+    """
+
+    def __init__(self, bbox, cursor_sample=None, fps=None, clock=time.perf_counter):
+        self.bbox = bbox
+        self.cursor_sample = cursor_sample
+        self.fps = fps
+        self.clock = clock
+        self.frames = 0
+        self.start_time = None
+
+    def open(self):
+        self.start_time = self.clock()
+
+    def frame_index(self):
+        index = int((self.clock() - self.start_time) * self.fps) if self.fps else self.frames
+        self.frames += 1
+        return index
+
+    def sample_cursor(self):
+        if self.cursor_sample is None:
+            return None
+        cursor = self.cursor_sample()
+        if cursor is None:
+            return None
+        x, y, handle = cursor
+        return (x - self.bbox['left'], y - self.bbox['top'], handle)
+
+    def close(self):
+        pass
+
+
+class SyntheticSource(PacedSource):
+    """Patrón determinista para pruebas y benchmarks sin pantalla.
+
+    Sobre un fondo fijo con degradado y rejilla se desplaza una banda con
+    textura que ocupa ``motion`` (0-1) del alto del frame; con ``motion=0`` la
+    imagen no cambia nunca.
+    """
+
+    def __init__(self, bbox, cursor_sample=None, motion=0.1, fps=None, seed=0, clock=time.perf_counter):
+        super().__init__(bbox, cursor_sample, fps, clock)
+        self.motion = motion
+        height, width = bbox['height'], bbox['width']
+        rng = np.random.default_rng(seed)
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        self.background = np.empty((height, width, 4), dtype=np.uint8)
+        self.background[..., 0] = x
+        self.background[..., 1] = y
+        self.background[..., 2] = (x + y) / 2
+        self.background[..., 3] = 255
+        self.background[::32] = 40
+        self.background[:, ::32] = 40
+        self.band_height = int(round(height * motion))
+        # Textura el doble de alta que la banda para poder desplazarla sin calcular nada por frame
+        self.texture = rng.integers(0, 256, (max(self.band_height, 1) * 2, width, 4), dtype=np.uint8)
+        self.texture[..., 3] = 255
+
+    def grab(self, buffer):
+        index = self.frame_index()
+        np.copyto(buffer, self.background)
+        band = self.band_height
+        if band:
+            height = buffer.shape[0]
+            top = (index * max(band // 4, 1)) % max(height - band, 1)
+            offset = index % band
+            buffer[top:top + band] = self.texture[offset:offset + band]
+        return self.sample_cursor()
+
+
+class ReplaySource(PacedSource):
+    """Reproduce un vídeo existente o un volcado BGRA en bruto como si fuera la pantalla.
+
+    Los volcados ``.raw``/``.bgra`` son frames BGRA consecutivos del tamaño de
+    ``bbox`` y se leen con memmap, sin copias intermedias. Los vídeos se
+    decodifican con OpenCV y se escalan si su tamaño no coincide. Al llegar al
+    final se vuelve a empezar si ``loop``.
+    """
+
+    RAW_EXTENSIONS = (".raw", ".bgra")
+
+    def __init__(self, path, bbox, cursor_sample=None, loop=True, fps=None, clock=time.perf_counter):
+        super().__init__(bbox, cursor_sample, fps, clock)
+        self.path = path
+        self.loop = loop
+        self.raw = None
+        self.capture = None
+        self._bgr = None
+        self._position = -1
+        self._loop_start = 0
+
+    def open(self):
+        super().open()
+        shape = (self.bbox['height'], self.bbox['width'], 4)
+        if self.path.lower().endswith(self.RAW_EXTENSIONS):
+            data = np.memmap(self.path, dtype=np.uint8, mode='r')
+            self.raw = data[:data.size - data.size % int(np.prod(shape))].reshape((-1,) + shape)
+            if not len(self.raw):
+                raise ValueError(f"{self.path} holds less than one {shape[1]}x{shape[0]} frame")
+        else:
+            self.capture = cv2.VideoCapture(self.path)
+            if not self.capture.isOpened():
+                raise IOError(f"Cannot open {self.path}")
+
+    def grab(self, buffer):
+        index = self.frame_index()
+        if self.raw is not None:
+            if index >= len(self.raw) and not self.loop:
+                raise EOFError(self.path)
+            np.copyto(buffer, self.raw[index % len(self.raw)])
+        else:
+            self._read_video(index, buffer)
+        return self.sample_cursor()
+
+    def _read_video(self, index, buffer):
+        # Se decodifica hasta el frame pedido; si no ha avanzado se repite el último
+        target = index - self._loop_start
+        while self._position < target:
+            ok, frame = self.capture.read(self._bgr)
+            if not ok:
+                if not self.loop or self._position < 0:
+                    raise EOFError(self.path)
+                # Vuelta al principio: los índices siguientes se cuentan desde aquí
+                self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                self._loop_start += self._position + 1
+                target = index - self._loop_start
+                self._position = -1
+                continue
+            self._bgr = frame
+            self._position += 1
+        height, width = buffer.shape[:2]
+        frame = self._bgr
+        if frame.shape[:2] != (height, width):
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA, dst=buffer)
+
+    def close(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+        self.raw = None
+
+
+def create_source(kind, bbox, cursor_sample=None, path=None, motion=0.1, fps=None):
+    # Fábrica usada por el motor: "screen" es la captura real de la plataforma
+    if kind == "screen":
+        return create_grabber(bbox, cursor_sample)
+    if kind == "synthetic":
+        return SyntheticSource(bbox, cursor_sample, motion=motion, fps=fps)
+    if kind == "replay":
+        if not path:
+            raise ValueError("replay source needs a path")
+        return ReplaySource(path, bbox, cursor_sample, fps=fps)
+    raise ValueError(f"Unknown frame source: {kind}")
@@ -0,0 +1,98 @@
+# Sincronización de audio y vídeo contra un reloj maestro común
+
+
+class ClockSync:
+    """Mide la deriva del reloj de una fuente de audio frente al reloj maestro y la corrige.
+
+    Con cada bloque recibe cuántas muestras entregó el dispositivo y en qué
+    instante maestro empezó el bloque. La deriva se estima con una regresión
+    exponencial de las muestras frente al tiempo; el desfase entre la posición
+    donde se colocó el audio y la que le corresponde según su marca de tiempo se
+    suaviza y se lleva a cero ajustando la relación de remuestreo.
+    """
+
+    def __init__(self, in_rate, out_rate, gain=0.5, max_correction_ppm=1000.0, smoothing=0.02,
+                 regression_weight=0.002, warmup=2.0, enabled=True):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.nominal_ratio = out_rate / in_rate
+        self.gain = gain
+        self.max_correction = max_correction_ppm * 1e-6
+        self.smoothing = smoothing
+        self.regression_weight = regression_weight
+        self.warmup = warmup
+        self.enabled = enabled
+        self.first_time = None
+        self.device_frames = 0
+        self.updates = 0
+        # Regresión con pesos exponenciales, centrada para no perder precisión en grabaciones largas
+        self._mean_x = 0.0
+        self._mean_y = 0.0
+        self._cov_xx = 0.0
+        self._cov_xy = 0.0
+        self.offset = 0.0
+        self.max_offset = 0.0
+        self.correction = 0.0
+
+    @property
+    def drift_ppm(self):
+        if self._cov_xx <= 0.0:
+            return 0.0
+        # Pendiente en muestras de más por segundo respecto a la frecuencia nominal
+        return self._cov_xy / self._cov_xx / self.in_rate * 1e6
+
+    @property
+    def settled(self):
+        return self.first_time is not None and self._mean_x >= self.warmup / 2
+
+    def update(self, timestamp, frames, offset_frames):
+        # Devuelve la relación de remuestreo salida/entrada a usar a partir de ahora
+        if self.first_time is None:
+            self.first_time = timestamp
+        x = timestamp - self.first_time
+        # Muestras entregadas por encima (o por debajo) de lo que marcaría la frecuencia nominal
+        y = self.device_frames - x * self.in_rate
+        self.device_frames += frames
+        self.updates += 1
+        weight = max(self.regression_weight, 1.0 / self.updates)
+        dx = x - self._mean_x
+        dy = y - self._mean_y
+        self._mean_x += weight * dx
+        self._mean_y += weight * dy
+        self._cov_xx = (1.0 - weight) * (self._cov_xx + weight * dx * dx)
+        self._cov_xy = (1.0 - weight) * (self._cov_xy + weight * dx * dy)
+
+        self.offset += self.smoothing * (offset_frames / self.out_rate - self.offset)
+        if x < self.warmup or not self.enabled:
+            return self.nominal_ratio
+        if abs(self.offset) > self.max_offset:
+            self.max_offset = abs(self.offset)
+        # Compensación directa de la deriva más un término proporcional que absorbe el desfase acumulado
+        correction = self.gain * self.offset
+        correction = min(max(correction, -self.max_correction), self.max_correction)
+        self.correction = self.drift_ppm * 1e-6 + correction
+        return self.nominal_ratio / (1.0 + self.correction)
+
+    def reset_offset(self):
+        self.offset = 0.0
+
+    def report(self):
+        return {
+            "drift_ppm": round(self.drift_ppm, 1),
+            "correction_ppm": round(self.correction * 1e6, 1),
+            "max_offset_ms": round(self.max_offset * 1000.0, 2),
+            "offset_ms": round(self.offset * 1000.0, 2),
+        }
+
+
+def sync_report(timing, mixer=None):
+    """Resumen de sincronización de una grabación: duración de cada flujo y deriva por fuente."""
+    video_seconds = timing["written"] / timing["target_fps"]
+    report = {"video_seconds": round(video_seconds, 3)}
+    if mixer is not None:
+        audio_seconds = mixer.position / mixer.rate
+        report["audio_seconds"] = round(audio_seconds, 3)
+        report["av_offset_ms"] = round((audio_seconds - video_seconds) * 1000.0, 2)
+        report["sources"] = {state.source.name: dict(state.sync.report(), resyncs=state.resyncs)
+                             for state in mixer.channel_state}
+    return report
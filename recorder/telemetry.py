@@ -0,0 +1,294 @@
+# Métricas de grabación: contadores, histogramas y gauges, exportados como JSON lines o Prometheus
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+# Límites superiores (s) de los cubos de los histogramas de tiempos por frame/bloque
+TIME_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 1.0)
+
+PREFIX = "recorder_"
+
+
+def _labels_text(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in items) + "}"
+
+
+class Counter:
+    """Contador monótono. Cada contador debe incrementarse desde un solo hilo.
+
+    Con ``fn`` el valor se lee al exportar de un contador que ya lleve otra
+    clase (p. ej. los descartes de un ``FrameRing``).
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, labels=(), help="", fn=None):
+        self.name = name
+        self.labels = labels
+        self.help = help
+        self.fn = fn
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def sample(self):
+        return self.fn() if self.fn is not None else self.value
+
+
+class Gauge:
+    """Valor instantáneo; con ``fn`` se lee al exportar, sin coste en el bucle caliente."""
+
+    kind = "gauge"
+
+    def __init__(self, name, labels=(), help="", fn=None):
+        self.name = name
+        self.labels = labels
+        self.help = help
+        self.fn = fn
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def sample(self):
+        return self.fn() if self.fn is not None else self.value
+
+
+class Histogram:
+    """Histograma de cubos fijos: ``observe`` es una búsqueda binaria y tres sumas.
+
+    Igual que los contadores, cada histograma tiene un único hilo escritor; el
+    exportador lee sin bloquear y como mucho ve una observación a medias.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, labels=(), help="", buckets=TIME_BUCKETS):
+        self.name = name
+        self.labels = labels
+        self.help = help
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Aproximación por el límite superior del cubo donde cae el cuantil
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound if bound != float("inf") else self.bounds[-1]
+        return self.bounds[-1]
+
+    def sample(self):
+        return {"count": self.count, "sum": round(self.sum, 6),
+                "p50": self.quantile(0.5), "p99": self.quantile(0.99)}
+
+
+class MetricsRegistry:
+    """Conjunto de métricas de una grabación, indexadas por nombre y etiquetas."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+
+    def _get(self, cls, name, labels, **kwargs):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            metric = self.metrics.get(key)
+            if metric is None:
+                metric = self.metrics[key] = cls(name, key[1], **kwargs)
+        return metric
+
+    def counter(self, name, help="", fn=None, **labels):
+        return self._get(Counter, name, labels, help=help, fn=fn)
+
+    def gauge(self, name, help="", fn=None, **labels):
+        return self._get(Gauge, name, labels, help=help, fn=fn)
+
+    def histogram(self, name, help="", buckets=TIME_BUCKETS, **labels):
+        return self._get(Histogram, name, labels, help=help, buckets=buckets)
+
+    def snapshot(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        values = {}
+        for metric in metrics:
+            values[metric.name + _labels_text(metric.labels)] = metric.sample()
+        return {"time": round(time.time(), 3), "elapsed": round(time.monotonic() - self.started, 3),
+                "metrics": values}
+
+    def prometheus(self):
+        # Formato de texto de Prometheus 0.0.4
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        described = set()
+        for metric in metrics:
+            name = PREFIX + metric.name
+            if name not in described:
+                described.add(name)
+                if metric.help:
+                    lines.append(f"# HELP {name} {metric.help}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+            if metric.kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(metric.bounds + (float("inf"),), metric.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_labels_text(metric.labels, ('le', le))} {cumulative}")
+                lines.append(f"{name}_sum{_labels_text(metric.labels)} {metric.sum}")
+                # _count igual al cubo +Inf aunque haya una observación en curso
+                lines.append(f"{name}_count{_labels_text(metric.labels)} {cumulative}")
+            else:
+                lines.append(f"{name}{_labels_text(metric.labels)} {metric.sample()}")
+        return "\n".join(lines) + "\n"
+
+
+class JsonLinesExporter:
+    """Escribe una instantánea del registro por línea cada ``interval`` segundos."""
+
+    def __init__(self, registry, path, interval=1.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._file = None
+
+    def start(self):
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="metrics-export", daemon=True)
+        self._thread.start()
+
+    def _write(self):
+        self._file.write(json.dumps(self.registry.snapshot()) + "\n")
+        self._file.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._write()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            # Última instantánea con los valores finales
+            self._write()
+            self._file.close()
+            self._file = None
+
+
+class MetricsServer:
+    """Endpoint HTTP local: ``/metrics`` en formato Prometheus y ``/metrics.json``."""
+
+    def __init__(self, registry, port=9464, host="127.0.0.1"):
+        self.registry = registry
+        self.port = port
+        self.host = host
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = registry.prometheus().encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = json.dumps(registry.snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class RecordingProfiler:
+    """cProfile por etapa y tracemalloc durante una grabación.
+
+    cProfile solo perfila el hilo en el que se activa, así que cada etapa del
+    pipeline se ejecuta con ``run(name, fn)`` y vuelca su propio ``<name>.prof``
+    (abrir con ``python -m pstats`` o snakeviz). tracemalloc toma una
+    instantánea al empezar y otra al terminar y guarda las líneas que más
+    memoria ganaron en ``tracemalloc.txt``.
+    """
+
+    TOP_ALLOCATIONS = 25
+
+    def __init__(self, directory, logger=None):
+        self.directory = directory
+        self.log = logger or logging.getLogger("recorder").info
+        self.baseline = None
+
+    def start(self):
+        import tracemalloc
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        tracemalloc.start(10)
+        self.baseline = tracemalloc.take_snapshot()
+
+    def run(self, name, fn, *args):
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(fn, *args)
+        finally:
+            profile.dump_stats(os.path.join(self.directory, f"{name}.prof"))
+
+    def stop(self):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            return
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot.dump(os.path.join(self.directory, "tracemalloc.snapshot"))
+        with open(os.path.join(self.directory, "tracemalloc.txt"), "w", encoding="utf-8") as report:
+            report.write(f"current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB\n")
+            for stat in snapshot.compare_to(self.baseline, "lineno")[:self.TOP_ALLOCATIONS]:
+                report.write(f"{stat}\n")
+        self.log(f"Profile saved to {self.directory} (traced memory peak {peak / 1e6:.1f} MB)")
@@ -0,0 +1,112 @@
+import collections
+import logging
+import math
+import threading
+
+
+def downsample(bgra, size):
+    """Reduce un frame BGRA o BGR a RGB de como mucho ``size`` (ancho, alto), sin copiar el original.
+
+    Se salta píxeles con un paso entero: para una miniatura el aliasing no se
+    nota y el coste es proporcional a la salida, no a la resolución del monitor.
+    """
+    import numpy as np
+    height, width = bgra.shape[:2]
+    step = max(1, math.ceil(max(width / size[0], height / size[1])))
+    # BGR(A) -> RGB invirtiendo los tres primeros canales en la misma vista
+    return np.ascontiguousarray(bgra[::step, ::step, 2::-1])
+
+
+def geometry_key(bbox):
+    return bbox['left'], bbox['top'], bbox['width'], bbox['height']
+
+
+class ThumbnailWorker:
+    """Genera las miniaturas de los monitores en un hilo propio.
+
+    Un solo handle de mss, creado en el hilo del worker, se reutiliza para todas
+    las capturas. Las miniaturas se guardan en una caché pequeña indexada por la
+    geometría del monitor y se refrescan cada ``interval`` segundos;
+    ``on_update(key, rgb)`` se llama desde el hilo del worker con cada una nueva
+    (en Qt, conectarlo a una señal).
+    """
+
+    def __init__(self, on_update, size=(960, 540), interval=5.0, capacity=8, logger=None):
+        self.on_update = on_update
+        self.size = size
+        self.interval = interval
+        self.capacity = capacity
+        self.log = logger or logging.getLogger("recorder").info
+        self.cache = collections.OrderedDict()
+        self.monitors = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.paused = False
+        self.thread = None
+
+    def set_monitors(self, bboxes):
+        with self.lock:
+            self.monitors = [dict(bbox) for bbox in bboxes]
+        self.refresh()
+
+    def refresh(self):
+        # Adelanta el siguiente ciclo (p. ej. al cambiar los monitores o al volver a mostrar la ventana)
+        self.wakeup.set()
+
+    def get(self, bbox):
+        with self.lock:
+            return self.cache.get(geometry_key(bbox))
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="thumbnails", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def _store(self, key, rgb):
+        with self.lock:
+            self.cache[key] = rgb
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.capacity:
+                self.cache.popitem(last=False)
+
+    def _run(self):
+        # NumPy y mss se cargan en este hilo, después de que la ventana ya esté visible
+        import mss
+        import numpy as np
+        try:
+            sct = mss.mss()
+        except Exception as e:
+            # Sin pantalla accesible se quedan los marcadores
+            self.log(f"Thumbnails unavailable: {e}")
+            return
+        try:
+            while self.running:
+                if not self.paused:
+                    with self.lock:
+                        monitors = list(self.monitors)
+                    for bbox in monitors:
+                        if not self.running:
+                            break
+                        try:
+                            img = sct.grab(bbox)
+                        except Exception as e:
+                            # Un monitor desconectado no debe parar las demás miniaturas
+                            self.log(f"Thumbnail capture failed for {geometry_key(bbox)}: {e}")
+                            continue
+                        frame = np.frombuffer(img.raw, dtype=np.uint8).reshape((img.height, img.width, 4))
+                        key = geometry_key(bbox)
+                        rgb = downsample(frame, self.size)
+                        self._store(key, rgb)
+                        self.on_update(key, rgb)
+                self.wakeup.wait(self.interval)
+                self.wakeup.clear()
+        finally:
+            sct.close()
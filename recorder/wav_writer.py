@@ -0,0 +1,119 @@
+import os
+import queue
+import struct
+import threading
+
+# Tamaño máximo representable en los campos de 32 bits de RIFF
+RIFF_LIMIT = 0xFFFFFFFF
+
+# Cabecera: RIFF + JUNK(28) reservado para ds64 + fmt(16) + cabecera de data
+_JUNK_SIZE = 28
+_HEADER_SIZE = 12 + (8 + _JUNK_SIZE) + (8 + 16) + 8
+_JUNK_OFFSET = 12
+_DATA_SIZE_OFFSET = _HEADER_SIZE - 4
+
+
+class WavWriter:
+    """Escribe PCM a disco según llega, desde un hilo propio.
+
+    La cabecera se actualiza periódicamente, así que si el proceso muere el
+    fichero sigue siendo un WAV válido hasta el último volcado. Se reserva un
+    bloque JUNK que se convierte en ds64 (RF64) si el audio supera los 4 GB.
+    """
+
+    def __init__(self, path, rate, channels, sample_width=2, flush_interval=1.0, max_queue=256):
+        self.path = path
+        self.rate = rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.flush_interval = flush_interval
+        self.data_bytes = 0
+        self.rf64 = False
+        self.error = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._file = None
+        self._thread = None
+
+    def open(self):
+        self._file = open(self.path, 'wb')
+        self._file.write(self._header())
+        self._file.flush()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, data):
+        # Bloquea sólo si el disco va más de max_queue bloques por detrás
+        self._queue.put(data)
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+        self._file = None
+        if self.error:
+            raise self.error
+
+    def _header(self):
+        block_align = self.channels * self.sample_width
+        return b''.join([
+            b'RIFF', struct.pack('<I', 0), b'WAVE',
+            b'JUNK', struct.pack('<I', _JUNK_SIZE), bytes(_JUNK_SIZE),
+            b'fmt ', struct.pack('<IHHIIHH', 16, 1, self.channels, self.rate,
+                                 self.rate * block_align, block_align, self.sample_width * 8),
+            b'data', struct.pack('<I', 0),
+        ])
+
+    def _run(self):
+        f = self._file
+        pending = 0
+        flush_bytes = max(int(self.flush_interval * self.rate * self.channels * self.sample_width), 1)
+        try:
+            while True:
+                try:
+                    chunk = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    chunk = b''
+                if chunk is None:
+                    break
+                if chunk:
+                    f.write(chunk)
+                    self.data_bytes += len(chunk)
+                    pending += len(chunk)
+                if pending >= flush_bytes or (not chunk and pending):
+                    self._patch_header()
+                    pending = 0
+            # Un byte de relleno si el bloque data tiene tamaño impar
+            if self.data_bytes % 2:
+                f.write(b'\x00')
+            self._patch_header()
+        except OSError as e:
+            self.error = e
+            # Seguir vaciando la cola para no bloquear al hilo de audio
+            while self._queue.get() is not None:
+                pass
+
+    def _patch_header(self):
+        f = self._file
+        position = f.tell()
+        riff_size = _HEADER_SIZE - 8 + self.data_bytes + self.data_bytes % 2
+        if riff_size > RIFF_LIMIT:
+            # RF64: los campos de 32 bits quedan a 0xFFFFFFFF y los tamaños reales van en ds64
+            self.rf64 = True
+            samples = self.data_bytes // (self.channels * self.sample_width)
+            f.seek(0)
+            f.write(b'RF64' + struct.pack('<I', RIFF_LIMIT))
+            f.seek(_JUNK_OFFSET)
+            f.write(b'ds64' + struct.pack('<IQQQI', _JUNK_SIZE, riff_size, self.data_bytes, samples, 0))
+            f.seek(_DATA_SIZE_OFFSET)
+            f.write(struct.pack('<I', RIFF_LIMIT))
+        else:
+            f.seek(4)
+            f.write(struct.pack('<I', riff_size))
+            f.seek(_DATA_SIZE_OFFSET)
+            f.write(struct.pack('<I', self.data_bytes))
+        f.seek(position)
+        f.flush()
+        os.fsync(f.fileno())
@@ -0,0 +1,17 @@
+from benchmarks.av_sync import run
+
+PPM = 2000.0
+PPM_TOLERANCE = 200.0
+MAX_OFFSET_MS = 10.0
+
+
+def test_drift_correction_keeps_skewed_sources_in_sync():
+    # Dos fuentes sintéticas con relojes desviados en sentidos opuestos y callbacks con retraso aleatorio
+    report = run(3.0, PPM, jitter=0.004, correction=True)
+
+    assert abs(report["av_offset_ms"]) <= 1000.0 / 30
+    for name, expected in (("fast", PPM), ("slow", -PPM)):
+        source = report["sources"][name]
+        assert abs(source["drift_ppm"] - expected) <= PPM_TOLERANCE
+        assert source["max_offset_ms"] <= MAX_OFFSET_MS
+        assert source["resyncs"] == 0
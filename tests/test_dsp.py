@@ -0,0 +1,42 @@
+import numpy as np
+
+from recorder.dsp import LookaheadLimiter
+
+RATE = 48000
+
+
+def signal(frames, amplitude):
+    t = np.arange(frames) / RATE
+    tone = amplitude * np.sin(2 * np.pi * 440 * t) * (1 + np.sin(2 * np.pi * 3 * t)) / 2
+    return np.stack([tone, -tone], axis=1).astype(np.float32)
+
+
+def run_chunks(limiter, samples, sizes):
+    out, position, i = [], 0, 0
+    while position < len(samples):
+        size = sizes[i % len(sizes)]
+        out.append(limiter.process(samples[position:position + size].copy()))
+        position += size
+        i += 1
+    return np.concatenate(out)
+
+
+def test_chunk_size_does_not_change_the_output():
+    # Chunks que no son múltiplos de block: mismo resultado que con bloques alineados
+    samples = signal(RATE, 1.5)
+    aligned = run_chunks(LookaheadLimiter(RATE, 2), samples, [1024])
+    uneven = run_chunks(LookaheadLimiter(RATE, 2), samples, [1000, 7, 33, 1, 480, 2049])
+
+    assert len(uneven) == len(samples)
+    np.testing.assert_array_equal(aligned, uneven)
+    assert np.abs(uneven).max() <= 0.8 + 1e-3
+
+
+def test_quiet_signal_is_only_delayed():
+    samples = signal(4800, 0.5)
+    limiter = LookaheadLimiter(RATE, 2)
+    out = run_chunks(limiter, samples, [441])
+
+    delay = limiter.latency_samples
+    np.testing.assert_array_equal(out[:delay], 0.0)
+    np.testing.assert_allclose(out[delay:], samples[:-delay], atol=1e-6)
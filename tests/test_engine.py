@@ -0,0 +1,56 @@
+import time
+
+from recorder.engine import Recorder, RecorderConfig
+
+
+class CountingMuxer:
+    # Como FFmpegMuxer: el audio que llega después de end_audio() o close() ya no entra en el fichero
+    pix_fmt = 'bgra'
+    ffmpeg = None
+
+    def __init__(self):
+        self.frames = 0
+        self.audio_bytes = 0
+        self.rejected_bytes = 0
+        self.audio_ended = False
+        self.closed = False
+
+    def write(self, frame):
+        assert not self.closed
+        self.frames += 1
+
+    def write_audio(self, data):
+        if self.audio_ended or self.closed:
+            self.rejected_bytes += len(data)
+            return
+        self.audio_bytes += len(data)
+
+    def end_audio(self):
+        self.audio_ended = True
+
+    def close(self):
+        self.end_audio()
+        self.closed = True
+
+
+class FakeMuxerRecorder(Recorder):
+    def _create_muxer(self, audio):
+        return CountingMuxer()
+
+
+def test_stop_delivers_audio_tail_before_closing_muxer(tmp_path):
+    config = RecorderConfig(str(tmp_path / "out.mp4"), {'left': 0, 'top': 0, 'width': 160, 'height': 90},
+                            fps=30, source="synthetic", synthetic_audio=True, tmp_dir=str(tmp_path / "tmp"))
+    recorder = FakeMuxerRecorder(config, logger=lambda message: None)
+    recorder.start()
+    time.sleep(1.0)
+    recorder.stop()
+
+    muxer = recorder.muxer
+    mixer = recorder.mixer
+    video_seconds = muxer.frames / config.fps
+    audio_seconds = muxer.audio_bytes / (2 * mixer.channels * mixer.rate)
+    assert muxer.closed
+    assert muxer.frames > 0
+    assert muxer.rejected_bytes == 0
+    assert abs(audio_seconds - video_seconds) <= mixer.block / mixer.rate
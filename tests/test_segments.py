@@ -0,0 +1,42 @@
+from recorder import segments
+from recorder.segments import SegmentedMuxer
+
+
+class FakeMuxer:
+    ffmpeg = "ffmpeg"
+
+    def __init__(self, output, fps, size, audio=None, **kwargs):
+        self.output = output
+        self.closes = 0
+
+    def open(self):
+        pass
+
+    def write(self, frame):
+        pass
+
+    def write_audio(self, data):
+        pass
+
+    def end_audio(self):
+        pass
+
+    def close(self):
+        self.closes += 1
+
+
+def test_video_only_segments_are_closed_and_listed_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(segments, "FFmpegMuxer", FakeMuxer)
+    muxer = SegmentedMuxer(str(tmp_path / "o.mp4"), 10, (16, 16), segment_seconds=1)
+    muxer.open()
+    for _ in range(35):
+        muxer.write(b"")
+    muxer.end_audio()
+    muxer.close()
+
+    assert [segment.muxer.closes for segment in muxer.segments] == [1, 1, 1, 1]
+    with open(muxer.concat_list_path) as concat:
+        assert concat.read().splitlines() == [f"file 'o_{index:03d}.mp4'" for index in range(4)]
+    with open(muxer.playlist_path) as playlist:
+        entries = [line for line in playlist.read().splitlines() if not line.startswith("#")]
+    assert entries == [f"o_{index:03d}.mp4" for index in range(4)]